@@ -0,0 +1,248 @@
+"""
+    This script summarizes repeated runs (trials) of a benchmark scenario and compares them to a baseline.
+    Each run is summarized to a few metrics (mean CPU usage, peak RSS, CPU seconds of the client and server,
+    overall and while the clients were active (see timeline), the duration of the run, and the latencies and
+    throughput of the load generator if it was used), and the trials of each metric are summarized by their mean
+    with a bootstrap confidence interval.
+    A metric regresses when its mean is worse than the baseline mean by more than the threshold (relative),
+    and the baseline mean lies outside the confidence interval of the trials, so noise alone does not fail it.
+    The samples of the warmup are excluded, if its end was detected (see steady).
+    With --leaks, the memory trend of each run after the warmup is fitted with a line instead, and a steady growth
+    above the threshold (MB/hour) is flagged as a likely leak.
+"""
+import argparse
+import json
+import os
+import sys
+import numpy
+import metrics
+import timeline
+from events import read_events
+
+""" The confidence level of the intervals, and the number of bootstrap resamples """
+CONFIDENCE = 0.95
+RESAMPLES = 10000
+""" Metrics which are better when higher, all others are better when lower """
+HIGHER_IS_BETTER = {'loadgen.throughput'}
+""" Fraction of the run considered warmup and excluded from the memory trend, the growth (MB/hour) above which
+    the trend is flagged as a leak, and the goodness of fit (r squared) required for the trend to be steady """
+WARMUP_FRACTION = 0.2
+LEAK_THRESHOLD = 10.0
+LEAK_MIN_R2 = 0.5
+
+
+def warmup_end_time(scenario):
+    """ Returns the time the warmup of the run ended, if detected (see steady), else None """
+    events = read_events(scenario + '-events.log')
+    return next((event['time'] for event in events if event['event'] == 'warmup_end'), None)
+
+
+def summarize_log(log_file, warmup_end=None):
+    """ Returns the summary metrics of a monitor log: mean cpu %, peak rss (MB) and cpu seconds used,
+        excluding the samples of the warmup if its end time is given """
+    metrics_ = metrics.load_metrics(log_file)
+    if warmup_end is not None:
+        steady = metrics_['timestamp'] >= warmup_end
+        metrics_['cpu'] = {name: values[steady] for name, values in metrics_['cpu'].items()}
+        metrics_['memory'] = {name: values[steady] for name, values in metrics_['memory'].items()}
+    cpu_seconds = metrics_['cpu']['total_user'] + metrics_['cpu']['total_system']
+    return {
+        'cpu_percent': float(numpy.mean(metrics_['cpu']['percent'])) if len(cpu_seconds) else 0.0,
+        'rss_peak': float(numpy.max(metrics_['memory']['rss'])) if len(cpu_seconds) else 0.0,
+        'cpu_seconds': float(cpu_seconds[-1] - cpu_seconds[0]) if len(cpu_seconds) else 0.0,
+    }
+
+
+def summarize_run(scenario):
+    """ Returns the summary metrics of a run of the scenario, from its monitor, events and load generator logs """
+    summary = {}
+    warmup_end = warmup_end_time(scenario)
+    for role in ['server', 'client']:
+        log_file = scenario + '-monitor-' + role + '.log'
+        if os.path.exists(log_file):
+            for name, value in summarize_log(log_file, warmup_end).items():
+                summary[role + '.' + name] = value
+    events_file = scenario + '-events.log'
+    if os.path.exists(events_file):
+        times = {event['event']: event['time'] for event in read_events(events_file)}
+        if 'run_start' in times and 'server_exit' in times:
+            summary['duration'] = times['server_exit'] - times['run_start']
+        """ The cpu seconds of the server and client while the clients were active """
+        for phase in timeline.summarize_timeline(scenario):
+            if phase['phase'] == 'load':
+                for role in ['server', 'client']:
+                    if role in phase:
+                        summary[role + '.cpu_seconds_load'] = phase[role]['cpu_seconds']
+    loadgen_file = scenario + '-loadgen.json'
+    if os.path.exists(loadgen_file):
+        with open(loadgen_file) as file:
+            report = json.load(file)
+        summary['loadgen.throughput'] = report['throughput']
+        for name in ['p50', 'p99', 'p99.9']:
+            if report['latency'].get(name) is not None:
+                summary['loadgen.' + name] = report['latency'][name]
+    return summary
+
+
+def bootstrap_interval(values, confidence=CONFIDENCE, resamples=RESAMPLES, seed=0):
+    """ Returns the confidence interval of the mean of the values, from the percentiles of the means of
+        the values resampled with replacement """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if len(values) < 2:
+        return float(values.mean()), float(values.mean())
+    samples = numpy.random.default_rng(seed).choice(values, size=(resamples, len(values)), replace=True)
+    means = samples.mean(axis=1)
+    tail = (1 - confidence) / 2 * 100
+    low, high = numpy.percentile(means, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def summarize_trials(summaries):
+    """ Returns the mean and confidence interval of each metric over the summaries of the trials """
+    names = sorted(set().union(*summaries)) if summaries else []
+    result = {}
+    for name in names:
+        values = [summary[name] for summary in summaries if name in summary]
+        low, high = bootstrap_interval(values)
+        result[name] = {'mean': float(numpy.mean(values)), 'low': low, 'high': high, 'values': values}
+    return result
+
+
+def compare(current, baseline, threshold=0.05):
+    """ Compares the trial summaries to the baseline summaries (as returned by summarize_trials),
+        returns the comparison of each metric present in both, with whether it regressed """
+    comparison = {}
+    for name in sorted(set(current) & set(baseline)):
+        mean, base = current[name]['mean'], baseline[name]['mean']
+        change = (mean - base) / abs(base) if base else (0.0 if mean == base else float('inf'))
+        if name in HIGHER_IS_BETTER:
+            worse = -change > threshold and current[name]['high'] < base
+        else:
+            worse = change > threshold and current[name]['low'] > base
+        comparison[name] = {'mean': mean, 'baseline': base, 'change': change, 'regressed': worse}
+    return comparison
+
+
+def memory_trend(metrics_, warmup=WARMUP_FRACTION, warmup_end=None):
+    """ Fits a line to the memory after the warmup (its end time if detected, else a fraction of the run),
+        the unique set size if logged as it is not affected by other processes sharing pages, else the
+        proportional or resident set size, returns the memory used, the slope (MB/hour) and the r squared """
+    name = next(name for name in ['uss', 'pss', 'rss'] if name in metrics_['memory'])
+    times, memory = metrics_['time'], metrics_['memory'][name]
+    if len(times) < 3:
+        return name, 0.0, 0.0
+    if warmup_end is not None:
+        start = numpy.searchsorted(metrics_['timestamp'], warmup_end)
+    else:
+        start = numpy.searchsorted(times, times[0] + warmup * (times[-1] - times[0]))
+    times, memory = times[start:], memory[start:]
+    if len(times) < 3 or times[-1] == times[0]:
+        return name, 0.0, 0.0
+    slope, intercept = numpy.polyfit(times, memory, 1)
+    residual = numpy.sum((memory - (slope * times + intercept)) ** 2)
+    total = numpy.sum((memory - memory.mean()) ** 2)
+    r2 = 1 - residual / total if total else 0.0
+    return name, float(slope * 3600), float(r2)
+
+
+def detect_leak(log_file, warmup=WARMUP_FRACTION, threshold=LEAK_THRESHOLD, warmup_end=None):
+    """ Returns the memory trend of the monitor log, flagged as a leak if it grows steadily above the threshold """
+    name, slope, r2 = memory_trend(metrics.load_metrics(log_file), warmup, warmup_end)
+    return {'memory': name, 'slope': slope, 'r2': r2, 'leak': slope > threshold and r2 >= LEAK_MIN_R2}
+
+
+def report_leaks(scenarios, warmup=WARMUP_FRACTION, threshold=LEAK_THRESHOLD):
+    """ Prints the memory trend of the client and server of each run, returns whether any leak was flagged """
+    leaked = False
+    for scenario in scenarios:
+        for role in ['server', 'client']:
+            log_file = scenario + '-monitor-' + role + '.log'
+            if not os.path.exists(log_file):
+                continue
+            leak = detect_leak(log_file, warmup, threshold, warmup_end_time(scenario))
+            print("%-32s %-6s %s %+10.2f MB/hour (r2 %.2f)%s" % (scenario, role, leak['memory'], leak['slope'],
+                                                                leak['r2'], '  LIKELY LEAK' if leak['leak'] else ''))
+            leaked |= leak['leak']
+    return leaked
+
+
+def print_summary(summary, title):
+    print(title)
+    for name, stats in summary.items():
+        print("  %-24s %12.3f  [%.3f, %.3f]" % (name, stats['mean'], stats['low'], stats['high']))
+
+
+def print_comparison(comparison, title):
+    print(title)
+    for name, stats in comparison.items():
+        print("  %-24s %12.3f  vs %12.3f  %+7.1f%%%s" % (name, stats['mean'], stats['baseline'],
+                                                      100 * stats['change'],
+                                                      '  REGRESSED' if stats['regressed'] else ''))
+
+
+def load_baseline(baseline_file):
+    with open(baseline_file) as file:
+        return json.load(file)
+
+
+def save_baseline(baseline_file, summary):
+    with open(baseline_file, 'w') as file:
+        json.dump(summary, file, indent=1)
+
+
+def analyze(scenarios, scenarios_b=None, baseline_file=None, save_baseline_file=None, threshold=0.05,
+            summary_file=None):
+    """ Summarizes the runs of the scenarios (and the B runs to compare against them, if any),
+        compares them to the stored baseline, returns whether any metric regressed """
+    summary = summarize_trials([summarize_run(scenario) for scenario in scenarios])
+    print_summary(summary, "summary of %d runs" % len(scenarios))
+    result = {'runs': scenarios, 'summary': summary}
+    regressed = False
+    if scenarios_b:
+        summary_b = summarize_trials([summarize_run(scenario) for scenario in scenarios_b])
+        print_summary(summary_b, "summary of %d B runs" % len(scenarios_b))
+        comparison = compare(summary_b, summary, threshold)
+        print_comparison(comparison, "B compared to A")
+        result.update(runs_b=scenarios_b, summary_b=summary_b, comparison_b=comparison)
+        regressed |= any(stats['regressed'] for stats in comparison.values())
+    if baseline_file and os.path.exists(baseline_file):
+        comparison = compare(summary, load_baseline(baseline_file), threshold)
+        print_comparison(comparison, "compared to baseline " + baseline_file)
+        result.update(baseline=baseline_file, comparison=comparison)
+        regressed |= any(stats['regressed'] for stats in comparison.values())
+    elif baseline_file:
+        print("baseline", baseline_file, "not found, not compared", file=sys.stderr)
+    if save_baseline_file:
+        save_baseline(save_baseline_file, summary)
+    result['regressed'] = regressed
+    if summary_file:
+        with open(summary_file, 'w') as file:
+            json.dump(result, file, indent=1)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('scenarios', help='the scenarios of the runs (trials) to summarize', nargs='+')
+    parser.add_argument('--b', help='the scenarios of runs to compare against the runs', nargs='+', default=None)
+    parser.add_argument('--baseline', help='the baseline summary file to compare the runs to')
+    parser.add_argument('--save-baseline', help='save the summary of the runs as a baseline to this file')
+    parser.add_argument('--threshold', help='the relative change in a metric to be considered a regression',
+                        type=float, default=0.05)
+    parser.add_argument('--summary', help='the file to write the summary and comparisons to (json)')
+    parser.add_argument('--leaks', help='report the memory trend of each run after the warmup instead, and flag '
+                                        'growth above the leak threshold as a likely leak', action='store_true')
+    parser.add_argument('--warmup', help='the fraction of each run excluded from the memory trend, unless the end '
+                                         'of the warmup was detected',
+                        type=float, default=WARMUP_FRACTION)
+    parser.add_argument('--leak-threshold', help='the memory growth (MB/hour) flagged as a leak',
+                        type=float, default=LEAK_THRESHOLD)
+    args = parser.parse_args()
+    if args.leaks:
+        sys.exit(1 if report_leaks(args.scenarios, args.warmup, args.leak_threshold) else 0)
+    regressed = analyze(args.scenarios, args.b, args.baseline, args.save_baseline, args.threshold, args.summary)
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
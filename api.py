@@ -0,0 +1,88 @@
+"""
+    This file is the programmatic interface of the benchmarks, to run scenarios and render their plots from a python
+    process (like an orchestrator running many short scenarios) rather than running the scripts, so that the start
+    up of the interpreter is paid once, and the plotting libraries (matplotlib, PIL) and the analysis are imported
+    only once used, importing this file has no side effects.
+    Example:
+        import api
+        result = api.run_scenario('echo', 'python3 echo_server.py --port 9000', './client', wait=0, collector=True)
+        print(result.status, result.summary()['server.rss_peak'])
+        result.render()
+    The options of a run are the long options of monitor.py with the dashes replaced by underscores, given as parsed
+    values rather than strings, like ready=['tcp:localhost:9000'], clients=4 or server_cpus={0, 1}.
+    A run forks the server, client and monitoring processes from the calling process, waits only for those it
+    forked, and writes its logs to the working directory, like monitor.py.
+"""
+import os
+import monitor
+from events import read_events
+
+
+class RunResult:
+    """ The outcome of a run of a scenario, the exit status of the server (as of os.waitpid) and the events of
+        the run, its logs are loaded on demand """
+
+    def __init__(self, scenario, status, events):
+        self.scenario = scenario
+        self.status = status
+        self.events = events
+
+    def log_file(self, role='server'):
+        """ Returns the monitor log of the role: server, client, or client-N for multiple clients """
+        return self.scenario + '-monitor-' + role + '.log'
+
+    def metrics(self, role='server'):
+        """ Returns the metric series of the role (see metrics.compute_metrics) """
+        import metrics
+        return metrics.load_metrics(self.log_file(role))
+
+    def summary(self):
+        """ Returns the summary metrics of the run (see analysis.summarize_run) """
+        import analysis
+        return analysis.summarize_run(self.scenario)
+
+    def timeline(self):
+        """ Returns the summary of each phase of the run (see timeline.summarize_timeline) """
+        import timeline
+        return timeline.summarize_timeline(self.scenario)
+
+    def render(self, **options):
+        """ Plots the metrics of the run, see render """
+        return render(self.scenario, **options)
+
+
+def create_args(scenario, server, client, **options):
+    """ Returns the options of a run, the defaults of monitor.py overridden by the given options,
+        raises TypeError for an unknown option and ValueError for inconsistent options """
+    args = monitor.create_parser().parse_args(['--scenario', scenario, '--server', server, '--client', client])
+    for name, value in options.items():
+        if not hasattr(args, name):
+            raise TypeError('unknown option ' + name)
+        setattr(args, name, value)
+    monitor.check_args(args)
+    if args.repeat > 1 or args.server_b:
+        raise ValueError('run_scenario runs a single scenario, run the trials (repeat, server_b) with monitor.py')
+    return args
+
+
+def run_scenario(scenario, server, client, **options):
+    """ Runs the server and client commands as the scenario with the options (see create_args), returns
+        the RunResult once the server exited and the logs are complete """
+    args = create_args(scenario, server, client, **options)
+    status = monitor.run(args)
+    return RunResult(scenario, status, read_events(os.path.abspath(scenario + '-events.log')))
+
+
+def render(scenario, max_points=None, method='lttb', fast=False, image_file=None):
+    """ Plots the client and server metrics of the scenario to a png image, returns the image file,
+        see plot.render """
+    import plot
+    return plot.render(scenario, max_points, method, fast, image_file)
+
+
+def render_process_graph(out_log_file='branching_out.log', figure_file='branching.png', **options):
+    """ Draws the process branching graph from the log of process_graph.py, see
+        process_graph.generate_process_branching_image for the options """
+    import process_graph
+    process_graph.generate_process_branching_image(out_log_file, figure_file, **options)
+    return figure_file
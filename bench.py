@@ -1,14 +1,19 @@
 """
     This file contains utility methods to monitor process usage, create daemon process and to execute command.
-    This benchmark tool can only be used to monitor single process clients and servers.
+    By default only the single given process is monitored, use the tree mode (tree=True) to monitor the
+    process along with all of its descendants, as in case of pre-forking or multi-process servers,
+    or the cgroup mode (cgroup=path) to monitor the cgroup the process was placed in (see cgroups).
 """
 
 import os
 import sys
-import json
 import time
 import psutil
 import shlex
+import procfs
+import cgroups
+import logformat
+from events import record_event
 
 
 def daemon_process(log_file=None):
@@ -33,47 +38,524 @@ def daemon_process(log_file=None):
     os.umask(0)
 
 
-def monitor_process_stats(pid, interval=1):
-    """ Print stats of the process in json format """
-    """ Print some info about the system like # cpu cores and memory """
-    print('MEMORY:', psutil.virtual_memory().total, 'bytes', '\t', 'CPU:', psutil.cpu_count(logical=True), 'VIRT',
-          psutil.cpu_count(logical=False), 'PHY', psutil.cpu_freq().current, 'MHz', flush=True)
+def log_system_info(log):
+    """ Log some info about the system like # cpu cores and memory """
+    log.info('MEMORY:', psutil.virtual_memory().total, 'bytes', '\t', 'CPU:', psutil.cpu_count(logical=True), 'VIRT',
+             psutil.cpu_count(logical=False), 'PHY', psutil.cpu_freq().current, 'MHz')
+
+
+""" Scheduling policies which can be set with apply_scheduling, the real time ones take a priority """
+SCHEDULING_POLICIES = {
+    'other': os.SCHED_OTHER,
+    'batch': os.SCHED_BATCH,
+    'idle': os.SCHED_IDLE,
+    'fifo': os.SCHED_FIFO,
+    'rr': os.SCHED_RR,
+}
+IONICE_CLASSES = {
+    'rt': psutil.IOPRIO_CLASS_RT,
+    'be': psutil.IOPRIO_CLASS_BE,
+    'idle': psutil.IOPRIO_CLASS_IDLE,
+}
+
+
+def parse_cpu_list(cpu_list):
+    """ Parses a list of cpus in the format of taskset/cpusets, like 0-3,6 into a set of cpu numbers """
+    cpus = set()
+    for part in cpu_list.split(','):
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def parse_scheduling(spec):
+    """ Parses the scheduling settings given as nice=N,ionice=CLASS[:LEVEL],policy=POLICY[:PRIORITY]
+        (see SCHEDULING_POLICIES and IONICE_CLASSES) into the keyword arguments of apply_scheduling """
+    settings = {}
+    for part in filter(None, (spec or '').split(',')):
+        key, _, value = part.partition('=')
+        if key == 'nice':
+            settings['nice'] = int(value)
+        elif key == 'ionice':
+            name, _, level = value.partition(':')
+            settings['ionice'] = (IONICE_CLASSES[name], int(level) if level else None)
+        elif key == 'policy':
+            name, _, priority = value.partition(':')
+            settings['policy'] = (SCHEDULING_POLICIES[name], int(priority or 0))
+        else:
+            raise ValueError("unknown scheduling setting " + part)
+    return settings
+
+
+def apply_scheduling(cpus=None, nice=None, ionice=None, policy=None):
+    """ Applies the cpu affinity, nice value, io priority (class, level) and scheduling policy (policy, priority)
+        to the calling process, they are inherited by the processes it forks and executes """
+    process = psutil.Process()
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    if nice is not None:
+        process.nice(nice)
+    if ionice is not None:
+        io_class, level = ionice
+        if level is None:
+            process.ionice(io_class)
+        else:
+            process.ionice(io_class, level)
+    if policy is not None:
+        os.sched_setscheduler(0, policy[0], os.sched_param(policy[1]))
+
+
+def scheduling_info(process):
+    """ Returns the scheduling settings of the process for the process info line of the monitor logs """
+    policy, io_class = os.sched_getscheduler(process.pid), process.ionice().ioclass
+    policy = next((name for name, value in SCHEDULING_POLICIES.items() if value == policy), policy)
+    io_class = next((name for name, value in IONICE_CLASSES.items() if value == io_class), 'none')
+    return ['AFFINITY:', ','.join(map(str, process.cpu_affinity())), 'NICE:', process.nice(),
+            'IONICE:', io_class, 'POLICY:', policy]
+
+
+def pinned_cores(process):
+    """ Returns the cores the process is pinned to, None if it may run on all of them """
+    cores = process.cpu_affinity()
+    return cores if len(cores) < psutil.cpu_count() else None
+
+
+def core_usage(cores):
+    """ Returns the utilisation (percent) of each of the given cores since the last call,
+        the usage of the pinned cores not accounted by the monitored process shows the interference
+        of other processes """
+    usage = psutil.cpu_percent(percpu=True)
+    return {str(core): usage[core] for core in cores}
+
+
+def create_log_writer(log_format='json'):
+    """ Returns the writer of the monitor log to the standard output, in the given format (json or binary) """
+    if log_format == 'binary':
+        return logformat.BinaryLogWriter(sys.stdout.buffer)
+    return logformat.JsonLogWriter(sys.stdout)
+
+
+def monitor_process_stats(pid, interval=1, log=None, threads=False, pss=False, smaps_every=None):
+    """ Print stats of the process in json format (or to the given log writer),
+        along with the kernel counters (context switches, page faults, io bytes and sockets, see procfs.counters),
+        the cpu times of each of its threads if threads is set, and its pss, uss and swap if pss is set
+        (read every smaps_every samples, see procfs.SmapsSampler) """
+    log = log or create_log_writer()
+    log_system_info(log)
     try:
         process = psutil.Process(pid=pid)
         """ Print some info about process like pid, path, creation time, user"""
-        print('PID:', process.pid, 'PPID:', process.ppid(), 'USER:', process.username(),
-              'EXE:', process.exe(), 'CREATION:', process.create_time(), flush=True)
+        log.info('PID:', process.pid, 'PPID:', process.ppid(), 'USER:', process.username(),
+                 'EXE:', process.exe(), 'CREATION:', process.create_time(), *scheduling_info(process))
+        cores = pinned_cores(process)
+        if cores:
+            core_usage(cores)
+        smaps = procfs.SmapsSampler(pid, interval, smaps_every) if pss else None
+        sockets = procfs.SocketCounter(interval)
         while True:
+            cpu_percent = process.cpu_percent(interval=interval)
+            """ A single read of /proc/<pid>/stat for the cpu times, threads and page faults, the memory is read
+                by psutil from /proc/<pid>/statm """
+            stat, memory = procfs.read_stat(pid), process.memory_info()
             stats = {
                 # CPU Stats
                 'cpu_times': {
-                    'user': process.cpu_times().user,
-                    'system': process.cpu_times().system,
+                    'user': stat['user'],
+                    'system': stat['system'],
                 },
-                'cpu_percent': process.cpu_percent(interval=interval),
+                'cpu_percent': cpu_percent,
 
                 # Memory Stats
                 'memory': {
-                    'rss': process.memory_info().rss,
-                    'vms': process.memory_info().vms,
+                    'rss': memory.rss,
+                    'vms': memory.vms,
                 },
 
                 # Other Stats
-                'num_fds': process.num_fds(),
-                'num_threads': process.num_threads(),
+                'num_threads': stat['num_threads'],
                 'time': time.time(),
-
+                'monotonic': time.monotonic(),
             }
-            print(json.dumps(stats), flush=True)
+            counters, stats['num_fds'] = procfs.read_counters(pid, sockets=sockets, stat=stat)
+            stats.update(counters)
+            if smaps:
+                stats['memory'].update(smaps.sample())
+            if threads:
+                stats['threads'] = [{'tid': thread.id, 'user': thread.user_time, 'system': thread.system_time}
+                                    for thread in process.threads()]
+            if cores:
+                stats['cores'] = core_usage(cores)
+            log.sample(stats)
+            log.flush()
+    except (psutil.Error, OSError):
+        pass
+    finally:
+        log.flush()
+        os.close(sys.stdout.fileno())
+        os.close(sys.stderr.fileno())
+
+
+def is_monitor_daemon(pid):
+    """ Monitoring daemons become session leaders (see daemon_process), so any session leader
+        found below a monitored process is a detached daemon and not part of the workload """
+    try:
+        return os.getsid(pid) == pid
+    except OSError:
+        return False
+
+
+def find_process_tree(root_pid):
+    """ Returns the pids of the root process and all its descendants, using a single scan of the process table,
+        sub-trees of detached daemons (like the monitoring daemon itself) are skipped """
+    children = {}
+    for process in psutil.process_iter(['ppid']):
+        children.setdefault(process.info['ppid'], []).append(process.pid)
+    tree, pending = [root_pid], [root_pid]
+    while pending:
+        for child_pid in children.get(pending.pop(), []):
+            if not is_monitor_daemon(child_pid):
+                tree.append(child_pid)
+                pending.append(child_pid)
+    return tree
+
+
+""" Counters of a process which include those of its reaped children (like the cpu times), and counters which
+    are lost once a process is reaped, so they are always carried over in the totals of a process tree """
+ACCOUNTED_COUNTERS = ['page_faults.minor', 'page_faults.major', 'io.read_bytes', 'io.write_bytes']
+UNACCOUNTED_COUNTERS = ['ctx_switches.voluntary', 'ctx_switches.involuntary']
+
+
+class ProcessTreeSampler:
+    """ Samples the stats of a process and all its descendants, on every sample the process tree
+        is discovered again, and both the per-process records and the aggregated totals are returned.
+        The aggregated totals use the same fields as monitor_process_stats, so existing tools can read them.
+        CPU times (and page faults and io) of a process include those of its reaped children, so children which
+        exit between samples are still counted once their parent waits for them, processes which leave the tree
+        without any live ancestor to account for them are carried over using their last seen cpu times.
+        If pss is set, the pss, uss and swap of each process are read from smaps_rollup, which is expensive,
+        so only every smaps_every samples (adaptively if not given, see procfs.SmapsSampler), and likewise the
+        sockets of each process are counted adaptively (see procfs.SocketCounter) """
+
+    def __init__(self, pid, pss=False, interval=1, smaps_every=None):
+        self.pid = pid
+        self.pss = pss
+        self.interval = interval
+        self.smaps_every = smaps_every
+        self.smaps, self.sockets = {}, {}
+        self.root = psutil.Process(pid=pid)
+        """ Processes seen in the last sample, along with their parent and last seen cpu times """
+        self.tracked, self.last_seen = {pid: self.root}, {}
+        """ Cpu times of processes which left the tree without being accounted by any ancestor """
+        self.carried = dict.fromkeys(['user', 'system'] + ACCOUNTED_COUNTERS + UNACCOUNTED_COUNTERS, 0)
+        self.previous_cpu, self.previous_time, self.previous_counters = None, None, {}
+
+    def info(self):
+        """ Returns the process info line of the log """
+        root = self.root
+        return ['PID:', root.pid, 'PPID:', root.ppid(), 'USER:', root.username(), 'EXE:', root.exe(),
+                'CREATION:', root.create_time(), 'TREE:', True] + scheduling_info(root)
+
+    def sample(self, current_time=None, current_monotonic=None):
+        """ Returns the stats of the process tree, or None once the root process has exited """
+        if not self.root.is_running() or self.root.status() == psutil.STATUS_ZOMBIE:
+            return None
+        current_time, current_monotonic = current_time or time.time(), current_monotonic or time.monotonic()
+        pss = self.pss
+        records, seen = [], {}
+        for process_pid in find_process_tree(self.pid):
+            """ Re-use the process objects, so that cpu_percent is computed since the last sample """
+            process = self.tracked.get(process_pid) or psutil.Process(process_pid)
+            try:
+                with process.oneshot():
+                    cpu_times = process.cpu_times()
+                    memory = process.memory_info()
+                    record = {
+                        'pid': process_pid,
+                        'ppid': process.ppid(),
+                        'cpu_times': {
+                            'user': cpu_times.user + cpu_times.children_user,
+                            'system': cpu_times.system + cpu_times.children_system,
+                        },
+                        'cpu_percent': process.cpu_percent(),
+                        'memory': {'rss': memory.rss, 'vms': memory.vms},
+                        'num_threads': process.num_threads(),
+                    }
+                    sockets = self.sockets.get(process_pid) or procfs.SocketCounter(self.interval)
+                    counters, record['num_fds'] = procfs.read_counters(process_pid, children=True, sockets=sockets)
+                    self.sockets[process_pid] = sockets
+                    record.update(counters)
+                    if pss:
+                        if process_pid not in self.smaps:
+                            self.smaps[process_pid] = procfs.SmapsSampler(process_pid, self.interval,
+                                                                          self.smaps_every)
+                        record['memory'].update(self.smaps[process_pid].sample())
+            except (psutil.Error, OSError):
+                """ Process exited while being sampled, it is accounted as a vanished process """
+                continue
+            records.append(record)
+            seen[process_pid] = process
+            self.last_seen[process_pid] = record
+        if self.pid not in seen:
+            """ The root process exited during this sample """
+            return None
+
+        """ Account processes which vanished since the last sample """
+        last_seen = self.last_seen
+        for vanished_pid in set(self.tracked) - set(seen):
+            vanished = last_seen[vanished_pid]
+            for name in UNACCOUNTED_COUNTERS:
+                self.carried[name] += logformat.get_field(vanished, name)
+            ancestor_pid = vanished['ppid']
+            while ancestor_pid not in seen and ancestor_pid in last_seen:
+                ancestor_pid = last_seen[ancestor_pid]['ppid']
+            if ancestor_pid not in seen:
+                self.carried['user'] += vanished['cpu_times']['user']
+                self.carried['system'] += vanished['cpu_times']['system']
+                for name in ACCOUNTED_COUNTERS:
+                    self.carried[name] += logformat.get_field(vanished, name)
+        self.tracked = seen
+        self.smaps = {process_pid: smaps for process_pid, smaps in self.smaps.items() if process_pid in seen}
+        self.sockets = {process_pid: sockets for process_pid, sockets in self.sockets.items() if process_pid in seen}
+
+        user = self.carried['user'] + sum(record['cpu_times']['user'] for record in records)
+        system = self.carried['system'] + sum(record['cpu_times']['system'] for record in records)
+        """ Aggregated cpu times are cumulative, never let them go backwards """
+        if self.previous_cpu is not None:
+            user, system = max(user, self.previous_cpu[0]), max(system, self.previous_cpu[1])
+            cpu_percent = 100 * (user + system - sum(self.previous_cpu)) / (current_time - self.previous_time)
+        else:
+            cpu_percent = sum(record['cpu_percent'] for record in records)
+        self.previous_cpu, self.previous_time = (user, system), current_time
+
+        stats = {
+            # CPU Stats
+            'cpu_times': {'user': user, 'system': system},
+            'cpu_percent': round(cpu_percent, 1),
+
+            # Memory Stats
+            'memory': {
+                'rss': sum(record['memory']['rss'] for record in records),
+                'vms': sum(record['memory']['vms'] for record in records),
+            },
+
+            # Other Stats
+            'num_fds': sum(record['num_fds'] for record in records),
+            'num_threads': sum(record['num_threads'] for record in records),
+            'num_processes': len(records),
+            'time': current_time,
+            'monotonic': current_monotonic,
+            'processes': records,
+        }
+        stats['num_sockets'] = sum(record['num_sockets'] for record in records)
+        for name in ACCOUNTED_COUNTERS + UNACCOUNTED_COUNTERS:
+            total = self.carried[name] + sum(logformat.get_field(record, name) for record in records)
+            """ Like the cpu times, never let the totals go backwards """
+            total = max(total, self.previous_counters.get(name, 0))
+            self.previous_counters[name] = total
+            logformat.set_field(stats, name, total)
+        if pss:
+            for name in ['pss', 'uss', 'swap']:
+                stats['memory'][name] = sum(record['memory'][name] for record in records)
+        return stats
+
+
+def monitor_process_tree_stats(pid, interval=1, pss=False, log=None, smaps_every=None):
+    """ Print stats of the process and all its descendants in json format (or to the given log writer),
+        sampled every interval seconds (see ProcessTreeSampler) """
+    log = log or create_log_writer()
+    log_system_info(log)
+    try:
+        sampler = ProcessTreeSampler(pid, pss, interval, smaps_every)
+        log.info(*sampler.info())
+        cores = pinned_cores(sampler.root)
+        if cores:
+            core_usage(cores)
+        while True:
+            stats = sampler.sample()
+            if stats is None:
+                break
+            if cores:
+                stats['cores'] = core_usage(cores)
+            log.sample(stats)
+            log.flush()
+            time.sleep(interval)
     except psutil.Error:
         pass
     finally:
+        log.flush()
+        os.close(sys.stdout.fileno())
+        os.close(sys.stderr.fileno())
+
+
+class CgroupSampler:
+    """ Samples the stats of the cgroup of the process (see cgroups), until the process exits,
+        the totals of all the processes of the cgroup are accounted by the kernel, rather than discovered """
+
+    def __init__(self, path, pid):
+        self.process = psutil.Process(pid=pid)
+        self.reader = cgroups.CgroupStatReader(path)
+        self.previous_cpu, self.previous_time = None, None
+
+    def info(self):
+        """ Returns the process info line of the log """
+        process = self.process
+        return ['PID:', process.pid, 'PPID:', process.ppid(), 'USER:', process.username(), 'EXE:', process.exe(),
+                'CREATION:', process.create_time(), 'CGROUP:', self.reader.path,
+                'CONTROLLERS:', ','.join(cgroups.controllers(self.reader.path))] + scheduling_info(process)
+
+    def sample(self, current_time=None, current_monotonic=None):
+        """ Returns the stats of the cgroup, or None once the process has exited """
+        try:
+            if self.process.status() == psutil.STATUS_ZOMBIE:
+                return None
+            stats = self.reader.read_stats()
+        except (psutil.NoSuchProcess, OSError):
+            return None
+        current_time, current_monotonic = current_time or time.time(), current_monotonic or time.monotonic()
+        cpu = stats['cpu_times']['user'] + stats['cpu_times']['system']
+        if self.previous_cpu is None or current_time <= self.previous_time:
+            cpu_percent = 0.0
+        else:
+            cpu_percent = 100 * (cpu - self.previous_cpu) / (current_time - self.previous_time)
+        self.previous_cpu, self.previous_time = cpu, current_time
+        stats.update(cpu_percent=round(cpu_percent, 1), time=current_time, monotonic=current_monotonic)
+        return stats
+
+    def close(self):
+        self.reader.close()
+
+
+def monitor_cgroup_stats(path, pid, interval=1, log=None):
+    """ Print stats of the cgroup of the process in json format (or to the given log writer),
+        sampled every interval seconds on a fixed cadence, until the process exits (see CgroupSampler) """
+    log = log or create_log_writer()
+    log_system_info(log)
+    try:
+        sampler = CgroupSampler(path, pid)
+        log.info(*sampler.info())
+        cores = pinned_cores(sampler.process)
+        if cores:
+            core_usage(cores)
+        next_tick = time.monotonic()
+        while True:
+            stats = sampler.sample()
+            if stats is None:
+                break
+            if cores:
+                stats['cores'] = core_usage(cores)
+            log.sample(stats)
+            log.flush()
+            next_tick += interval
+            time.sleep(max(next_tick - time.monotonic(), 0))
+        sampler.close()
+    except (psutil.Error, OSError):
+        pass
+    finally:
+        log.flush()
+        os.close(sys.stdout.fileno())
+        os.close(sys.stderr.fileno())
+
+
+""" Sample logged by the procfs sampler, in the same json format as monitor_process_stats,
+    formatted directly to avoid the cost of json.dumps on every sample """
+PROCFS_SAMPLE_FORMAT = '{"cpu_times": {"user": %r, "system": %r}, "cpu_percent": %.1f, ' \
+                       '"memory": {"rss": %d, "vms": %d}, "num_fds": %d, "num_threads": %d, "time": %r, ' \
+                       '"monotonic": %r, ' \
+                       '"ctx_switches": {"voluntary": %d, "involuntary": %d}, "page_faults": {"minor": %d, ' \
+                       '"major": %d}, "io": {"read_bytes": %d, "write_bytes": %d}, "num_sockets": %d, ' \
+                       '"monitor": {"cpu_time": %r, "missed_ticks": %d}}\n'
+
+
+def monitor_process_procfs_stats(pid, interval=1, flush_interval=1, log=None, threads=False, pss=False,
+                                 smaps_every=None):
+    """ Print stats of the process in json format (or to the given log writer), reading them directly
+        from /proc with the files kept open, which is cheap enough to sample at intervals down to 10ms.
+        Samples are taken on a fixed cadence which does not drift, if a tick is missed it is skipped
+        and counted. Each sample also logs the cpu time consumed by this monitoring process itself,
+        the kernel counters read in the same pass, the cpu times of each thread if threads is set, and
+        the pss, uss and swap if pss is set (read every smaps_every samples, see procfs.SmapsSampler).
+        Output is flushed every flush_interval seconds, instead of on every sample.
+        Note: cpu times are only as precise as the kernel clock ticks (usually 10ms) """
+    log = log or create_log_writer()
+    log_system_info(log)
+    reader = None
+    try:
+        process = psutil.Process(pid=pid)
+        log.info('PID:', process.pid, 'PPID:', process.ppid(), 'USER:', process.username(),
+                 'EXE:', process.exe(), 'CREATION:', process.create_time(), *scheduling_info(process))
+        reader = procfs.ProcessStatReader(pid, interval)
+        cores = pinned_cores(process)
+        if cores:
+            core_usage(cores)
+        smaps = procfs.SmapsSampler(pid, interval, smaps_every) if pss else None
+        """ Text logs are formatted directly, skipping the generic (slower) sample writer,
+            unless the usage of the pinned cores, the thread times or the smaps memory are logged as well """
+        fast = isinstance(log, logformat.JsonLogWriter) and not cores and not threads and not smaps
+        write = log.stream.write if fast else None
+        missed_ticks, previous_cpu, previous_tick = 0, None, None
+        next_tick = next_flush = time.monotonic()
+        while True:
+            stat = reader.read_stat()
+            if stat['state'] == 'Z':
+                break
+            current_tick, current_time = time.monotonic(), time.time()
+            cpu = stat['user'] + stat['system']
+            cpu_percent = 0.0 if previous_cpu is None else 100 * (cpu - previous_cpu) / (current_tick - previous_tick)
+            previous_cpu, previous_tick = cpu, current_tick
+            counters, num_fds = reader.read_counters(stat)
+            if write:
+                ctx_switches, page_faults, io = counters['ctx_switches'], counters['page_faults'], counters['io']
+                write(PROCFS_SAMPLE_FORMAT % (stat['user'], stat['system'], cpu_percent, stat['rss'], stat['vms'],
+                                              num_fds, stat['num_threads'], current_time, current_tick,
+                                              ctx_switches['voluntary'], ctx_switches['involuntary'],
+                                              page_faults['minor'], page_faults['major'],
+                                              io['read_bytes'], io['write_bytes'], counters['num_sockets'],
+                                              time.process_time(), missed_ticks))
+            else:
+                stats = {
+                    'cpu_times': {'user': stat['user'], 'system': stat['system']},
+                    'cpu_percent': cpu_percent,
+                    'memory': {'rss': stat['rss'], 'vms': stat['vms']},
+                    'num_fds': num_fds,
+                    'num_threads': stat['num_threads'],
+                    'time': current_time,
+                    'monotonic': current_tick,
+                    'monitor': {'cpu_time': time.process_time(), 'missed_ticks': missed_ticks},
+                }
+                stats.update(counters)
+                if smaps:
+                    stats['memory'].update(smaps.sample())
+                if threads:
+                    stats['threads'] = procfs.read_thread_times(pid)
+                if cores:
+                    stats['cores'] = core_usage(cores)
+                log.sample(stats)
+            if current_tick >= next_flush:
+                log.flush()
+                next_flush = current_tick + flush_interval
+            """ Schedule relative to the previous tick and not to the current time, so that the cadence does
+                not drift, ticks which are already past are skipped """
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                skipped = int(-delay / interval) + 1
+                missed_ticks += skipped
+                next_tick += skipped * interval
+                delay += skipped * interval
+            time.sleep(delay)
+    except (psutil.Error, OSError):
+        pass
+    finally:
+        if reader:
+            reader.close()
+        log.flush()
         os.close(sys.stdout.fileno())
         os.close(sys.stderr.fileno())
 
 
-def execute_command(command, wait=0, out_log_file=None, err_log_file=None):
-    """ Wait for some time and then execute the command """
+def execute_command(command, wait=0, out_log_file=None, err_log_file=None, events_file=None, event=None):
+    """ Wait for some time and then execute the command,
+        recording the event (like server_start) to the events log just before executing, if given """
     print("waiting for ", wait, 'seconds before executing command', command)
     time.sleep(wait)
     """ Can't read from standard input """
@@ -94,22 +576,46 @@ def execute_command(command, wait=0, out_log_file=None, err_log_file=None):
         os.dup2(f.fileno(), sys.stderr.fileno())
 
     cmd = shlex.split(command)
+    if events_file and event:
+        record_event(events_file, event, pid=os.getpid(), command=command)
     os.execvp(cmd[0], cmd)
 
 
-def create_daemon_and_monitor(pid, interval=1, log_file=None, on_complete_handler=None):
+def create_daemon_and_monitor(pid, interval=1, log_file=None, on_complete_handler=None, tree=False, pss=False,
+                              sampler='psutil', log_format='json', scheduling=None, threads=False, smaps_every=None,
+                              cgroup=None):
     """ This function creates a daemon process after forking and monitors the given pid,
-        after termination of process which it monitors, it call the complete handler if any
+        after termination of process which it monitors, it call the complete handler if any,
+        if tree is set, the process along with all its descendants are monitored,
+        sampler selects how a single process is sampled, either using psutil or reading /proc directly,
+        log_format selects the format of the log file, either json (text) or binary,
+        scheduling holds the settings (see apply_scheduling) of the daemon, applied over those inherited from
+        the calling process, which should fork the daemon before applying settings of its own,
+        threads logs the cpu times of each thread of a single process,
+        pss logs the pss, uss and swap read from smaps_rollup every smaps_every samples (adaptively if not given),
+        if cgroup (the path of the cgroup the process is in) is given, the cgroup is sampled instead
      """
     daemon_pid = os.fork()
     if daemon_pid == 0:
         """ Child process becomes the daemon """
         daemon_process(log_file)
-        monitor_process_stats(pid, interval)
+        if scheduling:
+            apply_scheduling(**scheduling)
+        log = create_log_writer(log_format)
+        if cgroup:
+            monitor_cgroup_stats(cgroup, pid, interval, log=log)
+        elif tree:
+            monitor_process_tree_stats(pid, interval, pss, log=log, smaps_every=smaps_every)
+        elif sampler == 'procfs':
+            monitor_process_procfs_stats(pid, interval, log=log, threads=threads, pss=pss, smaps_every=smaps_every)
+        else:
+            monitor_process_stats(pid, interval, log=log, threads=threads, pss=pss, smaps_every=smaps_every)
         if on_complete_handler:
             """ Note: any logging in this handler will go to the
              log file given to the daemon"""
             on_complete_handler()
+        """ The daemon must not return to the code of the process it was forked from """
+        os._exit(0)
     return daemon_pid
 
 
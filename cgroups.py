@@ -0,0 +1,253 @@
+"""
+    This file contains the cgroup v2 accounting mode, where the server and client are each placed in a cgroup
+    of their own (where permitted) and the cgroup is sampled instead of its processes.
+    The kernel accounts every process of a cgroup to it, so a few reads per tick (cpu.stat, memory.current,
+    memory.peak, memory.stat, io.stat, pids.current) give exact totals of the whole process tree whatever the
+    number of processes, including the processes which lived too short to be seen by polling them.
+    Samples are logged by bench.monitor_cgroup_stats (or the collector) in the same format as the process
+    monitors (see bench.monitor_process_stats), the memory is the memory charged to the cgroup (memory.current,
+    which includes its page cache) rather than the RSS, and the number of threads is the number of tasks,
+    a cgroup has no virtual memory size and file descriptors, so they are not logged.
+    The memory and pids controllers are required, as the memory and number of threads can't be told otherwise,
+    so the cgroups are not used unless they can be enabled. The files of the io controller are missing if it is
+    not enabled, its fields are then not logged, cpu.stat is always available.
+"""
+
+import os
+import time
+import signal
+
+""" The controllers enabled for the cgroups of the benchmark, if available """
+CONTROLLERS = ['cpu', 'memory', 'io', 'pids']
+""" The controllers without which the cgroups are not sampled """
+REQUIRED_CONTROLLERS = ['memory', 'pids']
+READ_SIZE = 65536
+""" The leaf cgroup this process is moved to, if required to enable the controllers (see enable_controllers) """
+MONITOR_CGROUP = 'benchmark-monitor'
+""" Time to wait for the killed processes to leave a cgroup before removing it """
+REMOVE_TIMEOUT = 5
+
+
+def find_mount():
+    """ Returns the mount point of the cgroup v2 hierarchy, either the root of the cgroups or the unified
+        hierarchy of the hybrid setups, None if not mounted """
+    with open('/proc/self/mountinfo') as file:
+        for line in file:
+            fields = line.split()
+            """ The optional fields are terminated by a single dash, followed by the file system type """
+            separator = fields.index('-')
+            if fields[separator + 1] == 'cgroup2':
+                return fields[4]
+    return None
+
+
+def current_cgroup(pid='self'):
+    """ Returns the path of the cgroup v2 of the process, relative to the mount point """
+    with open('/proc/%s/cgroup' % pid) as file:
+        for line in file:
+            hierarchy, _, path = line.rstrip('\n').split(':', 2)
+            if hierarchy == '0':
+                return path
+    return None
+
+
+def enable_controllers(parent):
+    """ Enables the controllers available for the children of the parent cgroup, if permitted (delegated),
+        controllers can't be enabled for the children of a cgroup holding processes of its own, so if the parent
+        holds this process only (as in a delegated scope: systemd-run --user --scope -p Delegate=yes ...),
+        it is moved to a leaf cgroup first (see leave_monitor_cgroup), returns the controllers enabled """
+    with open(os.path.join(parent, 'cgroup.controllers')) as file:
+        available = [controller for controller in file.read().split() if controller in CONTROLLERS]
+    if not available:
+        return []
+    if cgroup_pids(parent) == [os.getpid()]:
+        leaf = os.path.join(parent, MONITOR_CGROUP)
+        os.makedirs(leaf, exist_ok=True)
+        join_cgroup(leaf)
+    for controller in available:
+        try:
+            with open(os.path.join(parent, 'cgroup.subtree_control'), 'w') as file:
+                file.write('+' + controller)
+        except OSError:
+            pass
+    with open(os.path.join(parent, 'cgroup.subtree_control')) as file:
+        return file.read().split()
+
+
+def create_cgroups(names):
+    """ Creates a cgroup for each of the names below the cgroup of this process, enabling the controllers
+        available, returns their paths, raises OSError if cgroup v2 is not mounted, they can't be created, or the
+        required controllers can't be enabled for them (they are then removed) """
+    mount = find_mount()
+    if mount is None:
+        raise OSError("cgroup v2 is not mounted")
+    parent = os.path.join(mount, current_cgroup().lstrip('/'))
+    enable_controllers(parent)
+    paths = [os.path.join(parent, name.replace('/', '_')) for name in names]
+    for path in paths:
+        """ Left over by an aborted run """
+        os.makedirs(path, exist_ok=True)
+    missing = [controller for controller in REQUIRED_CONTROLLERS if controller not in controllers(paths[0])]
+    if missing:
+        for path in paths:
+            remove_cgroup(path, timeout=0)
+        raise OSError("the %s controllers can't be enabled (not delegated)" % ', '.join(missing))
+    return paths
+
+
+def controllers(path):
+    """ Returns the controllers enabled for the cgroup """
+    with open(os.path.join(path, 'cgroup.controllers')) as file:
+        return file.read().split()
+
+
+def join_cgroup(path, pid=0):
+    """ Moves the process (this process by default) into the cgroup, the processes it forks from then on
+        are created in the cgroup """
+    with open(os.path.join(path, 'cgroup.procs'), 'w') as file:
+        file.write(str(pid))
+
+
+def cgroup_pids(path):
+    """ Returns the pids of the processes of the cgroup """
+    with open(os.path.join(path, 'cgroup.procs')) as file:
+        return [int(line) for line in file if line.strip()]
+
+
+def kill_cgroup(path):
+    """ Kills all the processes of the cgroup, at once with cgroup.kill (linux 5.14), else one by one """
+    try:
+        with open(os.path.join(path, 'cgroup.kill'), 'w') as file:
+            file.write('1')
+        return
+    except FileNotFoundError:
+        pass
+    for pid in cgroup_pids(path):
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def remove_cgroup(path, timeout=REMOVE_TIMEOUT):
+    """ Removes the cgroup once its processes have left it, killing those left after the timeout,
+        returns whether it was removed """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            os.rmdir(path)
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError:
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+    kill_cgroup(path)
+    time.sleep(0.1)
+    try:
+        os.rmdir(path)
+        return True
+    except OSError:
+        return False
+
+
+def leave_monitor_cgroup(timeout=REMOVE_TIMEOUT):
+    """ Moves this process back to the parent cgroup from the leaf cgroup it was moved to by enable_controllers
+        (if it was) and removes the leaf, once the processes forked in it (like the monitoring daemons) exited,
+        within the timeout. The controllers of the children of the parent are disabled first, as a cgroup (but
+        the root) can't hold processes while they are enabled, so the leaf is kept while the parent has other
+        child cgroups (like those of a concurrent run), returns whether no leaf is left """
+    mount, path = find_mount(), current_cgroup()
+    if mount is None or path is None or os.path.basename(path) != MONITOR_CGROUP:
+        return True
+    leaf = os.path.join(mount, path.lstrip('/'))
+    parent = os.path.dirname(leaf)
+    deadline = time.monotonic() + timeout
+    try:
+        while cgroup_pids(leaf) != [os.getpid()]:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        if any(entry.is_dir() and entry.name != MONITOR_CGROUP for entry in os.scandir(parent)):
+            return False
+        if os.path.normpath(parent) != os.path.normpath(mount):
+            with open(os.path.join(parent, 'cgroup.subtree_control')) as file:
+                enabled = file.read().split()
+            for controller in enabled:
+                with open(os.path.join(parent, 'cgroup.subtree_control'), 'w') as file:
+                    file.write('-' + controller)
+        join_cgroup(parent)
+        os.rmdir(leaf)
+    except OSError:
+        return False
+    return True
+
+
+def parse_keyed(data):
+    """ Parses the flat keyed files (cpu.stat, memory.stat), a key and an integer value per line """
+    values = {}
+    for line in data.splitlines():
+        key, _, value = line.partition(b' ')
+        values[key.decode()] = int(value)
+    return values
+
+
+def parse_io_stat(data):
+    """ Parses io.stat, a line per device of key=value pairs, returns the totals over all devices """
+    totals = {}
+    for line in data.splitlines():
+        for pair in line.split()[1:]:
+            key, _, value = pair.partition(b'=')
+            totals[key.decode()] = totals.get(key.decode(), 0) + int(value)
+    return totals
+
+
+class CgroupStatReader:
+    """ Reads the stats of the cgroup, keeping its files open between reads """
+
+    FILES = ['cpu.stat', 'memory.current', 'memory.peak', 'memory.stat', 'io.stat', 'pids.current', 'cgroup.procs']
+
+    def __init__(self, path):
+        self.path = path
+        self.fds = {}
+        try:
+            for name in self.FILES:
+                try:
+                    self.fds[name] = os.open(os.path.join(path, name), os.O_RDONLY)
+                except FileNotFoundError:
+                    """ The io controller is not enabled for the cgroup, or the kernel is older (memory.peak) """
+                    if name in ['cpu.stat', 'memory.current', 'pids.current']:
+                        raise
+        except OSError:
+            self.close()
+            raise
+
+    def read(self, name):
+        return os.pread(self.fds[name], READ_SIZE, 0)
+
+    def read_stats(self):
+        """ Returns the stats of the cgroup in the fields of the monitor logs, but the cpu percent and time,
+            the fields of the io controller are missing if it is not enabled """
+        cpu = parse_keyed(self.read('cpu.stat'))
+        """ The number of processes is not accounted by the kernel, it is the only read which grows with them """
+        stats = {
+            'cpu_times': {'user': cpu['user_usec'] / 1e6, 'system': cpu['system_usec'] / 1e6},
+            'memory': {'rss': int(self.read('memory.current'))},
+            'num_threads': int(self.read('pids.current')),
+            'num_processes': len(self.read('cgroup.procs').split()),
+        }
+        if 'memory.peak' in self.fds:
+            stats['memory']['peak'] = int(self.read('memory.peak'))
+        if 'memory.stat' in self.fds:
+            memory = parse_keyed(self.read('memory.stat'))
+            stats['page_faults'] = {'minor': memory['pgfault'] - memory['pgmajfault'], 'major': memory['pgmajfault']}
+        if 'io.stat' in self.fds:
+            io = parse_io_stat(self.read('io.stat'))
+            stats['io'] = {'read_bytes': io.get('rbytes', 0), 'write_bytes': io.get('wbytes', 0)}
+        return stats
+
+    def close(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds = {}
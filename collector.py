@@ -0,0 +1,257 @@
+"""
+    This file contains the collector, a single monitoring daemon which watches any number of processes (targets)
+    from one loop, instead of a daemon per monitored process.
+    Every target is sampled on a shared tick, so the samples of the client and server carry the same time and
+    are aligned, and the log of each target is written with buffered writes, flushed every flush interval.
+    Single processes are sampled from /proc with their files kept open (see procfs), process trees
+    with bench.ProcessTreeSampler, and processes placed in a cgroup of their own with bench.CgroupSampler.
+    When a target exits, its log is closed and its completion handler is called (in the collector process),
+    like the on_complete_handler of bench.create_daemon_and_monitor, and each sample of a target can be
+    passed to its sample handler, for online analysis like steady state detection (see steady).
+    Targets can also be registered after the collector started, by writing to its control pipe (see register_target),
+    the collector exits once all the targets exited and the control pipe was closed by all its writers.
+"""
+
+import os
+import json
+import time
+import select
+import psutil
+import traceback
+import procfs
+import logformat
+from bench import daemon_process
+from bench import apply_scheduling
+from bench import scheduling_info
+from bench import log_system_info
+from bench import ProcessTreeSampler
+from bench import CgroupSampler
+
+""" Buffer size of the log files, samples are written to the buffer and flushed every flush interval """
+LOG_BUFFER_SIZE = 1 << 16
+
+
+class ProcessSampler:
+    """ Samples the stats of a single process from /proc, the cpu percent is computed over the shared tick """
+
+    def __init__(self, pid, threads=False, pss=False, interval=1, smaps_every=None):
+        self.process = psutil.Process(pid=pid)
+        self.reader = procfs.ProcessStatReader(pid, interval)
+        self.threads = threads
+        self.smaps = procfs.SmapsSampler(pid, interval, smaps_every) if pss else None
+        self.previous_cpu, self.previous_time = None, None
+
+    def info(self):
+        """ Returns the process info line of the log """
+        process = self.process
+        return ['PID:', process.pid, 'PPID:', process.ppid(), 'USER:', process.username(), 'EXE:', process.exe(),
+                'CREATION:', process.create_time()] + scheduling_info(process)
+
+    def sample(self, current_time=None, current_monotonic=None):
+        """ Returns the stats of the process, or None once it has exited """
+        try:
+            stat = self.reader.read_stat()
+            counters, num_fds = self.reader.read_counters(stat)
+            thread_times = procfs.read_thread_times(self.process.pid) if self.threads else None
+            memory = self.smaps.sample() if self.smaps else {}
+        except OSError:
+            return None
+        if stat['state'] == 'Z':
+            return None
+        current_time, current_monotonic = current_time or time.time(), current_monotonic or time.monotonic()
+        cpu = stat['user'] + stat['system']
+        if self.previous_cpu is None or current_time <= self.previous_time:
+            cpu_percent = 0.0
+        else:
+            cpu_percent = 100 * (cpu - self.previous_cpu) / (current_time - self.previous_time)
+        self.previous_cpu, self.previous_time = cpu, current_time
+        stats = {
+            'cpu_times': {'user': stat['user'], 'system': stat['system']},
+            'cpu_percent': round(cpu_percent, 1),
+            'memory': dict(memory, rss=stat['rss'], vms=stat['vms']),
+            'num_fds': num_fds,
+            'num_threads': stat['num_threads'],
+            'time': current_time,
+            'monotonic': current_monotonic,
+        }
+        stats.update(counters)
+        if thread_times is not None:
+            stats['threads'] = thread_times
+        return stats
+
+    def close(self):
+        self.reader.close()
+
+
+class Target:
+    """ A process (or process tree) watched by the collector, logged to its own log file """
+
+    def __init__(self, pid, log_file, tree=False, pss=False, on_complete=None, threads=False, smaps_every=None,
+                 cgroup=None, on_sample=None):
+        self.pid = pid
+        self.cgroup = cgroup
+        self.threads = threads
+        """ Absolute path, as the collector daemon changes its working directory """
+        self.log_file = os.path.abspath(log_file)
+        self.tree = tree
+        self.pss = pss
+        self.smaps_every = smaps_every
+        self.on_complete = on_complete
+        self.on_sample = on_sample
+        self.sampler = None
+        self.log = None
+        self.file = None
+        self.cores = None
+
+    def start(self, log_format='json', interval=1):
+        """ Opens the log and the sampler, returns False if the process has already exited """
+        if log_format == 'binary':
+            self.file = open(self.log_file, 'wb', buffering=LOG_BUFFER_SIZE)
+            self.log = logformat.BinaryLogWriter(self.file)
+        else:
+            self.file = open(self.log_file, 'w', buffering=LOG_BUFFER_SIZE)
+            self.log = logformat.JsonLogWriter(self.file)
+        log_system_info(self.log)
+        try:
+            if self.cgroup:
+                self.sampler = CgroupSampler(self.cgroup, self.pid)
+            elif self.tree:
+                self.sampler = ProcessTreeSampler(self.pid, self.pss, interval, self.smaps_every)
+            else:
+                self.sampler = ProcessSampler(self.pid, self.threads, self.pss, interval, self.smaps_every)
+            self.log.info(*self.sampler.info())
+            process = self.sampler.root if isinstance(self.sampler, ProcessTreeSampler) else self.sampler.process
+            cores = process.cpu_affinity()
+            self.cores = cores if len(cores) < psutil.cpu_count() else None
+        except (psutil.Error, OSError):
+            return False
+        return True
+
+    def sample(self, current_time, current_monotonic, core_usage=None):
+        """ Logs a sample of the target, returns False once the process has exited """
+        try:
+            stats = self.sampler.sample(current_time, current_monotonic)
+        except psutil.Error:
+            stats = None
+        if stats is None:
+            return False
+        if self.cores and core_usage:
+            stats['cores'] = {str(core): core_usage[core] for core in self.cores}
+        self.log.sample(stats)
+        if self.on_sample:
+            self.on_sample(stats)
+        return True
+
+    def flush(self):
+        self.log.flush()
+
+    def close(self):
+        """ Closes the log of the target, and calls its completion handler """
+        self.log.flush()
+        self.file.close()
+        if isinstance(self.sampler, (ProcessSampler, CgroupSampler)):
+            self.sampler.close()
+        if self.on_complete:
+            self.on_complete()
+
+
+def register_target(control_fd, pid, log_file, tree=False, pss=False, threads=False, smaps_every=None):
+    """ Registers a target with a running collector, by writing to the write end of its control pipe,
+        a registration is a single small write, so several processes can register concurrently """
+    message = {'pid': pid, 'log_file': os.path.abspath(log_file), 'tree': tree, 'pss': pss, 'threads': threads,
+               'smaps_every': smaps_every}
+    os.write(control_fd, (json.dumps(message) + '\n').encode())
+
+
+class Collector:
+    """ Samples all the targets on a shared tick from a single loop """
+
+    def __init__(self, targets=(), control_fd=None, interval=1, flush_interval=1, log_format='json'):
+        self.targets = []
+        self.control_fd = control_fd
+        self.pending = b''
+        self.interval = interval
+        self.flush_interval = flush_interval
+        self.log_format = log_format
+        for target in targets:
+            self.add(target)
+
+    def add(self, target):
+        if target.start(self.log_format, self.interval):
+            self.targets.append(target)
+        else:
+            target.close()
+
+    def read_control(self):
+        """ Registers the targets written to the control pipe, closes it once all its writers closed it """
+        data = os.read(self.control_fd, 65536)
+        if not data:
+            os.close(self.control_fd)
+            self.control_fd = None
+            return
+        *messages, self.pending = (self.pending + data).split(b'\n')
+        for message in messages:
+            message = json.loads(message)
+            self.add(Target(message['pid'], message['log_file'], message['tree'], message['pss'],
+                            threads=message['threads'], smaps_every=message['smaps_every']))
+
+    def wait(self, timeout):
+        """ Waits for the timeout, reading the control pipe in the meanwhile """
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self.control_fd is None:
+                time.sleep(remaining)
+                break
+            readable, _, _ = select.select([self.control_fd], [], [], remaining)
+            if readable:
+                self.read_control()
+
+    def run(self):
+        """ Samples the targets every interval on a fixed cadence, until all exited and no more can be registered """
+        next_tick = next_flush = time.monotonic()
+        """ Per core usage is only needed if some target is pinned, and is read once per tick for all targets """
+        psutil.cpu_percent(percpu=True)
+        while self.targets or self.control_fd is not None:
+            current_time, current_monotonic = time.time(), time.monotonic()
+            usage = psutil.cpu_percent(percpu=True) if any(target.cores for target in self.targets) else None
+            for target in list(self.targets):
+                if not target.sample(current_time, current_monotonic, usage):
+                    self.targets.remove(target)
+                    target.close()
+            current_tick = time.monotonic()
+            if current_tick >= next_flush:
+                for target in self.targets:
+                    target.flush()
+                next_flush = current_tick + self.flush_interval
+            """ Ticks which are already past are skipped, so the cadence does not drift """
+            next_tick += self.interval
+            if next_tick < current_tick:
+                next_tick += (int((current_tick - next_tick) / self.interval) + 1) * self.interval
+            self.wait(next_tick - time.monotonic())
+
+
+def create_collector(targets, control=None, interval=1, flush_interval=1, log_format='json', log_file=None,
+                     scheduling=None):
+    """ Forks a daemon process running the collector of the targets, and of those registered to the control pipe
+        (its read and write ends, as returned by os.pipe) if given, returns the pid of the daemon,
+        the errors of the collector are logged to the log file if given """
+    daemon_pid = os.fork()
+    if daemon_pid == 0:
+        daemon_process(log_file)
+        if scheduling:
+            apply_scheduling(**scheduling)
+        control_fd = None
+        if control:
+            """ The collector must not hold the write end, or it would never see the pipe closed """
+            control_fd, control_write_fd = control
+            os.close(control_write_fd)
+        try:
+            Collector(targets, control_fd, interval, flush_interval, log_format).run()
+        except Exception:
+            traceback.print_exc()
+        """ The daemon must not return to the code of the process it was forked from """
+        os._exit(0)
+    return daemon_pid
@@ -0,0 +1,59 @@
+"""
+    This file contains methods to downsample long metric series before plotting, preserving the peaks.
+    LTTB (Largest Triangle Three Buckets) keeps the points which preserve the visual shape of the series,
+    min-max keeps the smallest and the largest point of each bucket, so no spike is ever lost.
+"""
+
+import numpy
+
+
+def lttb(x, y, num_points):
+    """ Downsamples the series to num_points using Largest Triangle Three Buckets,
+        the first and last points are always kept, series with fewer points are returned as is """
+    x, y = numpy.asarray(x, dtype=numpy.float64), numpy.asarray(y, dtype=numpy.float64)
+    if num_points >= len(x) or num_points < 3:
+        return x, y
+    """ Bucket boundaries of the points between the first and the last point """
+    edges = numpy.linspace(1, len(x) - 1, num_points - 1).astype(numpy.int64)
+    selected = numpy.zeros(num_points, dtype=numpy.int64)
+    selected[-1] = len(x) - 1
+    for bucket in range(num_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        """ The third point of the triangle is the average of the next bucket """
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else len(x)
+        average_x, average_y = x[end:next_end].mean(), y[end:next_end].mean()
+        previous_x, previous_y = x[selected[bucket]], y[selected[bucket]]
+        """ Twice the area of the triangles formed with the previously selected point """
+        areas = numpy.abs((previous_x - average_x) * (y[start:end] - previous_y) -
+                          (previous_x - x[start:end]) * (average_y - previous_y))
+        selected[bucket + 1] = start + numpy.argmax(areas)
+    return x[selected], y[selected]
+
+
+def min_max(x, y, num_points):
+    """ Downsamples the series to about num_points by keeping the minimum and the maximum of each bucket,
+        (num_points / 2 buckets of equal number of points), series with fewer points are returned as is """
+    x, y = numpy.asarray(x, dtype=numpy.float64), numpy.asarray(y, dtype=numpy.float64)
+    if num_points >= len(x) or num_points < 2:
+        return x, y
+    bucket_size = -(-len(y) // (num_points // 2))
+    num_buckets = -(-len(y) // bucket_size)
+    """ Pad the last bucket, so that the buckets can be reduced as the rows of a matrix """
+    buckets = numpy.full(num_buckets * bucket_size, numpy.nan)
+    buckets[:len(y)] = y
+    buckets = buckets.reshape(num_buckets, bucket_size)
+    offsets = numpy.arange(num_buckets) * bucket_size
+    selected = numpy.unique(numpy.concatenate([
+        [0, len(y) - 1],
+        offsets + numpy.nanargmin(buckets, axis=1),
+        offsets + numpy.nanargmax(buckets, axis=1),
+    ]))
+    return x[selected], y[selected]
+
+
+METHODS = {'lttb': lttb, 'minmax': min_max}
+
+
+def downsample(x, y, num_points, method='lttb'):
+    """ Downsamples the series to about num_points using the given method (lttb or minmax) """
+    return METHODS[method](x, y, num_points)
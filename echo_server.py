@@ -0,0 +1,83 @@
+"""
+    This script is a stand-in server to test the load generator (loadgen.py) and the monitoring against,
+    it echoes each request line back over tcp, or responds to each http request with its body.
+    An optional delay (or a randomly distributed one) simulates the processing time of each request.
+"""
+import argparse
+import asyncio
+import random
+
+
+def create_handler(protocol, delay=0, jitter=0):
+    """ Returns the connection handler of the server, serving requests until the client closes the connection """
+
+    async def process():
+        if delay or jitter:
+            await asyncio.sleep(delay + random.expovariate(1 / jitter) if jitter else delay)
+
+    async def serve_tcp(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            await process()
+            writer.write(line if line.endswith(b'\n') else line + b'\n')
+            await writer.drain()
+
+    async def serve_http(reader, writer):
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                if key.strip().lower() == 'content-length':
+                    length = int(value)
+            body = await reader.readexactly(length)
+            await process()
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+
+    serve = serve_http if protocol == 'http' else serve_tcp
+
+    async def handler(reader, writer):
+        try:
+            await serve(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', help='the address to listen on', default='localhost')
+    parser.add_argument('--port', '-p', help='the port to listen on', type=int, required=True)
+    parser.add_argument('--protocol', help='echo request lines over tcp, or http/1.1 requests',
+                        choices=['tcp', 'http'], default='tcp')
+    parser.add_argument('--delay', help='the time (seconds) taken to process each request', type=float, default=0)
+    parser.add_argument('--jitter', help='the mean of an exponentially distributed time (seconds) added to '
+                                         'the delay of each request', type=float, default=0)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(create_handler(args.protocol, args.delay, args.jitter),
+                                                          args.host, args.port))
+    print("listening on", args.host, args.port, flush=True)
+    try:
+        loop.run_until_complete(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+    This file contains the events log of a run, where the processes of a run (monitor.py, the server and client
+    launchers) record the events of the run (server start, ready, client start and exit, server kill and exit),
+    a json object per line with the time of the event on both the wall clock and the monotonic clock.
+    It only depends on the standard library, so the logs of a run can be read without the monitoring dependencies.
+"""
+
+import os
+import json
+import time
+
+
+def record_event(events_file, event, **fields):
+    """ Appends the event with the current time (both wall clock and monotonic) and the given fields
+        to the events log, a json object per line, the events of all processes of a run share the log """
+    record = {'event': event, 'time': time.time(), 'monotonic': time.monotonic()}
+    record.update(fields)
+    """ Small appends are atomic, so processes can record events concurrently """
+    with open(events_file, 'a') as file:
+        file.write(json.dumps(record) + '\n')
+
+
+def read_events(events_file):
+    """ Returns the events recorded in the events log, in order """
+    if not os.path.exists(events_file):
+        return []
+    with open(events_file) as file:
+        return [json.loads(line) for line in file if line.endswith('\n')]
+
+
+def is_complete(events):
+    """ Returns whether the events are those of a run completed, that is the server exited after a client started,
+        and the run was not aborted as the server was not ready """
+    names = {event['event'] for event in events}
+    return 'server_exit' in names and 'client_start' in names and 'server_ready_timeout' not in names
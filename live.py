@@ -0,0 +1,103 @@
+"""
+    This script shows a live dashboard of a running benchmark scenario, by tailing the monitor logs of the
+    client and server while the monitoring processes append to them.
+    On each refresh only the newly appended bytes are parsed, and the same panels as plot.py are updated
+    in place, showing only the last window of samples, so the cost of a refresh stays the same no matter
+    how long the run has been going.
+    Use --image to periodically save the dashboard to an image instead (for machines without a display).
+"""
+import argparse
+import time
+import numpy
+import matplotlib
+import metrics
+
+
+def widen(records, appended):
+    """ Returns the records with the fields which appeared in the appended records, the earlier records take the
+        first value appended, so that the cumulative counters show no rate before they were logged """
+    widened = numpy.zeros(len(records), dtype=appended.dtype)
+    for name in appended.dtype.names:
+        widened[name] = records[name] if name in records.dtype.names else appended[name][0]
+    return widened
+
+
+class RollingWindow:
+    """ Keeps the records of a monitor log within the last window seconds, as the log is tailed """
+
+    def __init__(self, log_file, window):
+        self.tail = metrics.LogTail(log_file)
+        self.window = window
+        self.records = None
+        self.start_time = None
+
+    def refresh(self):
+        """ Reads the newly appended records, returns whether any were appended """
+        records = self.tail.read()
+        if records is None or not len(records):
+            return False
+        if self.records is None:
+            self.records, self.start_time = records, records['time'][0]
+        else:
+            if records.dtype != self.records.dtype:
+                self.records = widen(self.records, records)
+            self.records = numpy.concatenate([self.records, records])
+        """ Drop the records older than the window """
+        start = numpy.searchsorted(self.records['time'], self.records['time'][-1] - self.window)
+        self.records = self.records[start:]
+        return True
+
+    def metrics(self):
+        """ Returns the metric series of the records in the window, with time relative to the first sample """
+        return metrics.compute_metrics(self.records, self.start_time)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', '-S', help='specify the benchmark scenario', required=True)
+    parser.add_argument('--window', '-w', help='the number of seconds of samples shown', type=float, default=300)
+    parser.add_argument('--refresh', '-r', help='the interval in seconds between refreshes', type=float, default=1)
+    parser.add_argument('--max-points', '-n', help='downsample each series to about this many points',
+                        type=int, default=2000)
+    parser.add_argument('--image', help='save the dashboard to this image on every refresh, instead of showing it')
+    args = parser.parse_args()
+
+    if args.image:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import plot
+
+    windows = {
+        'server': RollingWindow(args.scenario + '-monitor-server.log', args.window),
+        'client': RollingWindow(args.scenario + '-monitor-client.log', args.window),
+    }
+    plt.figure(figsize=(20, 10))
+    plt.suptitle("Scenario: " + args.scenario + " (live)")
+    axes = dict(zip(['server', 'client'], plot.create_axes()))
+    plotted = set()
+    if not args.image:
+        plt.ion()
+        plt.show()
+
+    print("tailing monitor logs of scenario", args.scenario, "press Ctrl-C to stop")
+    try:
+        while args.image or plt.get_fignums():
+            for role, window in windows.items():
+                if not window.refresh():
+                    continue
+                if role in plotted:
+                    plot.update_metrics(axes[role], window.metrics(), args.max_points, 'minmax')
+                else:
+                    plot.plot_metrics(axes[role], window.metrics(), role + ' ', args.max_points, 'minmax')
+                    plotted.add(role)
+            if args.image:
+                plt.savefig(args.image)
+                time.sleep(args.refresh)
+            else:
+                plt.pause(args.refresh)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""
+    This script is a load generator client, replaying the requests of a JSONL file against the server,
+    over TCP (newline delimited request and response lines) or HTTP/1.1 (keep-alive connections).
+    The request file is streamed, a line is read only when its request is about to be sent.
+    Each line is a json object, for tcp {"data": "the request line"}, and for http
+    {"method": "POST", "path": "/", "headers": {...}, "body": "..."} (all optional, GET / by default).
+    Requests are sent either at a fixed arrival rate (open loop, --rate), where the latency of a request is
+    measured from the time it was scheduled to be sent rather than when a connection became free to send it,
+    so a stalled server is not hidden by the client backing off (coordinated omission),
+    or at a fixed concurrency (closed loop, --concurrency), each connection sending the next request as soon
+    as the response to the previous one is received.
+    The latencies are recorded in a histogram of bounded relative error (HDR style) and the percentiles and
+    throughput achieved are written to the report file with postfix -loadgen.json along with the monitor logs.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+
+""" The latencies are recorded in microseconds, with 3 significant digits """
+SIGNIFICANT_DIGITS = 3
+REPORTED_PERCENTILES = [50, 90, 99, 99.9, 99.99]
+
+
+class LatencyHistogram:
+    """ Histogram of values (integers) with the relative error bounded by the number of significant digits,
+        the values are bucketed by their power of 2, and each power of 2 is split linearly into sub buckets """
+
+    def __init__(self, significant_digits=SIGNIFICANT_DIGITS):
+        """ Number of sub buckets (a power of 2) for the values to be distinguished to the significant digits """
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.sub_bucket_count = 1 << self.sub_bucket_bits
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def index(self, value):
+        """ Returns the bucket of the value, values below the sub bucket count are exact """
+        bucket = max(value.bit_length() - self.sub_bucket_bits, 0)
+        return bucket, value >> bucket
+
+    def value(self, index):
+        """ Returns the highest value of the bucket """
+        bucket, sub_bucket = index
+        return ((sub_bucket + 1) << bucket) - 1
+
+    def record(self, value, count=1):
+        value = max(int(value), 0)
+        index = self.index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, percentile):
+        """ Returns the value at the given percentile (0 - 100) """
+        if not self.total:
+            return None
+        rank = max(math.ceil(self.total * percentile / 100), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.value(index), self.max)
+        return self.max
+
+    def mean(self):
+        if not self.total:
+            return None
+        """ The midpoint of each bucket """
+        return sum((self.value(index) + (index[1] << index[0])) / 2 * count
+                   for index, count in self.counts.items()) / self.total
+
+    def to_dict(self):
+        """ Returns the histogram as a json serializable dict, the buckets as [bucket, sub bucket, count] """
+        return {
+            'significant_digits': round(math.log10(self.sub_bucket_count / 2)),
+            'buckets': [[bucket, sub_bucket, count] for (bucket, sub_bucket), count in sorted(self.counts.items())],
+        }
+
+
+def read_requests(request_file):
+    """ Yields the requests of the JSONL file, one line at a time, blank lines are skipped """
+    with open(request_file) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def encode_tcp_request(request):
+    data = request.get('data', '')
+    if not isinstance(data, str):
+        data = json.dumps(data)
+    return data.encode() + b'\n'
+
+
+def encode_http_request(request, host):
+    body = request.get('body', '')
+    if not isinstance(body, (str, bytes)):
+        body = json.dumps(body)
+    if isinstance(body, str):
+        body = body.encode()
+    headers = {'Host': host, 'Content-Length': str(len(body))}
+    headers.update(request.get('headers', {}))
+    head = '%s %s HTTP/1.1\r\n' % (request.get('method', 'GET'), request.get('path', '/'))
+    head += ''.join('%s: %s\r\n' % item for item in headers.items())
+    return head.encode() + b'\r\n' + body
+
+
+async def read_tcp_response(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("connection closed by the server")
+    return True
+
+
+async def read_http_response(reader):
+    """ Reads the response, returns whether the status is a success (below 400),
+        the body must be delimited by Content-Length (or be chunked) """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed by the server")
+    status = int(status_line.split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        key, _, value = line.decode('latin-1').partition(':')
+        key = key.strip().lower()
+        if key == 'content-length':
+            length = int(value)
+        elif key == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status < 400
+
+
+class LoadGenerator:
+    """ Sends the requests over a pool of connections to the server, and records the latencies """
+
+    def __init__(self, host, port, protocol='tcp', connections=1):
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.connections = connections
+        self.idle = []
+        self.opened = 0
+        self.available = None
+        self.histogram = LatencyHistogram()
+        self.completed = 0
+        self.errors = 0
+
+    def encode(self, request):
+        if self.protocol == 'http':
+            return encode_http_request(request, '%s:%d' % (self.host, self.port))
+        return encode_tcp_request(request)
+
+    async def acquire(self):
+        """ Returns an idle connection, opening a new one while below the limit, else waits for one """
+        if self.available is None:
+            self.available = asyncio.Condition()
+        async with self.available:
+            while not self.idle and self.opened >= self.connections:
+                await self.available.wait()
+            if self.idle:
+                return self.idle.pop()
+            self.opened += 1
+        try:
+            return await asyncio.open_connection(self.host, self.port)
+        except OSError:
+            await self.release(None)
+            raise
+
+    async def release(self, connection):
+        """ Returns the connection to the pool, None if it was closed """
+        async with self.available:
+            if connection is None:
+                self.opened -= 1
+            else:
+                self.idle.append(connection)
+            self.available.notify()
+
+    def failed(self, error):
+        """ Reports the first failed request, returns False to be recorded as unsuccessful """
+        if not self.errors:
+            print("request failed:", repr(error), file=sys.stderr, flush=True)
+        return False
+
+    async def send(self, request, intended_time):
+        """ Sends the request and waits for its response, the latency is recorded from the intended time """
+        data = self.encode(request)
+        try:
+            connection = await self.acquire()
+        except OSError as error:
+            connection, success = None, self.failed(error)
+        else:
+            try:
+                reader, writer = connection
+                writer.write(data)
+                await writer.drain()
+                if self.protocol == 'http':
+                    success = await read_http_response(reader)
+                else:
+                    success = await read_tcp_response(reader)
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError) as error:
+                """ The connection is closed rather than reused, it may have a partial response pending """
+                connection[1].close()
+                connection, success = None, self.failed(error)
+            await self.release(connection)
+        latency = time.monotonic() - intended_time
+        self.completed += 1
+        if success:
+            self.histogram.record(latency * 1e6)
+        else:
+            self.errors += 1
+
+    async def run_open_loop(self, requests, rate, duration=None):
+        """ Sends the requests at the fixed rate (per second), each at its scheduled time,
+            regardless of the responses to the requests before it """
+        start_time = time.monotonic()
+        pending = set()
+        for count, request in enumerate(requests):
+            intended_time = start_time + count / rate
+            if duration and intended_time - start_time >= duration:
+                break
+            delay = intended_time - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.ensure_future(self.send(request, intended_time))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+
+    async def run_closed_loop(self, requests, concurrency, duration=None):
+        """ Sends the requests from the given number of concurrent senders, each sending its next request
+            once it received the response to the previous one """
+        start_time = time.monotonic()
+        requests = iter(requests)
+
+        async def sender():
+            for request in requests:
+                if duration and time.monotonic() - start_time >= duration:
+                    break
+                await self.send(request, time.monotonic())
+
+        await asyncio.gather(*[sender() for _ in range(concurrency)])
+
+    def report(self, elapsed):
+        """ Returns the summary of the run, latencies in milliseconds """
+        report = {
+            'requests': self.completed,
+            'errors': self.errors,
+            'duration': elapsed,
+            'throughput': self.histogram.total / elapsed if elapsed else 0,
+            'latency': {
+                'min': self.histogram.min,
+                'mean': self.histogram.mean(),
+                'max': self.histogram.max,
+            },
+        }
+        for percentile in REPORTED_PERCENTILES:
+            report['latency']['p%g' % percentile] = self.histogram.percentile(percentile)
+        report['latency'] = {key: value / 1000 if value is not None else None
+                             for key, value in report['latency'].items()}
+        report['histogram'] = self.histogram.to_dict()
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', '-r', help='the JSONL file of requests to replay', required=True)
+    parser.add_argument('--host', help='the host of the server', default='localhost')
+    parser.add_argument('--port', '-p', help='the port of the server', type=int, required=True)
+    parser.add_argument('--protocol', help='newline delimited requests and responses over tcp, or http/1.1',
+                        choices=['tcp', 'http'], default='tcp')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--rate', help='open loop, send requests at this fixed rate (per second)', type=float)
+    mode.add_argument('--concurrency', '-c', help='closed loop, send requests from this many concurrent connections',
+                      type=int)
+    parser.add_argument('--connections', help='the maximum number of connections in open loop mode',
+                        type=int, default=64)
+    parser.add_argument('--duration', '-d', help='stop sending after this many seconds, '
+                                                 'by default all the requests are sent', type=float)
+    parser.add_argument('--repeat', help='replay the request file this many times', type=int, default=1)
+    parser.add_argument('--scenario', '-S', help='the benchmark scenario, the report is written to the file '
+                                                 'with postfix -loadgen.json')
+    parser.add_argument('--report', help='the file to write the report to, instead of the scenario report file')
+    args = parser.parse_args()
+    if args.rate is not None and args.rate <= 0:
+        parser.error('--rate must be positive')
+    if args.concurrency is not None and args.concurrency <= 0:
+        parser.error('--concurrency must be positive')
+
+    def requests():
+        for _ in range(args.repeat):
+            yield from read_requests(args.requests)
+
+    generator = LoadGenerator(args.host, args.port, args.protocol,
+                              args.connections if args.rate is not None else args.concurrency)
+    loop = asyncio.new_event_loop()
+    start_time = time.monotonic()
+    if args.rate is not None:
+        loop.run_until_complete(generator.run_open_loop(requests(), args.rate, args.duration))
+    else:
+        loop.run_until_complete(generator.run_closed_loop(requests(), args.concurrency, args.duration))
+    report = generator.report(time.monotonic() - start_time)
+    report.update(mode='open' if args.rate is not None else 'closed', rate=args.rate, concurrency=args.concurrency,
+                  protocol=args.protocol)
+    loop.close()
+
+    print("requests:", report['requests'], "errors:", report['errors'],
+          "throughput: %.1f/s" % report['throughput'], flush=True)
+    print("latency (ms):", ', '.join('%s %.3f' % (key, value) for key, value in report['latency'].items()
+                                     if value is not None), flush=True)
+    report_file = args.report or (args.scenario + '-loadgen.json' if args.scenario else None)
+    if report_file:
+        with open(report_file, 'w') as file:
+            json.dump(report, file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+    This file contains the writers and readers of the monitor log files.
+    Monitor logs are either text (the default), two info lines (system info and process info)
+    followed by a json object per sample, or binary, a header holding the info lines and the
+    field layout followed by an array of fixed width records of packed float64/int64 fields.
+    Binary logs are memory mapped by the reader and loaded directly into numpy arrays.
+
+    To convert between the two formats run
+        python3 logformat.py --to-binary some-monitor-server.log some-monitor-server.bin
+        python3 logformat.py --to-json some-monitor-server.bin some-monitor-server.log
+"""
+
+import os
+import json
+import struct
+
+MAGIC = b'BENCHLOG'
+VERSION = 1
+""" Magic, version and header length, followed by the json header, padded to align the records """
+PREAMBLE = struct.Struct('<8sII')
+ALIGNMENT = 8
+
+""" Fields of a record, the name is the path to the value in the json sample, separated by dots,
+    the type is either f8 (float64) or i8 (int64) """
+SAMPLE_FIELDS = [
+    ('time', 'f8'),
+    ('cpu_times.user', 'f8'),
+    ('cpu_times.system', 'f8'),
+    ('cpu_percent', 'f8'),
+    ('memory.rss', 'i8'),
+    ('num_threads', 'i8'),
+]
+""" Fields logged only by some of the monitors, they are added to the record if present in the samples
+    (the cgroup monitors have no virtual memory size and file descriptors to log) """
+OPTIONAL_FIELDS = [
+    ('memory.vms', 'i8'),
+    ('num_fds', 'i8'),
+    ('monotonic', 'f8'),
+    ('memory.pss', 'i8'),
+    ('memory.uss', 'i8'),
+    ('memory.swap', 'i8'),
+    ('memory.peak', 'i8'),
+    ('num_processes', 'i8'),
+    ('monitor.cpu_time', 'f8'),
+    ('monitor.missed_ticks', 'i8'),
+    ('ctx_switches.voluntary', 'i8'),
+    ('ctx_switches.involuntary', 'i8'),
+    ('page_faults.minor', 'i8'),
+    ('page_faults.major', 'i8'),
+    ('io.read_bytes', 'i8'),
+    ('io.write_bytes', 'i8'),
+    ('num_sockets', 'i8'),
+]
+STRUCT_CODES = {'f8': 'd', 'i8': 'q'}
+
+
+def has_field(sample, name):
+    """ Returns whether the dotted field name is present in the (nested) sample """
+    value = sample
+    for key in name.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return False
+        value = value[key]
+    return True
+
+
+def get_field(sample, name):
+    """ Returns the value of the dotted field name in the (nested) sample, or zero if not present """
+    value = sample
+    for key in name.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return 0
+        value = value[key]
+    return value
+
+
+def set_field(sample, name, value):
+    """ Sets the value of the dotted field name in the (nested) sample """
+    *parents, key = name.split('.')
+    for parent in parents:
+        sample = sample.setdefault(parent, {})
+    sample[key] = value
+
+
+def fields_of(sample):
+    """ Returns the record fields required to store the given sample """
+    return SAMPLE_FIELDS + [(name, type_) for name, type_ in OPTIONAL_FIELDS if has_field(sample, name)]
+
+
+def is_binary_log(log_file):
+    """ Returns whether the given log file is in the binary format """
+    with open(log_file, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class JsonLogWriter:
+    """ Writes the monitor log as text, the info lines followed by a json object per sample """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def info(self, *values):
+        print(*values, file=self.stream, flush=True)
+
+    def sample(self, stats):
+        self.stream.write(json.dumps(stats) + '\n')
+
+    def flush(self):
+        self.stream.flush()
+
+
+class BinaryLogWriter:
+    """ Writes the monitor log in the binary format to a binary stream,
+        the header is written along with the first sample, fields not in the layout are dropped
+        (like the per-process records of the tree mode) """
+
+    def __init__(self, stream, fields=None):
+        self.stream = stream
+        self.fields = fields
+        self.info_lines = []
+        self.record = None
+
+    def info(self, *values):
+        self.info_lines.append(' '.join(str(value) for value in values))
+
+    def write_header(self):
+        header = json.dumps({'info': self.info_lines, 'fields': self.fields}).encode()
+        """ Pad the header so that the records are aligned """
+        padding = -(PREAMBLE.size + len(header)) % ALIGNMENT
+        header += b' ' * padding
+        self.stream.write(PREAMBLE.pack(MAGIC, VERSION, len(header)) + header)
+        self.record = struct.Struct('<' + ''.join(STRUCT_CODES[type_] for _, type_ in self.fields))
+
+    def sample(self, stats):
+        if self.record is None:
+            if self.fields is None:
+                self.fields = fields_of(stats)
+            self.write_header()
+        self.stream.write(self.record.pack(*(get_field(stats, name) for name, _ in self.fields)))
+
+    def flush(self):
+        if self.record is None:
+            """ No samples logged, but still write the info lines """
+            self.fields = self.fields or SAMPLE_FIELDS
+            self.write_header()
+        self.stream.flush()
+
+
+def read_binary_header(log_file):
+    """ Returns the header of the binary log file, along with the offset of the records """
+    with open(log_file, 'rb') as file:
+        magic, version, header_length = PREAMBLE.unpack(file.read(PREAMBLE.size))
+        assert magic == MAGIC, "not a binary monitor log"
+        assert version == VERSION, "unsupported binary monitor log version"
+        header = json.loads(file.read(header_length))
+    return header, PREAMBLE.size + header_length
+
+
+def read_binary_log(log_file):
+    """ Memory maps the records of the binary log file as a numpy structured array (without copying),
+        returns the header and the records, an incomplete record at the end (still being written) is ignored """
+    import numpy
+    header, offset = read_binary_header(log_file)
+    dtype = numpy.dtype([(name, '<' + type_) for name, type_ in header['fields']])
+    count = (os.path.getsize(log_file) - offset) // dtype.itemsize
+    if count == 0:
+        return header, numpy.zeros(0, dtype=dtype)
+    return header, numpy.memmap(log_file, dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+
+def convert_to_binary(json_log_file, binary_log_file):
+    """ Converts a text (json) monitor log file to the binary format """
+    with open(json_log_file) as source, open(binary_log_file, 'wb') as destination:
+        writer = BinaryLogWriter(destination)
+        writer.info(source.readline().rstrip('\n'))
+        writer.info(source.readline().rstrip('\n'))
+        for line in source:
+            writer.sample(json.loads(line))
+        writer.flush()
+
+
+def convert_to_json(binary_log_file, json_log_file):
+    """ Converts a binary monitor log file to the text (json) format """
+    header, records = read_binary_log(binary_log_file)
+    with open(json_log_file, 'w') as destination:
+        writer = JsonLogWriter(destination)
+        for line in header['info']:
+            writer.info(line)
+        for record in records:
+            stats = {}
+            for name, type_ in header['fields']:
+                set_field(stats, name, record[name].item())
+            writer.sample(stats)
+        writer.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--to-binary', help='convert a text (json) monitor log to binary', action='store_true')
+    group.add_argument('--to-json', help='convert a binary monitor log to text (json)', action='store_true')
+    parser.add_argument('source', help='the monitor log file to convert')
+    parser.add_argument('destination', help='the converted monitor log file')
+    args = parser.parse_args()
+    if args.to_binary:
+        convert_to_binary(args.source, args.destination)
+    else:
+        convert_to_json(args.source, args.destination)
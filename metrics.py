@@ -0,0 +1,226 @@
+"""
+    This file contains the loading of the monitor logs (text or binary) into numpy backed metric series,
+    it is shared by plot.py and the reporting tools, instead of each parsing the logs on their own.
+    Text logs are parsed in chunks of lines into numpy structured arrays (with the same layout as the
+    records of binary logs), so only a chunk of python objects is held in memory at a time.
+    Deltas, rates and unit conversions are then computed on whole columns.
+"""
+
+import os
+import json
+import numpy
+import logformat
+
+""" Memory is reported in mega bytes """
+MB = 1024 * 1024
+""" Number of lines parsed at a time from text logs """
+CHUNK_LINES = 65536
+
+
+def records_dtype(fields):
+    """ Returns the numpy dtype of the records with the given fields (name, type) """
+    return numpy.dtype([(name, '<' + type_) for name, type_ in fields])
+
+
+def parse_json_lines(lines, fields):
+    """ Parses the given json sample lines into a structured array of records with the given fields,
+        the lines are decoded with a single json call """
+    samples = json.loads('[' + ','.join(lines) + ']')
+    records = numpy.zeros(len(samples), dtype=records_dtype(fields))
+    for name, _ in fields:
+        keys = name.split('.')
+        if len(keys) == 1:
+            records[name] = [sample.get(keys[0], 0) for sample in samples]
+        else:
+            records[name] = [sample.get(keys[0], {}).get(keys[1], 0) for sample in samples]
+    return records
+
+
+def iter_json_log(log_file, chunk_lines=CHUNK_LINES):
+    """ Yields the info lines and fields of the text log file, followed by chunks of its records """
+    with open(log_file) as file:
+        info = [file.readline().rstrip('\n'), file.readline().rstrip('\n')]
+        fields, chunk = None, []
+        for line in file:
+            """ A partially written line at the end of the log (still being written) is ignored """
+            if not line.endswith('\n'):
+                break
+            if fields is None:
+                fields = logformat.fields_of(json.loads(line))
+                yield info, fields
+            chunk.append(line)
+            if len(chunk) == chunk_lines:
+                yield parse_json_lines(chunk, fields)
+                chunk = []
+        if fields is None:
+            yield info, logformat.SAMPLE_FIELDS
+        elif chunk:
+            yield parse_json_lines(chunk, fields)
+
+
+def iter_records(log_file, chunk_lines=CHUNK_LINES):
+    """ Yields the info lines and fields of the log file (text or binary), followed by chunks of its records,
+        this allows computing over log files larger than memory """
+    if logformat.is_binary_log(log_file):
+        header, records = logformat.read_binary_log(log_file)
+        yield header['info'], [tuple(field) for field in header['fields']]
+        for start in range(0, len(records), chunk_lines):
+            yield records[start:start + chunk_lines]
+    else:
+        yield from iter_json_log(log_file, chunk_lines)
+
+
+def load_records(log_file, chunk_lines=CHUNK_LINES):
+    """ Returns the info lines and all the records of the log file (text or binary) as a structured array """
+    if logformat.is_binary_log(log_file):
+        header, records = logformat.read_binary_log(log_file)
+        return header['info'], records
+    chunks = iter_json_log(log_file, chunk_lines)
+    info, fields = next(chunks)
+    """ Grow the records geometrically, so parsing does not hold all the chunks at once """
+    records, count = numpy.zeros(chunk_lines, dtype=records_dtype(fields)), 0
+    for chunk in chunks:
+        if count + len(chunk) > len(records):
+            records = numpy.resize(records, max(2 * len(records), count + len(chunk)))
+        records[count:count + len(chunk)] = chunk
+        count += len(chunk)
+    return info, records[:count]
+
+
+def deltas(values):
+    """ De-accumulates the values, the first delta is zero """
+    return numpy.diff(values, prepend=values[:1])
+
+
+def rates(values, timestamps):
+    """ Returns the rate of change of accumulated values per second, the first rate is zero """
+    elapsed = deltas(timestamps)
+    return numpy.divide(deltas(values), elapsed, out=numpy.zeros(len(values)), where=elapsed > 0)
+
+
+def compute_metrics(records, start_time=None):
+    """ Returns the metric series of the given records, times are relative to the first sample
+        (or to the given start time), cpu user and system times are de-accumulated and memory is in mega bytes """
+    names = records.dtype.names
+    timestamps = numpy.asarray(records['time'], dtype=numpy.float64)
+    user_times = numpy.asarray(records['cpu_times.user'], dtype=numpy.float64)
+    system_times = numpy.asarray(records['cpu_times.system'], dtype=numpy.float64)
+    metrics_ = {
+        'time': timestamps - (timestamps[0] if start_time is None else start_time) if len(timestamps) else timestamps,
+        'timestamp': timestamps,
+        'cpu': {
+            'percent': numpy.asarray(records['cpu_percent'], dtype=numpy.float64),
+            'user': deltas(user_times),
+            'system': deltas(system_times),
+            'total_user': user_times,
+            'total_system': system_times,
+            # cpu seconds used per wall clock second
+            'rate': rates(user_times + system_times, timestamps),
+        },
+        'memory': {
+            'rss': records['memory.rss'] / MB,
+        },
+        'num_threads': numpy.asarray(records['num_threads']),
+    }
+    for name in ['vms', 'pss', 'uss', 'swap', 'peak']:
+        if 'memory.' + name in names:
+            metrics_['memory'][name] = records['memory.' + name] / MB
+    if 'num_fds' in names:
+        metrics_['num_fds'] = numpy.asarray(records['num_fds'])
+    if 'num_processes' in names:
+        metrics_['num_processes'] = numpy.asarray(records['num_processes'])
+    """ Kernel counters are cumulative, they are reported as rates per second (io in mega bytes per second) """
+    if 'ctx_switches.voluntary' in names:
+        metrics_['ctx_switches'] = {
+            'voluntary': rates(records['ctx_switches.voluntary'], timestamps),
+            'involuntary': rates(records['ctx_switches.involuntary'], timestamps),
+        }
+    if 'page_faults.minor' in names:
+        metrics_['page_faults'] = {
+            'minor': rates(records['page_faults.minor'], timestamps),
+            'major': rates(records['page_faults.major'], timestamps),
+        }
+    if 'io.read_bytes' in names:
+        metrics_['io'] = {
+            'read': rates(records['io.read_bytes'], timestamps) / MB,
+            'write': rates(records['io.write_bytes'], timestamps) / MB,
+        }
+    if 'num_sockets' in names:
+        metrics_['num_sockets'] = numpy.asarray(records['num_sockets'])
+    return metrics_
+
+
+def load_metrics(log_file, chunk_lines=CHUNK_LINES):
+    """ Reads the log file generated by monitor process (text or binary) and returns its metric series """
+    _, records = load_records(log_file, chunk_lines)
+    return compute_metrics(records)
+
+
+class LogTail:
+    """ Incrementally reads a monitor log (text or binary) while it is being appended to by the monitor,
+        each read parses only the bytes appended since the previous read, so the cost of a read does not
+        grow with the length of the log """
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.offset = 0
+        self.pending = b''
+        self.binary = None
+        self.info = None
+        self.dtype = None
+
+    def read_appended(self):
+        """ Returns the bytes appended to the log since the previous read, along with any incomplete data """
+        if not os.path.exists(self.log_file):
+            return self.pending
+        with open(self.log_file, 'rb') as file:
+            file.seek(self.offset)
+            appended = file.read()
+        self.offset += len(appended)
+        return self.pending + appended
+
+    def read_binary(self, data):
+        if self.dtype is None:
+            if len(data) < logformat.PREAMBLE.size:
+                return data, None
+            _, _, header_length = logformat.PREAMBLE.unpack(data[:logformat.PREAMBLE.size])
+            if len(data) < logformat.PREAMBLE.size + header_length:
+                return data, None
+            header = json.loads(data[logformat.PREAMBLE.size:logformat.PREAMBLE.size + header_length])
+            self.info = header['info']
+            self.dtype = records_dtype(header['fields'])
+            data = data[logformat.PREAMBLE.size + header_length:]
+        complete = len(data) // self.dtype.itemsize * self.dtype.itemsize
+        return data[complete:], numpy.frombuffer(data[:complete], dtype=self.dtype)
+
+    def read_json(self, data):
+        *lines, pending = data.split(b'\n')
+        if self.info is None:
+            if len(lines) < 2:
+                return data, None
+            self.info, lines = [line.decode() for line in lines[:2]], lines[2:]
+        lines = [line.decode() for line in lines]
+        if self.dtype is None:
+            if not lines:
+                return pending, None
+            self.dtype = records_dtype(logformat.fields_of(json.loads(lines[0])))
+        if lines:
+            """ Fields missing from the first samples (logged once available) widen the records from then on """
+            fields = [(name, self.dtype[name].str[1:]) for name in self.dtype.names]
+            added = [field for field in logformat.fields_of(json.loads(lines[-1])) if field not in fields]
+            if added:
+                self.dtype = records_dtype(fields + added)
+        if not lines:
+            return pending, numpy.zeros(0, dtype=self.dtype)
+        return pending, parse_json_lines(lines, [(name, self.dtype[name].str[1:]) for name in self.dtype.names])
+
+    def read(self):
+        """ Returns the records appended since the previous read, or None if no records are available yet """
+        data = self.read_appended()
+        if self.binary is None:
+            if len(data) < len(logformat.MAGIC):
+                self.pending = data
+                return None
+            self.binary = data.startswith(logformat.MAGIC)
+        self.pending, records = self.read_binary(data) if self.binary else self.read_json(data)
+        return records
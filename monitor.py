@@ -1,6 +1,7 @@
 """
-    This is main program to run the benchmarks, it is limited to clients and server with single process applications.
-    This script enables to automate benchmark tests with single process clients and servers.
+    This is main program to run the benchmarks, by default it monitors single process clients and servers,
+    use the tree mode (--tree) to monitor multi-process clients and servers.
+    This script enables to automate benchmark tests with clients and servers.
     This script monitors the CPU, Memory and some other system parameters using psutil library of the client and
     server application.
     WORKING:
@@ -11,64 +12,541 @@
         The script terminates when server terminates.
 
     This script supports logging of client and server outputs and errors to separate log files. (use --log option)
+
+    Used as a library (see api.py), run runs a scenario in the calling process, given the options of the
+    command line (see create_parser), and waits only for the processes it forked.
 """
 
 import os
+import sys
+import time
+import traceback
 from bench import create_daemon_and_monitor
 from bench import execute_command
+from events import record_event
+from events import read_events
+from events import is_complete
+from bench import apply_scheduling
+from bench import parse_cpu_list
+from bench import parse_scheduling
+from readiness import wait_until_ready
+from readiness import parse_condition
+import cgroups
+import procevents
+import steady
+import psutil
+from collector import Target
+from collector import create_collector
+from collector import register_target
 import argparse
 import signal
+import subprocess
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--scenario', '-S', help='specify the benchmark scenario, '
-                                             'it is just used to construct file names for logs of client and server',
-                    required=True)
-parser.add_argument('--server', '-s', help='the server command to execute', required=True)
-parser.add_argument('--client', '-c', help='the client command to execute', required=True)
-parser.add_argument('--log', '-l',  help="whether to log server and command outputs to file", action="store_true")
-parser.add_argument('--wait', '-w', help='time to wait before executing client after starting server',
-                    type=int, default=5)
-parser.add_argument('--idle', '-i', help='time to wait before executing command, '
-                                         'the time to wait for monitoring process to start up',
-                    type=int, default=1)
-args = parser.parse_args()
-
-parent_pid = os.getpid()
-server_pid = os.fork()
-
-if server_pid == 0:
-    # In case of server
-    server_pid = os.getpid()
+""" Options of monitor.py which shape a run, stored with the run in the results store """
+RUN_PARAMETERS = ['log', 'wait', 'idle', 'tree', 'pss', 'smaps_every', 'interval', 'sampler', 'threads', 'collector',
+                  'cgroup', 'steady', 'steady_window', 'steady_tolerance', 'stop_at_precision', 'log_format', 'ready',
+                  'ready_timeout', 'clients', 'ramp_interval', 'server_cpus', 'server_sched', 'client_cpus',
+                  'client_sched', 'monitor_cpus', 'monitor_sched']
+""" Interval (seconds) at which the procfs sampler flushes its log, the other samplers flush every sample """
+LOG_FLUSH_INTERVAL = 1
 
-    client_pid = os.fork()
-    if client_pid == 0:
+
+def create_parser():
+    """ Returns the parser of the command line, its arguments are the options of a run (see run) """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', '-S', help='specify the benchmark scenario, it is just used to construct '
+                                                 'file names for logs of client and server',
+                        required=True)
+    parser.add_argument('--server', '-s', help='the server command to execute', required=True)
+    parser.add_argument('--client', '-c', help='the client command to execute', required=True)
+    parser.add_argument('--log', '-l',  help="whether to log server and command outputs to file", action="store_true")
+    parser.add_argument('--wait', '-w', help='time to wait before executing client after starting server',
+                        type=int, default=5)
+    parser.add_argument('--idle', '-i', help='time to wait before executing command, '
+                                             'the time to wait for monitoring process to start up',
+                        type=int, default=1)
+    parser.add_argument('--tree', '-t', help='monitor client and server along with all the processes they fork, '
+                                             'logging per-process records and aggregated totals', action='store_true')
+    parser.add_argument('--pss', help='also log the proportional and unique set sizes and swap (from smaps_rollup), '
+                                      'which do not over count pages shared by forked processes', action='store_true')
+    parser.add_argument('--smaps-every', help='read smaps_rollup (expensive) only every N samples, by default chosen '
+                                              'adaptively to keep its cost within 2%% of the interval', type=int)
+    parser.add_argument('--interval', '-I', help='the interval in seconds between samples of the monitoring processes',
+                        type=float, default=1)
+    parser.add_argument('--sampler', help='how the monitoring processes sample a single process, procfs reads /proc '
+                                          'directly with low overhead and supports intervals down to 10ms',
+                        choices=['psutil', 'procfs'], default='psutil')
+    parser.add_argument('--threads', help='also log the cpu times of each thread of single process clients and servers',
+                        action='store_true')
+    parser.add_argument('--collector', help='monitor the client and server from a single collector daemon, sampling '
+                                             'them on a shared tick (time aligned samples), instead of a monitoring '
+                                             'daemon per process', action='store_true')
+    parser.add_argument('--cgroup', help='place the server and client (with all the processes they fork) in cgroups of '
+                                          'their own and sample the cgroups (cgroup v2, where permitted), exact '
+                                          'accounting of the whole process trees, including short lived processes',
+                        action='store_true')
+    parser.add_argument('--steady', help='detect the steady state of the server online (requires --collector), '
+                                          'once its cpu usage and rss are stable over the window, the end of the '
+                                          'warmup is recorded to the events log and the warmup excluded from the '
+                                          'summaries',
+                        action='store_true')
+    parser.add_argument('--steady-window', help='the number of samples of the steady state window',
+                        type=int, default=steady.DEFAULT_WINDOW)
+    parser.add_argument('--steady-tolerance', help='the relative difference between the means of the halves of the '
+                                                   'window within which the metrics are stable',
+                        type=float, default=steady.DEFAULT_TOLERANCE)
+    parser.add_argument('--stop-at-precision', help='stop the run early (killing the clients and server) once the '
+                                                    'mean cpu usage and rss of the server after the warmup are known '
+                                                    'to this relative precision (95%% confidence interval half width)',
+                        type=float)
+    parser.add_argument('--log-format', help='the format of the monitor logs, binary logs are compact fixed width '
+                                             'records, suitable for long runs', choices=['json', 'binary'],
+                        default='json')
+    parser.add_argument('--ready', '-r', help='a readiness condition to wait for before executing the client, '
+                                              'instead of the fixed wait: tcp:HOST:PORT, unix:PATH, log:REGEX '
+                                              '(requires --log), file:PATH or cpu:PERCENT (server cpu usage settled '
+                                              'below), '
+                                              'can be repeated to wait for all of them', action='append', default=[])
+    parser.add_argument('--ready-timeout', help='time to wait for the readiness conditions, '
+                                                'the run is aborted if they do not hold by then',
+                        type=float, default=60)
+    parser.add_argument('--clients', '-n', help='the number of concurrent clients to execute, each client is '
+                                                'monitored separately along with an aggregate of all clients',
+                        type=int, default=1)
+    parser.add_argument('--ramp-interval', help='ramp up the clients, doubling the number of running clients '
+                                                '(1, 2, 4 ... up to --clients) every given number of seconds, '
+                                                'by default all the clients are started at once', type=float, default=0)
+    parser.add_argument('--repeat', '-k', help='run the scenario this many times (scenarios postfixed with the trial '
+                                               'number), summarize the runs and compare them to the baseline',
+                        type=int, default=1)
+    parser.add_argument('--server-b', help='a second server command, run interleaved with the server (A) on every '
+                                           'trial (scenarios postfixed with -a and -b), the B runs are compared to the '
+                                           'A runs')
+    parser.add_argument('--baseline', help='the baseline summary file to compare the runs to, the script exits with a '
+                                           'non-zero status if any metric regressed')
+    parser.add_argument('--save-baseline', help='save the summary of the runs as a baseline to this file')
+    parser.add_argument('--results', help='store the run in this results store (SQLite, see results.py) once done')
+    parser.add_argument('--threshold', help='the relative change in a metric to be considered a regression',
+                        type=float, default=0.05)
+    for role in ['server', 'client', 'monitor']:
+        parser.add_argument('--%s-cpus' % role, help='pin the %s to the cpus, given as a list like 0-3,6' % role,
+                            type=parse_cpu_list)
+        parser.add_argument('--%s-sched' % role, help='scheduling settings of the %s, given as nice=N,ionice=CLASS'
+                                                      '[:LEVEL],policy=POLICY[:PRIORITY], ionice classes rt, be, idle '
+                                                      'and policies other, batch, idle, fifo, rr' % role,
+                            type=parse_scheduling, default={})
+    return parser
+
+
+def check_args(args):
+    """ Raises ValueError if the options of the run are inconsistent, or the readiness conditions malformed """
+    for condition in args.ready:
+        parse_condition(condition)
+    if any(condition.startswith('log:') for condition in args.ready) and not args.log:
+        raise ValueError('log readiness condition requires --log')
+    if (args.steady or args.stop_at_precision) and not args.collector:
+        raise ValueError('steady state detection requires --collector')
+
+
+def run_trials(args, argv):
+    """ Runs the trials of the scenario, each a run of this script with the command line arguments (argv)
+        in a separate process, with the scenario and server overridden (the last occurrence of an option is
+        the one used), so trials do not share any state, trials which failed (exited with a non-zero status, see
+        main) are left out of the summary, returns whether any metric regressed, or no trial of a variant completed """
+    import analysis
+    variants = [('-a', args.server), ('-b', args.server_b)] if args.server_b else [('', args.server)]
+    runs = {suffix: [] for suffix, _ in variants}
+    for trial in range(args.repeat):
+        for suffix, server in variants:
+            scenario = '%s%s-%d' % (args.scenario, suffix, trial)
+            print("trial", trial, "scenario", scenario, flush=True)
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__)] + argv +
+                                       ['--scenario', scenario, '--server', server, '--repeat', '1', '--server-b', ''])
+            if completed.returncode:
+                print("trial", trial, "scenario", scenario, "failed with status", completed.returncode,
+                      "and is left out of the summary", file=sys.stderr, flush=True)
+                continue
+            runs[suffix].append(scenario)
+    failed = [suffix for suffix, scenarios in runs.items() if not scenarios]
+    if failed:
+        print("no trial of", ', '.join(args.scenario + suffix for suffix in failed), "completed", file=sys.stderr)
+        return True
+    return analysis.analyze(runs[variants[0][0]], runs['-b'] if args.server_b else None, args.baseline,
+                            args.save_baseline, args.threshold, args.scenario + '-summary.json')
+
+
+def run_child(function, *args_):
+    """ Runs the function in a forked child process, which must never return to the code of the process it was
+        forked from (the caller of run, when used as a library): the function executes a command or exits,
+        if it returns or raises instead (like a command not found) the child exits """
+    try:
+        function(*args_)
+    except Exception:
+        traceback.print_exc()
+    finally:
+        sys.stderr.flush()
+        os._exit(127)
+
+
+def wait_for_children(pids, until=None, timeout=None):
+    """ Waits for the child processes to exit, reaping them as they exit (so that exited processes are not
+        monitored as zombies), until the process until exited (all of them by default) or the timeout,
+        returns the exit status of each process reaped, blocks on their pidfds if supported, else polls,
+        only the given children are waited for, other children of the calling process are left alone """
+    pending = set(pid for pid in pids if pid)
+    statuses = {}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    watcher = procevents.PidfdExitWatcher() if procevents.PidfdExitWatcher.available() else None
+    if watcher:
+        for pid in pending:
+            watcher.watch(pid)
+    try:
+        while pending and (until is None or until not in statuses):
+            for pid in list(pending):
+                try:
+                    exited_pid, status = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    """ Reaped already """
+                    exited_pid, status = pid, None
+                if exited_pid:
+                    pending.discard(pid)
+                    statuses[pid] = status
+            remaining = 1 if deadline is None else deadline - time.monotonic()
+            if not pending or (until is not None and until in statuses) or remaining <= 0:
+                break
+            if watcher:
+                watcher.wait(min(remaining, 1))
+            else:
+                time.sleep(min(remaining, 0.05))
+    finally:
+        if watcher:
+            watcher.close()
+    return statuses
+
+
+def run_parameters(args):
+    """ Returns the options of the run (see RUN_PARAMETERS) as json values, the cpu sets as sorted lists """
+    return {name: sorted(value) if isinstance(value, set) else value
+            for name, value in vars(args).items() if name in RUN_PARAMETERS}
+
+
+def wait_for_logs(log_files, quiet, timeout):
+    """ Waits until none of the log files grew for the quiet period (seconds), that is until the monitoring
+        daemons writing them logged the exits and stopped, or until the timeout, returns whether they stopped """
+    deadline = time.monotonic() + timeout
+    sizes, changed = None, time.monotonic()
+    while True:
+        current = [os.path.getsize(log_file) if os.path.exists(log_file) else 0 for log_file in log_files]
+        now = time.monotonic()
+        if current != sizes:
+            sizes, changed = current, now
+        elif now - changed >= quiet:
+            return True
+        if now >= deadline:
+            return False
+        time.sleep(quiet / 10)
+
+
+def run(args):
+    """ Runs the scenario with the options of the command line (see create_parser), returns the exit status
+        of the server once it exited (as of os.waitpid) """
+    """ Events of the run (like server start, ready, client start) are recorded to the events log,
+        absolute path as the monitoring daemons change their working directory """
+    events_file = os.path.abspath(args.scenario + '-events.log')
+    """ The scheduling settings of the server, client and monitoring daemons, the monitoring daemons are
+        forked by the server and client, and run on all the cpus of this process unless pinned """
+    server_scheduling = dict(args.server_sched, cpus=args.server_cpus)
+    client_scheduling = dict(args.client_sched, cpus=args.client_cpus)
+    monitor_scheduling = dict(args.monitor_sched, cpus=args.monitor_cpus or os.sched_getaffinity(0))
+    """ The cgroups of the server and client in cgroup mode, the processes are monitored instead if not permitted """
+    server_cgroup = client_cgroup = None
+    if args.cgroup:
+        try:
+            server_cgroup, client_cgroup = cgroups.create_cgroups([args.scenario + '-server',
+                                                                   args.scenario + '-client'])
+        except OSError as error:
+            print("cgroups can't be created, monitoring the processes instead:", error, file=sys.stderr)
+    open(events_file, 'w').close()
+    record_event(events_file, 'run_start', scenario=args.scenario, server=args.server, client=args.client,
+                 clients=args.clients)
+
+    def kill_server():
+        """ Terminate the server once the client(s) complete """
+        record_event(events_file, 'client_exit')
+        record_event(events_file, 'server_kill')
+        os.kill(server_pid, signal.SIGKILL)
+        if server_cgroup:
+            """ Along with all the processes the server forked """
+            cgroups.kill_cgroup(server_cgroup)
+
+    def stop_run():
+        """ Stop the run once converged, killing the clients (and any process they forked),
+            the server is killed as the client exits, or here in case of multiple clients """
+        try:
+            client = psutil.Process(client_pid)
+            processes = [client] + client.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for process in processes:
+            try:
+                process.kill()
+            except psutil.NoSuchProcess:
+                pass
+        if args.clients > 1:
+            record_event(events_file, 'server_kill')
+            os.kill(server_pid, signal.SIGKILL)
+            if server_cgroup:
+                cgroups.kill_cgroup(server_cgroup)
+
+    def create_steady_handler():
+        """ Returns the sample handler of the server, recording the end of its warmup and stopping the run
+            once its metrics converged, if a precision is given, the steady state of interest is that of the server
+            under load, so the samples before the first client started are ignored """
+        steady_state = steady.SteadyState(args.steady_window, args.steady_tolerance, args.stop_at_precision)
+        loaded = []
+
+        def on_sample(stats):
+            if not loaded:
+                if not any(event['event'] == 'client_start' for event in read_events(events_file)):
+                    return
+                loaded.append(True)
+            state = steady_state.add(stats)
+            if state == steady.WARMUP_END:
+                record_event(events_file, 'warmup_end', samples=steady_state.detector.count)
+            elif state == steady.CONVERGED:
+                record_event(events_file, 'run_converged', metrics=steady_state.batch_means.summary())
+                stop_run()
+
+        return on_sample
+
+    def wait_for_server():
+        """ Wait for some time for server to boot up, either a fixed time or until the readiness conditions hold,
+            returns the time still to be waited before executing the client(s), None if the server is not ready
+            by the readiness timeout """
+        if not args.ready:
+            return args.idle + args.wait
+        """ Block on the readiness conditions instead of the fixed wait """
+        time.sleep(args.idle)
+        ready, waited = wait_until_ready(args.ready, args.ready_timeout, server_pid,
+                                         args.scenario + '-output-server.log' if args.log else None)
+        ready_time = time.time()
+        """ Time to ready is measured from the server start, if recorded already """
+        server_start = [event['time'] for event in read_events(events_file) if event['event'] == 'server_start']
+        time_to_ready = ready_time - server_start[0] if server_start else waited
+        record_event(events_file, 'server_ready' if ready else 'server_ready_timeout', ready=ready,
+                     time_to_ready=time_to_ready, conditions=args.ready)
+        if not ready:
+            print("server not ready after", args.ready_timeout, "seconds, aborting", file=sys.stderr)
+            return None
+        print("server ready after", time_to_ready, "seconds")
+        return 0
+
+    def ramp_schedule(num_clients):
+        """ Returns the number of clients to be running at each step of the ramp: 1, 2, 4 ... num_clients """
+        if args.ramp_interval <= 0:
+            return [num_clients]
+        schedule = [1]
+        while schedule[-1] < num_clients:
+            schedule.append(min(2 * schedule[-1], num_clients))
+        return schedule
+
+    def reap_clients(running, timeout):
+        """ Reap the clients exiting for the whole timeout (None to wait until all exited), so that exited clients
+            do not stay as zombies being monitored, returns the clients still running """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while running if deadline is None else time.monotonic() < deadline:
+            if not running:
+                """ A step of the ramp lasts the ramp interval, even once its clients exited """
+                time.sleep(max(0, deadline - time.monotonic()))
+                break
+            exited_pid, status = os.waitpid(-1, os.WNOHANG)
+            if exited_pid in running:
+                record_event(events_file, 'client_exit', pid=exited_pid, index=running.pop(exited_pid),
+                             status=status)
+            elif exited_pid == 0:
+                time.sleep(0.05)
+        return running
+
+    def run_client(index):
+        """ Execute a client of multiple clients, monitored separately to its own log file """
+        if not args.collector:
+            create_daemon_and_monitor(os.getpid(), interval=args.interval,
+                                      log_file='%s-monitor-client-%d.log' % (args.scenario, index),
+                                      tree=args.tree, pss=args.pss, smaps_every=args.smaps_every,
+                                      sampler=args.sampler, log_format=args.log_format,
+                                      scheduling=monitor_scheduling, threads=args.threads)
+        """ Applied once the monitoring daemon is forked, so that the daemon does not inherit the settings
+            of the client, only the clients are scheduled as such, not the coordinator """
+        apply_scheduling(**client_scheduling)
+        """ The clients share the cgroup, the coordinator and the monitoring daemons stay out of it """
+        if client_cgroup:
+            cgroups.join_cgroup(client_cgroup)
+        """ The coordinator waited for the server already, so each client starts at its step of the ramp """
+        execute_command(args.client, 0,
+                        out_log_file='%s-output-client-%d.log' % (args.scenario, index) if args.log else None,
+                        err_log_file='%s-error-client-%d.log' % (args.scenario, index) if args.log else None,
+                        events_file=events_file, event='client_start')
+
+    def run_clients():
+        """ Execute the clients concurrently following the ramp schedule, forked from this coordinator process,
+            which is monitored along with all its descendants as the aggregate of all clients,
+            the server is killed once the last client completes """
+        if not args.collector:
+            create_daemon_and_monitor(os.getpid(), interval=args.interval,
+                                      log_file=args.scenario + '-monitor-client.log', tree=True, pss=args.pss,
+                                      smaps_every=args.smaps_every, log_format=args.log_format,
+                                      scheduling=monitor_scheduling, cgroup=client_cgroup)
+        wait = wait_for_server()
+        running = {}
+        """ If the server is not ready, no client is executed and the server is killed right away """
+        for step, num_clients in enumerate(ramp_schedule(args.clients) if wait is not None else []):
+            if step:
+                running = reap_clients(running, args.ramp_interval)
+            else:
+                time.sleep(wait)
+            record_event(events_file, 'clients_ramp', clients=num_clients)
+            for index in range(step and ramp_schedule(args.clients)[step - 1], num_clients):
+                client_pid = os.fork()
+                if client_pid == 0:
+                    run_child(run_client, index)
+                if args.collector:
+                    register_target(control[1], client_pid, '%s-monitor-client-%d.log' % (args.scenario, index),
+                                    tree=args.tree, pss=args.pss, threads=args.threads,
+                                    smaps_every=args.smaps_every)
+                running[client_pid] = index
+        reap_clients(running, None)
+        record_event(events_file, 'server_kill')
+        os.kill(server_pid, signal.SIGKILL)
+        if server_cgroup:
+            cgroups.kill_cgroup(server_cgroup)
+        os._exit(0 if wait is not None else 1)
+
+    def run_server():
+        # In case of server
+        # execute the server task,
+        # then when monitor process exits as server exits,
+        # it may signal the server
+        server_log_file = args.scenario + '-monitor-server.log'
+        if not args.collector:
+            create_daemon_and_monitor(os.getpid(), interval=args.interval, log_file=server_log_file,
+                                      tree=args.tree, pss=args.pss, smaps_every=args.smaps_every,
+                                      sampler=args.sampler, log_format=args.log_format,
+                                      scheduling=monitor_scheduling, threads=args.threads, cgroup=server_cgroup)
+        """ Applied once the monitoring daemon is forked, so that the daemon does not inherit the settings of
+            the server (like a real time policy, or a nice value it could not lower back without privileges) """
+        apply_scheduling(**server_scheduling)
+        """ Joined once the monitoring daemon is forked, so that it is not accounted to the server """
+        if server_cgroup:
+            cgroups.join_cgroup(server_cgroup)
+        server_output_log_file = args.scenario + '-output-server.log' if args.log else None
+        server_error_log_file = args.scenario + '-error-server.log' if args.log else None
+        execute_command(args.server, args.idle, out_log_file=server_output_log_file,
+                        err_log_file=server_error_log_file, events_file=events_file, event='server_start')
+
+    def run_single_client():
         # In case of client
-        client_pid = os.getpid()
         # wait for some time for server to boot up
         # then, execute the client task,
         # then also monitor script
         # on exit send kill signal to server process
-        kill_server = lambda: os.kill(server_pid, signal.SIGKILL)
         client_log_file = args.scenario + '-monitor-client.log'
-        create_daemon_and_monitor(client_pid, log_file=client_log_file, on_complete_handler=kill_server)
+        if not args.collector:
+            create_daemon_and_monitor(os.getpid(), interval=args.interval, log_file=client_log_file,
+                                      on_complete_handler=kill_server, tree=args.tree, pss=args.pss,
+                                      smaps_every=args.smaps_every, sampler=args.sampler, log_format=args.log_format,
+                                      scheduling=monitor_scheduling, threads=args.threads, cgroup=client_cgroup)
+        """ Applied once the monitoring daemon is forked, so that the daemon does not inherit them """
+        apply_scheduling(**client_scheduling)
         client_output_log_file = args.scenario + '-output-client.log' if args.log else None
         client_error_log_file = args.scenario + '-error-client.log' if args.log else None
-        execute_command(args.client, args.idle + args.wait, out_log_file=client_output_log_file,
-                        err_log_file=client_error_log_file)
-
-    # The server process, continues
-    # execute the server task,
-    # then when monitor process exits as server exits,
-    # it may signal the server
-    server_log_file = args.scenario + '-monitor-server.log'
-    create_daemon_and_monitor(server_pid, log_file=server_log_file)
-    server_output_log_file = args.scenario + '-output-server.log' if args.log else None
-    server_error_log_file = args.scenario + '-error-server.log' if args.log else None
-    execute_command(args.server, args.idle, out_log_file=server_output_log_file, err_log_file=server_error_log_file)
-
-
-# Main process
-print("Running the benchmark")
-print("Waiting for server to exit ...")
-_, status = os.waitpid(server_pid, 0)
-print("Server process exited with ", status)
+        wait = wait_for_server()
+        if wait is None:
+            """ Exiting without executing the client ends the client monitoring (the monitoring daemon or the
+                client target of the collector), which kills the server """
+            os._exit(1)
+        if client_cgroup:
+            cgroups.join_cgroup(client_cgroup)
+        execute_command(args.client, wait, out_log_file=client_output_log_file,
+                        err_log_file=client_error_log_file, events_file=events_file, event='client_start')
+
+    """ The control pipe of the collector, the coordinator of multiple clients registers each client to it """
+    control = os.pipe() if args.collector else None
+    """ Output buffered by the caller would be flushed again by each child """
+    sys.stdout.flush()
+    server_pid = os.fork()
+    if server_pid == 0:
+        run_child(run_server)
+
+    """ The client is forked from the main process rather than the server,
+        so that it is not a part of the server's process tree """
+    client_pid = os.fork()
+    if client_pid == 0:
+        # In case of client, or of multiple clients the process coordinating them
+        run_child(run_clients if args.clients > 1 else run_single_client)
+
+    # Main process
+    collector_pid = None
+    if args.collector:
+        """ The single client is monitored like the aggregate of multiple clients, and kills the server on exit """
+        multiple_clients = args.clients > 1
+        collector_pid = create_collector([
+            Target(server_pid, args.scenario + '-monitor-server.log', tree=args.tree, pss=args.pss,
+                   threads=args.threads, smaps_every=args.smaps_every, cgroup=server_cgroup,
+                   on_sample=create_steady_handler() if args.steady or args.stop_at_precision else None),
+            Target(client_pid, args.scenario + '-monitor-client.log', tree=args.tree or multiple_clients,
+                   pss=args.pss, on_complete=None if multiple_clients else kill_server, threads=args.threads,
+                   smaps_every=args.smaps_every, cgroup=client_cgroup),
+        ], control, interval=args.interval, log_format=args.log_format, scheduling=monitor_scheduling)
+        """ Only the coordinator of multiple clients registers targets """
+        os.close(control[0])
+        os.close(control[1])
+    print("Running the benchmark")
+    print("Waiting for server to exit ...")
+    """ Reap the client as well when it exits, so that its monitoring process does not keep monitoring a zombie """
+    status = wait_for_children([server_pid, client_pid, collector_pid], until=server_pid)[server_pid]
+    record_event(events_file, 'server_exit', status=status)
+    print("Server process exited with ", status)
+    """ The client exits before the server is killed, and the collector logs its last samples within an interval
+        of the exits, waited for so that the logs are complete once the run returns """
+    wait_for_children([client_pid, collector_pid], timeout=2 * args.interval + 1)
+    for cgroup in [server_cgroup, client_cgroup]:
+        if cgroup and not cgroups.remove_cgroup(cgroup):
+            print("cgroup", cgroup, "could not be removed", file=sys.stderr)
+    """ This process may have been moved to a leaf cgroup to create them, even if they could not be used,
+        it is left once the monitoring daemons forked in it exited """
+    if args.cgroup and not cgroups.leave_monitor_cgroup(cgroups.REMOVE_TIMEOUT + 2 * args.interval):
+        print("cgroup", cgroups.MONITOR_CGROUP, "could not be removed", file=sys.stderr)
+    if args.results:
+        import results
+        """ The collector was waited for, the monitoring daemons are not children of this process and log their
+            last samples within an interval of the exits (flushed within the flush interval of the procfs sampler) """
+        if not args.collector and not wait_for_logs(list(results.monitor_logs(args.scenario).values()),
+                                                    max(args.interval, LOG_FLUSH_INTERVAL) + args.interval,
+                                                    10 * max(args.interval, LOG_FLUSH_INTERVAL)):
+            print("the monitor logs are still growing, storing them as they are", file=sys.stderr)
+        parameters = run_parameters(args)
+        """ Monitored as processes if the cgroups could not be created """
+        parameters['cgroup'] = server_cgroup is not None
+        connection = results.connect(args.results)
+        run_id = results.ingest(connection, args.scenario, parameters, results.git_revision())
+        connection.close()
+        print("stored as run", run_id, "in", args.results)
+    return status
+
+
+def main():
+    parser = create_parser()
+    args = parser.parse_args()
+    try:
+        check_args(args)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.repeat > 1 or args.server_b:
+        sys.exit(1 if run_trials(args, sys.argv[1:]) else 0)
+    run(args)
+    """ The run failed if the server was not ready or no client started """
+    sys.exit(0 if is_complete(read_events(args.scenario + '-events.log')) else 1)
+
+
+if __name__ == "__main__":
+    main()
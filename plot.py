@@ -1,159 +1,241 @@
 """ This script is used to save plots of a given monitor's system log file """
-import matplotlib.pyplot as plt
 import argparse
-import json
 import os
+import metrics
+import downsample
+import timeline
+
+
+def memory_series(memory):
+    """ The resident memory, along with the proportional and unique set sizes, or the peak of a cgroup, if logged """
+    if 'pss' not in memory and 'peak' not in memory:
+        return memory['rss']
+    return {name: memory[name] for name in ['rss', 'pss', 'uss', 'peak'] if name in memory}
+
+
+""" The panels plotted for each of client and server, in order of the axes,
+    with the title, the y-axis label and the series of metrics plotted, either a single series, or a dict of
+    labelled series plotted on the same axis, the kernel counters are missing (None) from older logs,
+    the virtual memory size and file descriptors from cgroup logs """
+PANELS = [
+    ('CPU Usage', '%CPU', lambda metrics_: metrics_['cpu']['percent']),
+    ('System Time', 'time (s)', lambda metrics_: metrics_['cpu']['system']),
+    ('User Time', 'time (s)', lambda metrics_: metrics_['cpu']['user']),
+    ('Memory RSS/ RES', 'Memory Size (MB)', lambda metrics_: memory_series(metrics_['memory'])),
+    ('Memory VMS/ VIRT', 'Memory Size (MB)', lambda metrics_: metrics_['memory'].get('vms')),
+    ('Number of threads', '#threads', lambda metrics_: metrics_['num_threads']),
+    ('Number of file descriptors', '#fd', lambda metrics_: metrics_.get('num_fds')),
+    ('Context switches', 'switches/s', lambda metrics_: metrics_.get('ctx_switches')),
+    ('Page faults', 'faults/s', lambda metrics_: metrics_.get('page_faults')),
+    ('Disk I/O', 'MB/s', lambda metrics_: metrics_.get('io')),
+    ('Number of sockets', '#sockets', lambda metrics_: metrics_.get('num_sockets')),
+]
+
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--scenario', '-S', help='specify the benchmark scenario', required=True)
-args = parser.parse_args()
-
-server_log_file = args.scenario + '-monitor-server.log'
-client_log_file = args.scenario + '-monitor-client.log'
-print("expected server log file: ", server_log_file)
-print("expected client log file: ", client_log_file)
-""" Assert that the log files exists """
-assert os.path.exists(server_log_file)
-assert os.path.exists(client_log_file)
-
-print("log files for client and server found for given scenario")
-
-
-def de_accumulate(values):
-    """ De-accumulates a list """
-    new_values = [0]
-    for i in range(1, len(values)):
-        new_values.append(values[i] - values[i - 1])
-    return new_values
-
-
-def parse_log_file(log_file):
-    """ This function reads the log_file generated by monitor process, and parses them """
-    with open(log_file) as file:
-        """ Read the top two lines: the system info, and process info and ignore them """
-        file.readline()
-        file.readline()
-
-        """ The stats expected from the log file """
-        num_threads, num_fds = [], []
-        memory_rss, memory_vms = [], []
-        cpu_percent, system_times, user_times = [], [], []
-        timestamps = []
-
-        """ Read the json stats from each of the line """
-        for line in file:
-            stat = json.loads(line)
-            """ Must be unpacked to dictionary, with specified fields """
-            assert isinstance(stat, dict)
-            timestamps.append(stat['time'])
-            cpu_percent.append(stat['cpu_percent'])
-            system_times.append(stat['cpu_times']['system'])
-            user_times.append(stat['cpu_times']['user'])
-            """memory is measured in mega bytes"""
-            mB = 1024 * 1024
-            memory_rss.append(stat['memory']['rss']/ mB)
-            memory_vms.append(stat['memory']['vms']/ mB)
-            # Other stats
-            num_threads.append(stat['num_threads'])
-            num_fds.append(stat['num_fds'])
-
-        """ Subtract from initial start time, to get only relative time"""
-        timestamps = [t - timestamps[0] for t in timestamps]
-
-        """ Note: currently user times and system times are in accumulated form, we need to de-accumulate it """
-        system_times = de_accumulate(system_times)
-        user_times = de_accumulate(user_times)
-
-        return {
-            'time': timestamps,
-            'cpu': {'percent': cpu_percent, 'user': user_times, 'system': system_times},
-            'memory': {'rss': memory_rss, 'vms': memory_vms},
-            'num_threads': num_threads,
-            'num_fds': num_fds,
-        }
-
-
-def plot_metrics(axes_, metrics_, prefix=""):
+""" Colors of the event lines, markers (and other events) are drawn in the default color """
+EVENT_COLORS = {
+    'run_start': 'gray',
+    'server_start': 'green',
+    'server_ready': 'limegreen',
+    'client_start': 'blue',
+    'client_exit': 'purple',
+    'server_kill': 'red',
+    'server_exit': 'black',
+    'run_converged': 'brown',
+}
+MARKER_COLOR = 'orange'
+
+
+def fast_render_settings(num_samples, dpi=100, min_panel_width=400, max_panel_width=1200):
+    """ Returns the figure size (inches), dpi and number of points per series to render the given number
+        of samples quickly, each panel is as wide (in pixels) as the number of samples within limits,
+        and series are downsampled to two points (min and max) per pixel column """
+    panel_width = min(max(num_samples, min_panel_width), max_panel_width)
+    """ Four panels (of two grid columns each) along the width, and three quarters as tall (six rows) """
+    width = 4 * panel_width / dpi
+    return (width, width * 3 / 4), dpi, 2 * panel_width
+
+
+def create_axes():
+    """ Obtain the axes of the current figure to plot the server and client metrics on, side by side """
+    import matplotlib.pyplot as plt
+    server_axes = [
+        plt.subplot2grid((6, 8), (0, 0), rowspan=2, colspan=2),
+        plt.subplot2grid((6, 8), (0, 2), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (1, 2), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (2, 0), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (3, 0), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (2, 2), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (3, 2), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (4, 0), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (4, 2), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (5, 0), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (5, 2), rowspan=1, colspan=2),
+    ]
+    client_axes = [
+        plt.subplot2grid((6, 8), (0, 4), rowspan=2, colspan=2),
+        plt.subplot2grid((6, 8), (0, 6), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (1, 6), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (2, 4), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (3, 4), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (2, 6), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (3, 6), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (4, 4), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (4, 6), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (5, 4), rowspan=1, colspan=2),
+        plt.subplot2grid((6, 8), (5, 6), rowspan=1, colspan=2),
+    ]
+    return server_axes, client_axes
+
+
+def metric_points(metrics_, values, max_points=None, method='lttb'):
+    """ Returns the time and the given values, downsampled to about max_points if given """
+    if max_points is None:
+        return metrics_['time'], values
+    return downsample.downsample(metrics_['time'], values, max_points, method)
+
+
+def panel_series(metrics_, series):
+    """ Returns the labelled series of the panel, a single series is unlabelled """
+    values = series(metrics_)
+    if values is None:
+        return {}
+    return values if isinstance(values, dict) else {None: values}
+
+
+def series_gid(series_label):
+    """ Returns the id of the line of the labelled series of a panel, telling it apart from the event lines """
+    return 'series' if series_label is None else 'series:' + series_label
+
+
+def plot_series(axis, metrics_, series_label, values, max_points=None, method='lttb'):
+    """ Draws the labelled series on the axis, returns its line """
+    line, = axis.plot(*metric_points(metrics_, values, max_points, method), label=series_label,
+                      gid=series_gid(series_label))
+    return line
+
+
+def plot_metrics(axes_, metrics_, prefix="", max_points=None, method='lttb'):
     """ Pass a list of axes on which to plot the given metrics with respect to time,
         It plots cpu percentage on first, cpu system times on second, cpu user times on third,
-        memory rss on fourth, memory vms on fifth, num threads on sixth, and num fds on seventh
+        memory rss on fourth, memory vms on fifth, num threads on sixth, num fds on seventh,
+        followed by context switches, page faults, disk io and sockets (if logged),
+        if max_points is given, each series is downsampled to about that many points
     """
-    ax1, ax2, ax3, ax4, ax5, ax6, ax7 = axes_
-    ax1.plot(metrics_['time'], metrics_['cpu']['percent'])
-    ax1.set_title(prefix + 'CPU Usage')
-    ax1.set_xlabel('time (s)')
-    ax1.set_ylabel('%CPU')
-
-    ax2.plot(metrics_['time'], metrics_['cpu']['system'])
-    ax2.set_title(prefix + 'System Time')
-    ax2.set_xlabel('time (s)')
-    ax2.set_ylabel('time (s)')
-
-    ax3.plot(metrics_['time'], metrics_['cpu']['user'])
-    ax3.set_title(prefix + 'User Time')
-    ax3.set_xlabel('time (s)')
-    ax3.set_ylabel('time (s)')
-
-    ax4.plot(metrics_['time'], metrics_['memory']['rss'])
-    ax4.set_title(prefix + 'Memory RSS/ RES')
-    ax4.set_xlabel('time (s)')
-    ax4.set_ylabel('Memory Size (MB)')
-
-    ax5.plot(metrics_['time'], metrics_['memory']['vms'])
-    ax5.set_title(prefix + 'Memory VMS/ VIRT')
-    ax5.set_xlabel('time (s)')
-    ax5.set_ylabel('Memory Size (MB)')
-
-    ax6.plot(metrics_['time'], metrics_['num_threads'])
-    ax6.set_title(prefix + 'Number of threads')
-    ax6.set_xlabel('time (s)')
-    ax6.set_ylabel('#threads')
-
-    ax7.plot(metrics_['time'], metrics_['num_fds'])
-    ax7.set_title(prefix + 'Number of file descriptors')
-    ax7.set_xlabel('time (s)')
-    ax7.set_ylabel('#fd')
-
-
-""" Get the client and server metrics """
-print("parsing server logs..")
-server_metrics = parse_log_file(server_log_file)
-
-print("parsing client logs..")
-client_metrics = parse_log_file(client_log_file)
-
-print("constructing plot for scenario ..")
-""" Construct a figure with appropriate dimensions to plot metrics on"""
-plt.figure(figsize=(80, 40))
-
-""" Obtain the axes to plot the given server """
-server_axes = [
-    plt.subplot2grid((4, 8), (0, 0), rowspan=2, colspan=2),
-    plt.subplot2grid((4, 8), (0, 2), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (1, 2), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (2, 0), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (3, 0), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (2, 2), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (3, 2), rowspan=1, colspan=2),
-]
-client_axes = [
-    plt.subplot2grid((4, 8), (0, 4), rowspan=2, colspan=2),
-    plt.subplot2grid((4, 8), (0, 6), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (1, 6), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (2, 4), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (3, 4), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (2, 6), rowspan=1, colspan=2),
-    plt.subplot2grid((4, 8), (3, 6), rowspan=1, colspan=2),
-]
-
-print("plotting server metrics ..")
-plot_metrics(server_axes, server_metrics, 'server ')
-print("plotting client metrics ..")
-plot_metrics(client_axes, client_metrics, 'client ')
-
-""" Save as png image """
-image_file = args.scenario + '.png'
-print("saving to image", image_file)
-plt.suptitle("Scenario: " + args.scenario)
-plt.savefig(image_file, dpi=120)
-plt.clf()
+    for axis, (title, label, series) in zip(axes_, PANELS):
+        labelled_series = panel_series(metrics_, series)
+        for series_label, values in labelled_series.items():
+            plot_series(axis, metrics_, series_label, values, max_points, method)
+        if len(labelled_series) > 1:
+            axis.legend()
+        axis.set_title(prefix + title)
+        axis.set_xlabel('time (s)')
+        axis.set_ylabel(label)
+
+
+def update_metrics(axes_, metrics_, max_points=None, method='lttb'):
+    """ Updates the lines drawn by plot_metrics on the given axes in place with the given metrics,
+        and rescales the axes to the new data, the lines of series which appeared since (like the kernel
+        counters, missing from the first samples of some logs) are drawn then """
+    for axis, (_, _, series) in zip(axes_, PANELS):
+        lines = {line.get_gid(): line for line in axis.lines}
+        labelled_series = panel_series(metrics_, series)
+        for series_label, values in labelled_series.items():
+            line = lines.get(series_gid(series_label))
+            if line is None:
+                plot_series(axis, metrics_, series_label, values, max_points, method)
+                if len(labelled_series) > 1:
+                    axis.legend()
+            else:
+                line.set_data(*metric_points(metrics_, values, max_points, method))
+        axis.relim()
+        axis.autoscale_view()
+
+
+def plot_events(axes_, events, labelled_axes=()):
+    """ Draws the events (and markers) of the run as vertical lines on the axes, labelled on the labelled axes,
+        the metrics must share the zero point of the events (see timeline.load_timeline) """
+    for axis in axes_:
+        for event in events:
+            axis.axvline(event['offset'], color=EVENT_COLORS.get(event['event'], MARKER_COLOR), linestyle='--',
+                         linewidth=0.8)
+            if axis in labelled_axes:
+                axis.text(event['offset'], 1, timeline.event_label(event), transform=axis.get_xaxis_transform(),
+                          rotation=90, va='top', ha='right', fontsize='small')
+
+
+def render(scenario, max_points=None, method='lttb', fast=False, image_file=None):
+    """ Plots the client and server metrics of the scenario to the image file (the scenario name as png by default),
+        returns the image file, max_points and method select the downsampling of each series, fast picks the figure
+        size, dpi and number of points from the data, matplotlib is imported only here (and in create_axes),
+        so that the scripts running the benchmarks do not pay for it """
+    import matplotlib.pyplot as plt
+    server_log_file = scenario + '-monitor-server.log'
+    client_log_file = scenario + '-monitor-client.log'
+    print("expected server log file: ", server_log_file)
+    print("expected client log file: ", client_log_file)
+    """ Assert that the log files exists """
+    assert os.path.exists(server_log_file)
+    assert os.path.exists(client_log_file)
+
+    print("log files for client and server found for given scenario")
+
+    """ Get the client and server metrics, on the timeline of the run (a shared zero point) if its events
+        were recorded, else each relative to its first sample """
+    events = []
+    if os.path.exists(scenario + '-events.log'):
+        print("parsing events and logs..")
+        events, roles = timeline.load_timeline(scenario)
+        server_metrics, client_metrics = roles['server'], roles['client']
+    else:
+        print("parsing server logs..")
+        server_metrics = metrics.load_metrics(server_log_file)
+
+        print("parsing client logs..")
+        client_metrics = metrics.load_metrics(client_log_file)
+
+    print("constructing plot for scenario ..")
+    """ Construct a figure with appropriate dimensions to plot metrics on"""
+    figure_size, dpi, requested_points = (80, 40), 120, max_points
+    if fast:
+        num_samples = max(len(server_metrics['time']), len(client_metrics['time']))
+        figure_size, dpi, max_points = fast_render_settings(num_samples)
+        max_points, method = min(max_points, requested_points or max_points), 'minmax'
+    figure = plt.figure(figsize=figure_size)
+
+    """ Obtain the axes to plot the given server """
+    server_axes, client_axes = create_axes()
+
+    print("plotting server metrics ..")
+    plot_metrics(server_axes, server_metrics, 'server ', max_points, method)
+    print("plotting client metrics ..")
+    plot_metrics(client_axes, client_metrics, 'client ', max_points, method)
+    if events:
+        plot_events(server_axes + client_axes, events, labelled_axes=(server_axes[0], client_axes[0]))
+
+    """ Save as png image """
+    image_file = image_file or scenario + '.png'
+    print("saving to image", image_file)
+    plt.suptitle("Scenario: " + scenario)
+    plt.savefig(image_file, dpi=dpi)
+    """ Closed rather than cleared, so that rendering many scenarios in one process does not keep their figures """
+    plt.close(figure)
+    return image_file
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', '-S', help='specify the benchmark scenario', required=True)
+    parser.add_argument('--max-points', '-n', help='downsample each series to about this many points before plotting',
+                        type=int, default=None)
+    parser.add_argument('--downsample', '-d', help='the downsampling method, both preserve the peaks',
+                        choices=['lttb', 'minmax'], default='lttb')
+    parser.add_argument('--fast', '-f', help='fast render mode, picks the figure size, dpi and number of points '
+                                             'from the data (downsampling with min-max per pixel bucket)',
+                        action='store_true')
+    args = parser.parse_args()
+    render(args.scenario, args.max_points, args.downsample, args.fast)
+
+
+if __name__ == "__main__":
+    main()
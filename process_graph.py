@@ -1,9 +1,10 @@
-import psutil
 import time
 import json
 import math
 import sys
 import os
+import procfs
+import procevents
 
 
 def convert_daemon(out_file=None, err_file=None):
@@ -28,14 +29,93 @@ def convert_daemon(out_file=None, err_file=None):
     os.umask(0)
 
 
-def monitor_process_branches_daemon(interval=0.1, out_file="branching_out.log", err_file="branching_error.log"):
+def __sample_resources__(pid_, process_):
+    """ Updates the cumulative cpu time, peak rss and context switches of the tracked process,
+        the last sampled values are kept once the process is gone """
+    try:
+        with open("/proc/%d/stat" % pid_, "rb") as file:
+            stat_ = procfs.parse_stat(file.read())
+        if process_["start_ticks"] not in (None, stat_["start_ticks"]):
+            """ The pid has been reused by another process """
+            return
+        status_ = procfs.read_status(pid_)
+    except (OSError, ValueError):
+        return
+    process_["cpu_time"] = stat_["user"] + stat_["system"]
+    """ The kernel keeps the peak rss (high water mark), so peaks between samples are not missed """
+    process_["peak_rss"] = max(process_["peak_rss"], status_.get("VmHWM", 0), stat_["rss"])
+    process_["ctx_switches"] = {
+        "voluntary": status_.get("voluntary_ctxt_switches", 0),
+        "involuntary": status_.get("nonvoluntary_ctxt_switches", 0),
+    }
+
+
+def __start_ticks__(pid_):
+    """ Returns the start time (clock ticks since boot) of the process, None if it is gone already """
+    try:
+        return procfs.read_stat(pid_)["start_ticks"]
+    except (OSError, ValueError):
+        return None
+
+
+def __log_exit__(running_, finished_, pid_, exit_time_, root_pid_):
+    """ Stops tracking the exited process and logs its life time and resource usage,
+        the resources are sampled a last time, as an exited process can be read until it is reaped """
+    process_ = running_.pop(pid_)
+    finished_[pid_] = process_["start_ticks"]
+    __sample_resources__(pid_, process_)
+    print(json.dumps({
+        "pid": pid_,
+        "ppid": process_["ppid"],
+        "creation_time": process_["creation_time"],
+        "exit_time": exit_time_,
+        "life_time": exit_time_ - process_["creation_time"],
+        "root": pid_ == root_pid_,
+        "cpu_time": process_["cpu_time"],
+        "peak_rss": process_["peak_rss"],
+        "ctx_switches": process_["ctx_switches"],
+    }))
+
+
+def __scan_process_tree__(running_, finished_, daemon_pid_, boot_time_, track_):
+    """ Discovers new descendants of the tracked processes from a single snapshot of /proc,
+        processes which already finished (but are not reaped yet) are not tracked again, returns the snapshot """
+    snapshot_ = procfs.scan_processes()
+    children_ = {}
+    for pid_, stat_ in snapshot_.items():
+        children_.setdefault(stat_["ppid"], []).append(pid_)
+    """ Walk down from the tracked processes which are still alive, so that the processes adopted
+        by some other process after their parent died are still reachable, as they are tracked already """
+    pending_ = [pid_ for pid_ in running_ if pid_ in snapshot_]
+    while pending_:
+        for child_pid_ in children_.get(pending_.pop(), []):
+            """ Current process under consideration cannot be daemon itself """
+            stat_ = snapshot_[child_pid_]
+            if child_pid_ not in running_ and child_pid_ != daemon_pid_ and \
+                    finished_.get(child_pid_, -1) not in (None, stat_["start_ticks"]):
+                track_(child_pid_, stat_["ppid"], boot_time_ + stat_["start_ticks"] / procfs.CLOCK_TICKS,
+                       stat_["start_ticks"])
+                pending_.append(child_pid_)
+    return snapshot_
+
+
+def monitor_process_branches_daemon(interval=0.1, out_file="branching_out.log", err_file="branching_error.log",
+                                    exit_tracking="auto"):
     """ This function creates a daemon process to monitor the current process and its children,
         Note: this process does not monitor itself
+        On every tick the cumulative cpu time, peak rss and context switches of the tracked processes
+        are sampled, and logged along with their life times on exit
+        New processes are discovered from a single snapshot of /proc on every tick,
+        exit times are obtained using the given exit tracking method:
+            netlink: fork and exit events of the process connector with exact (kernel) times,
+                which also captures short lived processes, no polling is needed, requires CAP_NET_ADMIN
+            pidfd: exact exit times from pidfds, processes are still discovered by polling
+            poll: exit times are estimated as the time of the first snapshot in which the process is gone
+            auto: the first of the above available
      """
     """ Get current process details before creating daemon process """
     root_pid_ = os.getpid()
     root_ppid_ = os.getppid()
-    root_process_ = psutil.Process()
     daemon_pid_ = os.fork()
     """ Fork and create a daemon process to monitor its parent process """
     if daemon_pid_ == 0:
@@ -43,52 +123,72 @@ def monitor_process_branches_daemon(interval=0.1, out_file="branching_out.log",
         daemon_pid_ = os.getpid()
         convert_daemon(out_file, err_file)
         error = lambda *values, **kwargs: print(*values, file=sys.stderr, **kwargs)
-        running_processes_ = {root_process_}
-        """ Also keep track of current process, to prevent processing it and waiting for itself """
-        daemon_process_ = psutil.Process()
-        """ Keep track or original parent id's as if parent dies """
-        parent_pids_ = {root_pid_: root_ppid_}
-        while running_processes_:
-            """ Discover new processes by looking for children of existing processes """
-            for process_ in running_processes_.copy():
-                """ Loop using a copy as running_processes_ may get modified, 
-                    as some process may throw exception on exit while requesting for its children 
-                    (discovering new processes), discovering new process using 
-                    children of original processes is required as if some process dies,
-                    its children may be adopted and becoming unreachable, 
-                    also not all processes can be monitored, 
-                    if a process is forked and creates children and dies before being monitored, 
-                    entire sub-tree is lost, thus it is suitable to monitor programs with child process
-                    that are relatively long running enough to be processed, 
-                    that is dies after some time after forking """
+        if exit_tracking == "auto":
+            exit_tracking = "netlink" if procevents.ProcConnector.available() else \
+                "pidfd" if procevents.PidfdExitWatcher.available() else "poll"
+        error("daemon process", daemon_pid_, "tracking exits using", exit_tracking)
+        connector_ = procevents.ProcConnector() if exit_tracking == "netlink" else None
+        watcher_ = procevents.PidfdExitWatcher() if exit_tracking == "pidfd" else None
+        boot_time_ = procfs.boot_time()
+        """ The tracked processes, with their original parent ids, as if parent dies the process is adopted """
+        running_ = {}
+        """ The processes which finished, with their start times, as their pids may be reused """
+        finished_ = {}
+
+        def track_(pid_, ppid_, creation_time_, start_ticks_=None):
+            running_[pid_] = {"ppid": ppid_, "creation_time": creation_time_, "start_ticks": start_ticks_,
+                              "cpu_time": 0.0, "peak_rss": 0, "ctx_switches": {"voluntary": 0, "involuntary": 0}}
+            if watcher_ and not watcher_.watch(pid_):
+                """ Already exited and reaped """
+                __log_exit__(running_, finished_, pid_, time.time(), root_pid_)
+
+        root_stat_ = procfs.scan_processes().get(root_pid_)
+        if root_stat_:
+            track_(root_pid_, root_ppid_, boot_time_ + root_stat_["start_ticks"] / procfs.CLOCK_TICKS,
+                   root_stat_["start_ticks"])
+        """ Pick up the children which already exist """
+        __scan_process_tree__(running_, finished_, daemon_pid_, boot_time_, track_)
+        next_tick_ = time.monotonic()
+        while running_:
+            timeout_ = next_tick_ - time.monotonic()
+            scan_ = connector_ is None
+            if connector_:
                 try:
-                    """ Don't go for recursive as it will be monitored and avoid un-necessary looping,
-                     But however it will capture the new grand-children in this iteration itself """
-                    for child_process_ in process_.children():
-                        child_pid_ = child_process_.pid
-                        child_ppid_ = process_.pid
-                        """ Current process under consideration cannot be daemon itself """
-                        if child_process_ not in running_processes_ and child_pid_ != daemon_pid_:
-                            running_processes_.add(child_process_)
-                            parent_pids_[child_pid_] = child_ppid_
-                except psutil.Error:
-                    """ If exception is thrown, then process may have exited """
-                    running_processes_.remove(process_)
-                    process_pid_ = process_.pid
-                    process_ppid_ = parent_pids_[process_pid_]
-                    process_creation_time_ = process_.create_time()
-                    """ Note: exit time is an estimation, based on when exception is thrown """
-                    process_exit_time_ = time.time()
-                    print(json.dumps({
-                        "pid": process_pid_,
-                        "ppid": process_ppid_,
-                        "creation_time": process_creation_time_,
-                        "exit_time": process_exit_time_,
-                        "life_time": process_exit_time_ - process_creation_time_,
-                        "root": process_pid_ == root_pid_,
-                    }))
-            time.sleep(interval)
-            """ If monitoring process times, do it here """
+                    for event_, pid_, value_, event_time_ in connector_.receive(timeout_):
+                        if event_ == "fork":
+                            """ The pid is of a new process from now on, even if a finished process had it """
+                            finished_.pop(value_, None)
+                        if event_ == "fork" and pid_ in running_ and value_ != daemon_pid_:
+                            """ Along with its start time, so that a later reuse of its pid can be told apart """
+                            track_(value_, pid_, event_time_, __start_ticks__(value_))
+                        elif event_ == "exit" and pid_ in running_:
+                            __log_exit__(running_, finished_, pid_, event_time_, root_pid_)
+                except OSError:
+                    """ Events were dropped (the socket buffer overflowed), fall back to scanning """
+                    error("process events dropped, scanning processes")
+                    scan_ = True
+            elif watcher_:
+                for pid_, exit_time_ in watcher_.wait(timeout_):
+                    if pid_ in running_:
+                        __log_exit__(running_, finished_, pid_, exit_time_, root_pid_)
+            else:
+                time.sleep(max(timeout_, 0))
+            if scan_ and time.monotonic() >= next_tick_:
+                snapshot_ = __scan_process_tree__(running_, finished_, daemon_pid_, boot_time_, track_)
+                if not watcher_:
+                    """ Note: exit time is an estimation, based on when the process is found to be gone
+                        (or a zombie, or its pid reused by another process) """
+                    exit_time_ = time.time()
+                    for pid_ in list(running_):
+                        stat_ = snapshot_.get(pid_)
+                        if stat_ is None or stat_["state"] == "Z" or \
+                                running_[pid_]["start_ticks"] not in (None, stat_["start_ticks"]):
+                            __log_exit__(running_, finished_, pid_, exit_time_, root_pid_)
+            if time.monotonic() >= next_tick_:
+                """ Sample the resources used by the tracked processes in the same pass """
+                for pid_, process_ in running_.items():
+                    __sample_resources__(pid_, process_)
+                next_tick_ += interval * (int((time.monotonic() - next_tick_) / interval) + 1)
         error("daemon process", daemon_pid_, "exited")
         exit(0)
     """ Return the pid of daemon if needed """
@@ -96,51 +196,133 @@ def monitor_process_branches_daemon(interval=0.1, out_file="branching_out.log",
     return daemon_pid_
 
 
+def __load_process_stats__(out_log_file):
+    """ Streams the process life time logs, keeping only the fields needed for drawing """
+    all_stats_ = dict()
+    with open(out_log_file) as file:
+        for line in file:
+            process_stats_ = json.loads(line)
+            all_stats_[process_stats_["pid"]] = {
+                "ppid": process_stats_["ppid"],
+                "creation_time": process_stats_["creation_time"],
+                "exit_time": process_stats_["exit_time"],
+                "root": process_stats_["root"],
+                "cpu_time": process_stats_.get("cpu_time", 0),
+                "peak_rss": process_stats_.get("peak_rss", 0),
+                "children": [],
+            }
+    return all_stats_
+
+
 def __drawing_order__(all_stats_, pid_):
-    """ Return the drawing order of the pid(s) """
-    if not all_stats_[pid_]["sorted_children"]:
-        """ If no children, then drawing only itself """
-        return [pid_]
-    """Else draw itself, then the draw order of the children, on after the other, 
-    assuming children processes are sorted accordingly """
-    order_ = [pid_]
-    for child_pid_ in all_stats_[pid_]["sorted_children"]:
-        order_ += __drawing_order__(all_stats_, child_pid_)
+    """ Return the drawing order of the pid(s), each process is drawn before the drawing order of its children,
+     one after the other, assuming children processes are sorted accordingly.
+     Iterative (using a stack) to handle deep process trees """
+    order_, pending_ = [], [pid_]
+    while pending_:
+        pid_ = pending_.pop()
+        order_.append(pid_)
+        """ Push in reverse, so that the first child is drawn first """
+        pending_.extend(reversed(all_stats_[pid_]["sorted_children"]))
     return order_
 
 
 def __find_num_descendants__(all_stats_, pid_):
-    """ Assuming all_stats forms a tree """
-    if not all_stats_[pid_]["children"]:
-        """ if no children, then no descendants """
-        all_stats_[pid_]["num_descendants"] = 0
-    else:
-        """ If some number of children, then number of descendants is sum of number of 
-        descendants of children and number of children """
-        all_stats_[pid_]["num_descendants"] = len(all_stats_[pid_]["children"])
-        for child_pid_ in all_stats_[pid_]["children"]:
-            """ Update the descendants count of children """
-            __find_num_descendants__(all_stats_, child_pid_)
-            """ Then, update current based on it """
-            all_stats_[pid_]["num_descendants"] += all_stats_[child_pid_]["num_descendants"]
+    """ Assuming all_stats forms a tree, the number of descendants is sum of number of
+        descendants of children and number of children, children are updated before their parents """
+    order_, pending_ = [], [pid_]
+    while pending_:
+        pid_ = pending_.pop()
+        order_.append(pid_)
+        pending_.extend(all_stats_[pid_]["children"])
+    for pid_ in reversed(order_):
+        all_stats_[pid_]["num_descendants"] = sum(1 + all_stats_[child_pid_]["num_descendants"]
+                                                  for child_pid_ in all_stats_[pid_]["children"])
+
+
+def __collapse_identical_siblings__(all_stats_, pid_):
+    """ Replaces siblings with identical sub-trees (same shape, and same creation and exit times relative
+     to the parent in time units) by the first of them, with the number of such siblings as its count """
+    order_ = __drawing_order__(all_stats_, pid_)
+    signatures_ = dict()
+    for pid_ in reversed(order_):
+        stats_ = all_stats_[pid_]
+        parent_units_ = all_stats_[stats_["ppid"]]["relative_creation_time_units"] \
+            if not stats_["root"] else stats_["relative_creation_time_units"]
+        signature_ = (stats_["relative_creation_time_units"] - parent_units_,
+                      stats_["relative_exit_time_units"] - stats_["relative_creation_time_units"],
+                      tuple(all_stats_[child_pid_]["signature"] for child_pid_ in stats_["sorted_children"]))
+        """ Intern the signatures, so that they are compared (and hashed) as small integers """
+        stats_["signature"] = signatures_.setdefault(signature_, len(signatures_))
+        groups_ = dict()
+        for child_pid_ in stats_["sorted_children"]:
+            groups_.setdefault(all_stats_[child_pid_]["signature"], []).append(child_pid_)
+        stats_["sorted_children"] = [group_[0] for group_ in groups_.values()]
+        for group_ in groups_.values():
+            all_stats_[group_[0]]["count"] = len(group_)
+
+
+def __save_png__(figure_file, image_width, image_height, lines_, labels_, max_tile_height):
+    """ Draws the lines and labels to png image(s), images taller than max_tile_height are split into tiles,
+     saved with the tile index appended to the file name """
+    from PIL import Image, ImageDraw
+    num_tiles_ = math.ceil(image_height / max_tile_height)
+    name_, extension_ = os.path.splitext(figure_file)
+    for tile_ in range(num_tiles_):
+        tile_file_ = figure_file if num_tiles_ == 1 else "%s-%d%s" % (name_, tile_, extension_)
+        top_ = tile_ * max_tile_height
+        tile_height_ = min(max_tile_height, image_height - top_)
+        image = Image.new("RGB", (image_width, tile_height_), (255, 255, 255))
+        draw = ImageDraw.Draw(image)
+        for x0_, y0_, x1_, y1_, color_, width_ in lines_:
+            """ Only the lines crossing this tile, the parts outside of the tile are clipped """
+            if max(y0_, y1_) + width_ >= top_ and min(y0_, y1_) - width_ < top_ + tile_height_:
+                draw.line((x0_, y0_ - top_, x1_, y1_ - top_), color_, width=width_)
+        for x_, y_, text_ in labels_:
+            if top_ <= y_ < top_ + tile_height_:
+                draw.text((x_, y_ - top_), text_, fill=(0, 0, 0))
+        print("Saving process branching image to", tile_file_, "...")
+        image.save(tile_file_)
+
+
+def __save_svg__(figure_file, image_width, image_height, lines_, labels_):
+    """ Streams the lines and labels to a (vector) svg image """
+    print("Saving process branching image to", figure_file, "...")
+    with open(figure_file, "w") as file:
+        file.write('<svg xmlns="http://www.w3.org/2000/svg" width="%d" height="%d">\n' % (image_width, image_height))
+        file.write('<rect width="100%" height="100%" fill="white"/>\n')
+        for x0_, y0_, x1_, y1_, color_, width_ in lines_:
+            file.write('<line x1="%d" y1="%d" x2="%d" y2="%d" stroke="rgb%s" stroke-width="%d"/>\n'
+                       % (x0_, y0_, x1_, y1_, color_, width_))
+        for x_, y_, text_ in labels_:
+            file.write('<text x="%d" y="%d" font-size="10" dominant-baseline="middle">%s</text>\n' % (x_, y_, text_))
+        file.write('</svg>\n')
+
+
+def __weight_style__(weight_, line_width, separation_width):
+    """ Returns the colour and width of a line with the given weight (between 0 and 1),
+     from thin grey for idle processes to thick red for the hottest process """
+    color_ = (int(200 + 20 * weight_), int(200 * (1 - weight_)), int(200 * (1 - weight_)))
+    return color_, line_width + int(weight_ * max(separation_width - 1, 0))
 
 
 def generate_process_branching_image(out_log_file="branching_out.log", figure_file="branching.png", time_resolution=0.1,
-                                     line_width=1, separation_width=5):
+                                     line_width=1, separation_width=5, collapse=False, max_tile_height=16384,
+                                     verbose=False, weight_by=None):
     """ This function reads the process life time logs and generates a phylogenetic tree sort of graph of processes
      based on parent process relations and process life times, time resolution line width and
       separation width are used to draw graphs """
     """
     Time resolution is used to control the x axis scale, that is, how much time each pixel along x-axis represent,
     Line width controls thickness of lines and separation_width controls spacing between lines.
+    If collapse is set, identical sibling sub-trees are drawn as a single row, labelled with their count.
+    If weight_by is set (cpu or memory), the life line of each process is coloured and thickened by its
+    cpu time or peak rss, relative to the process using the most.
+    If the figure file is an svg file, a vector image is generated, else png images taller than
+    max_tile_height pixels are split into multiple tiles.
     """
     assert time_resolution > 0
-    all_stats_ = dict()
-    with open(out_log_file) as file:
-        for line in file:
-            process_stats_ = json.loads(line)
-            process_stats_["children"] = []
-            all_stats_[process_stats_["pid"]] = process_stats_
+    all_stats_ = __load_process_stats__(out_log_file)
     """ Get the overall starting time and completion time and total life time, useful for plotting """
     creation_time_ = min(all_stats_[pid__]["creation_time"] for pid__ in all_stats_)
     completion_time_ = max(all_stats_[pid__]["exit_time"] for pid__ in all_stats_)
@@ -151,11 +333,12 @@ def generate_process_branching_image(out_log_file="branching_out.log", figure_fi
     assert len(root_processes_pid_) == 1
     root_process_pid_ = root_processes_pid_[0]
 
-    """ Construct the process tree """
+    """ Construct the process tree, processes whose parent was not tracked are attached to the root """
     for pid__ in all_stats_:
-        ppid__ = all_stats_[pid__]["ppid"]
         if pid__ != root_process_pid_:
-            all_stats_[ppid__]["children"].append(pid__)
+            if all_stats_[pid__]["ppid"] not in all_stats_:
+                all_stats_[pid__]["ppid"] = root_process_pid_
+            all_stats_[all_stats_[pid__]["ppid"]]["children"].append(pid__)
 
     """ Update the number of descendants for a given process """
     __find_num_descendants__(all_stats_, root_process_pid_)
@@ -166,44 +349,74 @@ def generate_process_branching_image(out_log_file="branching_out.log", figure_fi
         all_stats_[pid__]["relative_creation_time_units"] = int(
             all_stats_[pid__]["relative_creation_time"] / time_resolution)
         all_stats_[pid__]["relative_exit_time_units"] = int(all_stats_[pid__]["relative_exit_time"] / time_resolution)
+        all_stats_[pid__]["count"] = 1
 
     """ Now order the processes based suitable for drawing the graph based on
      parent-child relation and creation time (fork time) """
     for pid__ in all_stats_:
         all_stats_[pid__]["sorted_children"] = sorted(all_stats_[pid__]["children"], reverse=True,
                                                       key=lambda __pid: all_stats_[__pid]["creation_time"])
+    if collapse:
+        __collapse_identical_siblings__(all_stats_, root_process_pid_)
     drawing_order_ = __drawing_order__(all_stats_, root_process_pid_)
-    print("ORDER:", drawing_order_)
+    """ The row in which each process is drawn """
+    rows_ = {pid__: index_ for index_, pid__ in enumerate(drawing_order_)}
+    if verbose:
+        print("ORDER:", drawing_order_)
 
     """ Now draw the line graph """
     life_time_units_ = math.ceil(life_time_ / time_resolution) + separation_width * 2
-    from PIL import Image, ImageDraw
-    num_stats_ = len(all_stats_)
-    image_width, image_height = life_time_units_, num_stats_ * line_width + (num_stats_ + 1) * separation_width
-    image = Image.new("RGB", (image_width, image_height), (255, 255, 255))
-    draw = ImageDraw.Draw(image)
+    num_rows_ = len(drawing_order_)
+    labels_width_ = 40 if collapse else 0
+    image_width, image_height = life_time_units_ + labels_width_, \
+        num_rows_ * line_width + (num_rows_ + 1) * separation_width
+    lines_, labels_ = [], []
+    weight_key_ = {None: None, "cpu": "cpu_time", "memory": "peak_rss"}[weight_by]
+    max_weight_ = max(all_stats_[pid__][weight_key_] for pid__ in all_stats_) if weight_key_ else 0
 
     for index_, pid_ in enumerate(drawing_order_):
         """ Draw the time lines"""
         y_offset = line_width * index_ + separation_width * (index_ + 1)
-        xy_ = (separation_width + all_stats_[pid_]["relative_creation_time_units"], y_offset) + \
-              (separation_width + all_stats_[pid_]["relative_exit_time_units"], y_offset)
-        draw.line(xy_, (0, 0, 0), width=line_width)
+        x_end_ = separation_width + all_stats_[pid_]["relative_exit_time_units"]
+        color_, width_ = (0, 0, 0), line_width
+        if max_weight_ > 0:
+            color_, width_ = __weight_style__(all_stats_[pid_][weight_key_] / max_weight_, line_width,
+                                              separation_width)
+        lines_.append((separation_width + all_stats_[pid_]["relative_creation_time_units"], y_offset,
+                       x_end_, y_offset, color_, width_))
+        if all_stats_[pid_]["count"] > 1:
+            labels_.append((x_end_ + 2, y_offset, "x%d" % all_stats_[pid_]["count"]))
         """ Now connect them to their parents """
         if pid_ != root_process_pid_:
             x_offset = separation_width + all_stats_[pid_]["relative_creation_time_units"]
-            parent_index_ = drawing_order_.index(all_stats_[pid_]["ppid"])
+            parent_index_ = rows_[all_stats_[pid_]["ppid"]]
             y_parent_offset = line_width * parent_index_ + separation_width * (parent_index_ + 1)
-            xy_ = (x_offset, y_offset) + (x_offset, y_parent_offset)
-            draw.line(xy_, (0, 0, 0), width=line_width)
+            lines_.append((x_offset, y_offset, x_offset, y_parent_offset, (0, 0, 0), line_width))
 
-    print("Saving process branching image to", figure_file, "...")
-    image.save(figure_file)
-    for pid__ in all_stats_:
-        print(all_stats_[pid__])
+    if figure_file.endswith(".svg"):
+        __save_svg__(figure_file, image_width, image_height, lines_, labels_)
+    else:
+        __save_png__(figure_file, image_width, image_height, lines_, labels_, max_tile_height)
+    if verbose:
+        for pid__ in all_stats_:
+            print(pid__, all_stats_[pid__])
 
 
 if __name__ == "__main__":
     """ Run the program with default arguments """
-    generate_process_branching_image()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log', help='the process life time log', default="branching_out.log")
+    parser.add_argument('--figure', help='the image to generate, png (tiled if too tall) or svg',
+                        default="branching.png")
+    parser.add_argument('--time-resolution', help='seconds represented by each pixel along x-axis',
+                        type=float, default=0.1)
+    parser.add_argument('--collapse', help='draw identical sibling sub-trees as a single row with a count',
+                        action='store_true')
+    parser.add_argument('--weight-by', help='colour and thicken the life lines by the cpu time or peak rss',
+                        choices=['cpu', 'memory'], default=None)
+    parser.add_argument('--verbose', help='print the drawing order and stats of each process', action='store_true')
+    args = parser.parse_args()
+    generate_process_branching_image(args.log, args.figure, args.time_resolution, collapse=args.collapse,
+                                     verbose=args.verbose, weight_by=args.weight_by)
 
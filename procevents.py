@@ -0,0 +1,140 @@
+"""
+    This file contains sources of process exit (and fork) events, used to track the exact exit times of processes
+    instead of estimating them from polling (Linux only).
+    PidfdExitWatcher uses pidfd_open (Linux 5.3+) and epoll, a pidfd becomes readable as soon as the process exits.
+    ProcConnector uses the netlink process events connector, which reports every fork and exit in the system
+    with kernel timestamps, it requires CAP_NET_ADMIN (usually root).
+"""
+
+import os
+import time
+import select
+import socket
+import struct
+
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+PROC_CN_MCAST_LISTEN = 1
+PROC_EVENT_FORK = 0x00000001
+PROC_EVENT_EXIT = 0x80000000
+
+""" struct nlmsghdr: length, type, flags, sequence, port id """
+NLMSG_HEADER = struct.Struct('=IHHII')
+NLMSG_DONE = 3
+""" struct cn_msg: index, value, sequence, ack, length, flags """
+CN_MSG_HEADER = struct.Struct('=IIIIHH')
+""" struct proc_event: what, cpu, timestamp (ns, monotonic clock) followed by the event data """
+PROC_EVENT_HEADER = struct.Struct('=IIQ')
+""" Fork event data: parent pid, parent tgid, child pid, child tgid
+    Exit event data: pid, tgid, exit code, exit signal """
+PROC_EVENT_DATA = struct.Struct('=IIII')
+
+
+def wall_clock_offset():
+    """ Returns the offset to convert monotonic clock times to wall clock times (seconds since the epoch) """
+    return time.time() - time.monotonic()
+
+
+class PidfdExitWatcher:
+    """ Watches processes for exits using pidfds in an epoll set """
+
+    def __init__(self):
+        self.epoll = select.epoll()
+        self.pids = {}
+
+    @staticmethod
+    def available():
+        """ Returns whether pidfds are supported by python and the kernel """
+        if not hasattr(os, 'pidfd_open'):
+            return False
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+            return True
+        except OSError:
+            return False
+
+    def watch(self, pid):
+        """ Starts watching the process, returns False if it has already been reaped """
+        try:
+            pidfd = os.pidfd_open(pid)
+        except OSError:
+            return False
+        self.pids[pidfd] = pid
+        self.epoll.register(pidfd, select.EPOLLIN)
+        return True
+
+    def wait(self, timeout):
+        """ Waits up to timeout seconds for watched processes to exit,
+            returns the pids of the processes which exited along with the time they exited at """
+        exits = []
+        for pidfd, _ in self.epoll.poll(max(timeout, 0)):
+            exit_time = time.time()
+            self.epoll.unregister(pidfd)
+            os.close(pidfd)
+            exits.append((self.pids.pop(pidfd), exit_time))
+        return exits
+
+    def close(self):
+        for pidfd in self.pids:
+            os.close(pidfd)
+        self.epoll.close()
+
+
+class ProcConnector:
+    """ Receives the fork and exit events of all processes in the system from the netlink process connector,
+        thread creation and exits are ignored """
+
+    def __init__(self):
+        self.socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        try:
+            self.socket.bind((os.getpid(), CN_IDX_PROC))
+            """ Subscribe to the process events """
+            operation = struct.pack('=I', PROC_CN_MCAST_LISTEN)
+            message = CN_MSG_HEADER.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(operation), 0) + operation
+            self.socket.send(NLMSG_HEADER.pack(NLMSG_HEADER.size + len(message), NLMSG_DONE, 0, 0, os.getpid())
+                             + message)
+        except OSError:
+            self.socket.close()
+            raise
+        self.offset = wall_clock_offset()
+
+    @staticmethod
+    def available():
+        """ Returns whether the process connector can be used, it requires CAP_NET_ADMIN """
+        try:
+            ProcConnector().close()
+            return True
+        except OSError:
+            return False
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def receive(self, timeout):
+        """ Waits up to timeout seconds for process events, returns a list of events, each being
+            ('fork', parent pid, child pid, time) or ('exit', pid, exit code, time), times are in seconds
+            since the epoch """
+        events = []
+        readable, _, _ = select.select([self.socket], [], [], max(timeout, 0))
+        while readable:
+            data = self.socket.recv(65536)
+            offset = 0
+            while offset + NLMSG_HEADER.size <= len(data):
+                length = NLMSG_HEADER.unpack_from(data, offset)[0]
+                event_offset = offset + NLMSG_HEADER.size + CN_MSG_HEADER.size
+                what, _, timestamp = PROC_EVENT_HEADER.unpack_from(data, event_offset)
+                first, first_tgid, second, second_tgid = PROC_EVENT_DATA.unpack_from(
+                    data, event_offset + PROC_EVENT_HEADER.size)
+                event_time = self.offset + timestamp / 1e9
+                if what == PROC_EVENT_FORK and second == second_tgid:
+                    events.append(('fork', first_tgid, second, event_time))
+                elif what == PROC_EVENT_EXIT and first == first_tgid:
+                    events.append(('exit', first, second, event_time))
+                offset += max(length, NLMSG_HEADER.size)
+            """ Drain the events already queued without blocking """
+            readable, _, _ = select.select([self.socket], [], [], 0)
+        return events
+
+    def close(self):
+        self.socket.close()
@@ -0,0 +1,298 @@
+"""
+    This file contains low overhead readers of process stats, which read them directly from /proc (Linux only).
+    The files are opened once and kept open between samples, each sample is a single read of /proc/<pid>/stat
+    (cpu times, threads, memory) and a listing of the already opened /proc/<pid>/fd directory, whose fds are told
+    apart as sockets only every few samples (see SocketCounter).
+"""
+
+import os
+import math
+import time
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+""" Size of the reads of the kept open files, larger than any of them """
+READ_SIZE = 16384
+
+
+def parse_stat(data):
+    """ Parses the contents of /proc/<pid>/stat, the command name may contain spaces and brackets,
+        so the fields are split after the last closing bracket """
+    fields = data[data.rindex(b')') + 2:].split()
+    """ Field n (as numbered in proc(5)) is at index n - 3 """
+    return {
+        'state': fields[0].decode(),
+        'ppid': int(fields[1]),
+        'minor_faults': int(fields[7]),
+        'children_minor_faults': int(fields[8]),
+        'major_faults': int(fields[9]),
+        'children_major_faults': int(fields[10]),
+        'user': int(fields[11]) / CLOCK_TICKS,
+        'system': int(fields[12]) / CLOCK_TICKS,
+        'children_user': int(fields[13]) / CLOCK_TICKS,
+        'children_system': int(fields[14]) / CLOCK_TICKS,
+        'num_threads': int(fields[17]),
+        'start_ticks': int(fields[19]),
+        'vms': int(fields[20]),
+        'rss': int(fields[21]) * PAGE_SIZE,
+    }
+
+
+""" Fields of /proc/<pid>/status holding the context switches """
+CTX_SWITCH_KEYS = (b'voluntary_ctxt_switches', b'nonvoluntary_ctxt_switches')
+""" Fields of /proc/<pid>/io holding the bytes read from and written to the storage layer """
+IO_KEYS = (b'read_bytes', b'write_bytes')
+
+
+def parse_status_lines(lines, keys):
+    """ Yields the given numeric fields of the lines of /proc/<pid>/status (or of the files with the same format,
+        like io and smaps), sizes are converted from kB to bytes """
+    for line in lines:
+        key, _, value = line.partition(b':')
+        if key in keys:
+            value = value.split()
+            yield key.decode(), int(value[0]) * (1024 if value[1:] == [b'kB'] else 1)
+
+
+def parse_status(data, keys):
+    """ Parses the given numeric fields of the contents of /proc/<pid>/status (or of /proc/<pid>/io, which
+        has the same format), sizes are converted from kB to bytes """
+    return dict(parse_status_lines(data.split(b'\n'), keys))
+
+
+def read_status(pid, keys=(b'VmHWM',) + CTX_SWITCH_KEYS):
+    """ Returns the given numeric fields of /proc/<pid>/status, sizes are converted from kB to bytes """
+    with open('/proc/%d/status' % pid, 'rb') as file:
+        return parse_status(file.read(), keys)
+
+
+def count_sockets(fds, fd_dir, dir_fd=None):
+    """ Returns how many of the listed file descriptors of the /proc/<pid>/fd directory (or of the already opened
+        directory dir_fd) are sockets, fds closed while being counted are skipped.
+        Note: this takes a readlink of every fd, which costs far more than listing them for processes with many
+        open fds, so monitoring loops count them only every Nth sample (see SocketCounter) """
+    num_sockets = 0
+    for fd in fds:
+        try:
+            if os.readlink(fd if dir_fd is not None else fd_dir + '/' + fd, dir_fd=dir_fd).startswith('socket:'):
+                num_sockets += 1
+        except OSError:
+            pass
+    return num_sockets
+
+
+def counters(stat, status, io, num_sockets, children=False):
+    """ Returns the kernel counters sample fields of a process, from its parsed stat, status and io,
+        the page faults include those of its reaped children if children is set """
+    minor, major = stat['minor_faults'], stat['major_faults']
+    if children:
+        minor, major = minor + stat['children_minor_faults'], major + stat['children_major_faults']
+    return {
+        'ctx_switches': {
+            'voluntary': status.get('voluntary_ctxt_switches', 0),
+            'involuntary': status.get('nonvoluntary_ctxt_switches', 0),
+        },
+        'page_faults': {'minor': minor, 'major': major},
+        'io': {'read_bytes': io.get('read_bytes', 0), 'write_bytes': io.get('write_bytes', 0)},
+        'num_sockets': num_sockets,
+    }
+
+
+def read_io(pid):
+    """ Returns the storage bytes read and written by the process, empty if not permitted to read them """
+    try:
+        with open('/proc/%d/io' % pid, 'rb') as file:
+            return parse_status(file.read(), IO_KEYS)
+    except PermissionError:
+        return {}
+
+
+def read_stat(pid):
+    """ Returns the parsed /proc/<pid>/stat of the process """
+    with open('/proc/%d/stat' % pid, 'rb') as file:
+        return parse_stat(file.read())
+
+
+def read_counters(pid, children=False, sockets=None, stat=None):
+    """ Returns the kernel counters (context switches, page faults, io bytes and sockets) of the process,
+        along with its number of file descriptors, reading its /proc files once, the page faults are taken from
+        the given stat if read already, the sockets are counted by the given SocketCounter (when due) or else on
+        every read """
+    stat = stat or read_stat(pid)
+    fd_dir = '/proc/%d/fd' % pid
+    if sockets:
+        num_fds, num_sockets = sockets.count(fd_dir)
+    else:
+        fds = os.listdir(fd_dir)
+        num_fds, num_sockets = len(fds), count_sockets(fds, fd_dir)
+    return counters(stat, read_status(pid, CTX_SWITCH_KEYS), read_io(pid), num_sockets, children), num_fds
+
+
+def read_thread_times(pid):
+    """ Returns the cpu times of each thread of the process, from /proc/<pid>/task """
+    threads = []
+    for tid in os.listdir('/proc/%d/task' % pid):
+        try:
+            with open('/proc/%d/task/%s/stat' % (pid, tid), 'rb') as file:
+                stat = parse_stat(file.read())
+        except (OSError, ValueError):
+            continue
+        threads.append({'tid': int(tid), 'user': stat['user'], 'system': stat['system']})
+    return threads
+
+
+def boot_time():
+    """ Returns the time the system booted at, in seconds since the epoch,
+        computed from the uptime (precise to 10ms) rather than btime of /proc/stat (precise to a second) """
+    with open('/proc/uptime', 'rb') as file:
+        return time.time() - float(file.read().split()[0])
+
+
+def scan_processes():
+    """ Returns the parsed /proc/<pid>/stat of every process in the system, in a single scan of /proc,
+        processes which exit during the scan are skipped """
+    processes = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/' + entry + '/stat', 'rb') as file:
+                processes[int(entry)] = parse_stat(file.read())
+        except (OSError, ValueError):
+            pass
+    return processes
+
+
+""" Fields of /proc/<pid>/smaps_rollup summed into the unique set size (pages private to the process) """
+USS_KEYS = (b'Private_Clean', b'Private_Dirty', b'Private_Hugetlb')
+SMAPS_KEYS = (b'Pss', b'Swap') + USS_KEYS
+""" Fraction of the sampling interval which may be spent reading smaps_rollup, when sampled adaptively """
+SMAPS_BUDGET = 0.02
+""" Fraction of the sampling interval which may be spent telling the sockets apart from the other fds """
+SOCKETS_BUDGET = 0.02
+
+
+def read_smaps_rollup(pid):
+    """ Returns the proportional set size, unique set size and swap of the process (bytes),
+        summed from /proc/<pid>/smaps on kernels without smaps_rollup (before 4.14) """
+    try:
+        with open('/proc/%d/smaps_rollup' % pid, 'rb') as file:
+            fields = parse_status(file.read(), SMAPS_KEYS)
+    except FileNotFoundError:
+        if not os.path.exists('/proc/%d' % pid):
+            raise
+        fields = {}
+        with open('/proc/%d/smaps' % pid, 'rb') as file:
+            for key, value in parse_status_lines(file, SMAPS_KEYS):
+                fields[key] = fields.get(key, 0) + value
+    return {
+        'pss': fields.get('Pss', 0),
+        'uss': sum(fields.get(key.decode(), 0) for key in USS_KEYS),
+        'swap': fields.get('Swap', 0),
+    }
+
+
+class SmapsSampler:
+    """ Samples the memory of a process from smaps_rollup, which is expensive as the kernel walks all the mappings
+        of the process on every read, so it is read only every Nth sample, either every given number of samples,
+        or adaptively, so that the time spent reading it stays within the budget (fraction) of the interval.
+        The last values read are returned in between """
+
+    def __init__(self, pid, interval, every=None, budget=SMAPS_BUDGET):
+        self.pid = pid
+        self.interval = interval
+        self.every = every
+        self.budget = budget
+        self.period = every or 1
+        self.countdown = 0
+        self.memory = None
+
+    def sample(self):
+        """ Returns the pss, uss and swap of the process, read again if due """
+        if self.countdown <= 0 or self.memory is None:
+            start = time.perf_counter()
+            self.memory = read_smaps_rollup(self.pid)
+            if not self.every:
+                cost = time.perf_counter() - start
+                self.period = max(1, math.ceil(cost / (self.budget * self.interval)))
+            self.countdown = self.period
+        self.countdown -= 1
+        return self.memory
+
+
+class SocketCounter:
+    """ Counts the file descriptors of a process on every sample, and how many of them are sockets only every Nth
+        sample, as for SmapsSampler, either every given number of samples or adaptively, so that the readlinks of
+        the fds (see count_sockets) stay within the budget (fraction) of the interval.
+        The last number of sockets is returned in between """
+
+    def __init__(self, interval, every=None, budget=SOCKETS_BUDGET):
+        self.interval = interval
+        self.every = every
+        self.budget = budget
+        self.period = every or 1
+        self.countdown = 0
+        self.num_sockets = None
+
+    def count(self, fd_dir, dir_fd=None):
+        """ Returns the number of file descriptors and of sockets, the sockets counted again if due """
+        fds = os.listdir(dir_fd if dir_fd is not None else fd_dir)
+        if self.countdown <= 0 or self.num_sockets is None:
+            start = time.perf_counter()
+            self.num_sockets = count_sockets(fds, fd_dir, dir_fd)
+            if not self.every:
+                cost = time.perf_counter() - start
+                self.period = max(1, math.ceil(cost / (self.budget * self.interval)))
+            self.countdown = self.period
+        self.countdown -= 1
+        return len(fds), self.num_sockets
+
+
+class ProcessStatReader:
+    """ Reads the stats of a single process, keeping its /proc files open between reads, read every interval
+        (seconds), the sockets are counted every sockets_every reads (adaptively if not given, see SocketCounter).
+        Reads raise ProcessLookupError once the process has exited and been reaped """
+
+    def __init__(self, pid, interval=1, sockets_every=None):
+        self.pid = pid
+        self.sockets = SocketCounter(interval, sockets_every)
+        self.stat_fd = os.open('/proc/%d/stat' % pid, os.O_RDONLY)
+        self.fd_dir_fd = self.status_fd = self.io_fd = None
+        try:
+            self.fd_dir_fd = os.open('/proc/%d/fd' % pid, os.O_RDONLY | os.O_DIRECTORY)
+            self.status_fd = os.open('/proc/%d/status' % pid, os.O_RDONLY)
+        except OSError:
+            self.close()
+            raise
+        try:
+            self.io_fd = os.open('/proc/%d/io' % pid, os.O_RDONLY)
+        except PermissionError:
+            """ The io counters of processes of other users can't be read """
+            pass
+
+    def read(self, fd):
+        data = os.pread(fd, READ_SIZE, 0)
+        if not data:
+            raise ProcessLookupError(self.pid)
+        return data
+
+    def read_stat(self):
+        """ Returns the parsed /proc/<pid>/stat of the process """
+        return parse_stat(self.read(self.stat_fd))
+
+    def num_fds(self):
+        """ Returns the number of file descriptors opened by the process """
+        return len(os.listdir(self.fd_dir_fd))
+
+    def read_counters(self, stat):
+        """ Returns the kernel counters of the process (see counters) along with its number of file descriptors,
+            the page faults are taken from the given stat, read in the same pass """
+        num_fds, num_sockets = self.sockets.count(None, self.fd_dir_fd)
+        status = parse_status(self.read(self.status_fd), CTX_SWITCH_KEYS)
+        io = parse_status(self.read(self.io_fd), IO_KEYS) if self.io_fd is not None else {}
+        return counters(stat, status, io, num_sockets), num_fds
+
+    def close(self):
+        for fd in [self.stat_fd, self.fd_dir_fd, self.status_fd, self.io_fd]:
+            if fd is not None:
+                os.close(fd)
@@ -0,0 +1,162 @@
+"""
+    This file contains readiness probes, the conditions on which the launch of the client can block
+    instead of waiting for a fixed time after starting the server.
+    A condition is given as a string:
+        tcp:HOST:PORT       a tcp port accepting connections
+        unix:PATH           a unix socket accepting connections
+        log:REGEX           a line of the server output log matching the regular expression
+        file:PATH           a file appearing
+        cpu:PERCENT         the cpu usage of the server (and its descendants) settling below the percentage
+"""
+
+import os
+import re
+import time
+import socket
+import psutil
+
+""" Interval between checks of the conditions """
+POLL_INTERVAL = 0.05
+""" Window over which the cpu usage must stay below the threshold, to be considered settled """
+CPU_SETTLE_WINDOW = 1.0
+""" Longest path of a unix socket (the size of sun_path, less the terminating null byte) """
+UNIX_PATH_MAX = 107
+
+
+def port_accepts(host, port):
+    """ Returns whether the tcp port accepts connections """
+    try:
+        socket.create_connection((host, int(port)), timeout=POLL_INTERVAL).close()
+        return True
+    except OSError:
+        return False
+
+
+def unix_socket_accepts(path):
+    """ Returns whether the unix socket accepts connections """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.settimeout(POLL_INTERVAL)
+        connection.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        connection.close()
+
+
+class LogMatcher:
+    """ Checks if a line of the log file matches the pattern, reading only the lines appended since the last check """
+
+    def __init__(self, path, pattern):
+        self.path = path
+        self.pattern = re.compile(pattern)
+        self.offset = 0
+        self.pending = ''
+
+    def __call__(self):
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, errors='replace') as file:
+            file.seek(self.offset)
+            data = file.read()
+            self.offset = file.tell()
+        *lines, self.pending = (self.pending + data).split('\n')
+        return any(self.pattern.search(line) for line in lines)
+
+
+class CpuSettled:
+    """ Checks if the cpu usage of the process and its descendants stayed below the threshold (percentage)
+        for the settle window, after it has been observed for at least that long """
+
+    def __init__(self, pid, threshold, window=CPU_SETTLE_WINDOW):
+        self.pid = pid
+        self.threshold = float(threshold)
+        self.window = window
+        self.samples = []
+
+    def cpu_time(self):
+        total = 0.0
+        root = psutil.Process(self.pid)
+        for process in [root] + root.children(recursive=True):
+            try:
+                cpu_times = process.cpu_times()
+                total += cpu_times.user + cpu_times.system
+            except psutil.Error:
+                pass
+        return total
+
+    def __call__(self):
+        now = time.monotonic()
+        try:
+            self.samples.append((now, self.cpu_time()))
+        except psutil.Error:
+            """ The server is not running """
+            return False
+        """ Keep just one sample older than the window """
+        while len(self.samples) > 2 and self.samples[1][0] <= now - self.window:
+            self.samples.pop(0)
+        start_time, start_cpu = self.samples[0]
+        if now - start_time < self.window:
+            return False
+        return 100 * (self.samples[-1][1] - start_cpu) / (now - start_time) <= self.threshold
+
+
+def parse_condition(condition):
+    """ Returns the kind and value of the condition (see the format above), raises ValueError if malformed,
+        so conditions can be checked before the server is started """
+    kind, _, value = condition.partition(':')
+    if kind not in ['tcp', 'unix', 'log', 'file', 'cpu']:
+        raise ValueError("unknown readiness condition " + condition)
+    if not value:
+        raise ValueError("readiness condition %s requires a value" % condition)
+    if kind == 'tcp':
+        host, _, port = value.rpartition(':')
+        if not port.isdigit() or not 0 < int(port) < 65536:
+            raise ValueError("readiness condition %s requires a port number (1-65535)" % condition)
+    elif kind == 'unix' and len(os.fsencode(value)) > UNIX_PATH_MAX:
+        raise ValueError("readiness condition %s: unix socket paths are limited to %d bytes" %
+                         (condition, UNIX_PATH_MAX))
+    elif kind == 'log':
+        try:
+            re.compile(value)
+        except re.error as error:
+            raise ValueError("readiness condition %s: invalid regular expression: %s" % (condition, error))
+    elif kind == 'cpu':
+        try:
+            threshold = float(value)
+        except ValueError:
+            threshold = -1
+        if not threshold >= 0:
+            raise ValueError("readiness condition %s requires a non-negative percentage" % condition)
+    return kind, value
+
+
+def create_probe(condition, server_pid=None, server_log_file=None):
+    """ Returns a function checking the given condition (see the format above) """
+    kind, value = parse_condition(condition)
+    if kind == 'tcp':
+        host, _, port = value.rpartition(':')
+        return lambda: port_accepts(host or 'localhost', port)
+    if kind == 'unix':
+        return lambda: unix_socket_accepts(value)
+    if kind == 'log':
+        assert server_log_file, "log readiness condition requires logging the server output"
+        return LogMatcher(server_log_file, value)
+    if kind == 'file':
+        return lambda: os.path.exists(value)
+    return CpuSettled(server_pid, value)
+
+
+def wait_until_ready(conditions, timeout, server_pid=None, server_log_file=None):
+    """ Blocks until all the given conditions hold, or the timeout (seconds) expires,
+        returns whether they hold and the time waited """
+    start_time = time.monotonic()
+    probes = [create_probe(condition, server_pid, server_log_file) for condition in conditions]
+    while True:
+        """ Conditions which hold are not checked again """
+        probes = [probe for probe in probes if not probe()]
+        elapsed = time.monotonic() - start_time
+        if not probes or elapsed >= timeout:
+            return not probes, elapsed
+        time.sleep(POLL_INTERVAL)
@@ -0,0 +1,246 @@
+"""
+    This script maintains a results store, a local SQLite database of benchmark runs, so that runs can be
+    compared over months without re-parsing their logs.
+    Each ingested run records its metadata (scenario, start time, commands, the host info line of the monitor
+    logs, the git revision of the benchmarked code, parameters and events), the summary metrics of the run
+    (see analysis.summarize_run), and the sample series of each of its monitor logs, stored as the zlib
+    compressed records of the binary log format (see metrics.load_records).
+    Runs are indexed by scenario and start time, and the summary metrics by run and name, so queries like the
+    peak server RSS of a scenario over its last 50 runs read only a few index pages.
+
+    Usage:
+        python3 results.py ingest scenario ... [ --param name=value ... ] [ --git-dir path ]
+        python3 results.py list [ --scenario pattern ] [ --last N ]
+        python3 results.py query --scenario pattern --metric server.rss_peak [ --last N ]
+        python3 results.py compare --scenario pattern --scenario-b pattern [ --metric name ... ] [ --last N ]
+    the database is results.db by default (--database), scenario patterns are globs (like 'nginx-*').
+"""
+import argparse
+import glob
+import json
+import sqlite3
+import subprocess
+import sys
+import time
+import zlib
+import numpy
+import metrics
+import analysis
+from events import read_events
+
+DEFAULT_DATABASE = 'results.db'
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    scenario TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    duration REAL,
+    server TEXT,
+    client TEXT,
+    host TEXT,
+    git_revision TEXT,
+    parameters TEXT,
+    events TEXT,
+    ingest_time REAL,
+    UNIQUE (scenario, start_time)
+);
+CREATE INDEX IF NOT EXISTS runs_scenario_time ON runs (scenario, start_time);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (start_time);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS series (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    info TEXT,
+    fields TEXT NOT NULL,
+    num_samples INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, role)
+);
+'''
+""" Compression level of the series, the records compress well as most fields change slowly """
+COMPRESSION_LEVEL = 6
+
+
+def connect(database=DEFAULT_DATABASE):
+    """ Opens the results store, creating it if missing """
+    connection = sqlite3.connect(database)
+    connection.execute('PRAGMA foreign_keys = ON')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def git_revision(path='.'):
+    """ Returns the git revision checked out at the path, None if it is not a git repository """
+    try:
+        return subprocess.run(['git', '-C', path, 'rev-parse', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, check=True, universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def monitor_logs(scenario):
+    """ Returns the monitor logs of the run by role: server, client, and client-N for multiple clients """
+    prefix = scenario + '-monitor-'
+    return {log_file[len(prefix):-len('.log')]: log_file
+            for log_file in sorted(glob.glob(glob.escape(prefix) + '*.log'))}
+
+
+def ingest(connection, scenario, parameters=None, revision=None):
+    """ Stores the run of the scenario (from the logs in the working directory), returns its id,
+        or None if the run was already stored or has no events log """
+    events = read_events(scenario + '-events.log')
+    if not events:
+        return None
+    start = events[0]
+    times = {event['event']: event['time'] for event in events}
+    logs = monitor_logs(scenario)
+    series = {role: metrics.load_records(log_file) for role, log_file in logs.items()}
+    host = next((info[0] for info, _ in series.values() if info), None)
+    with connection:
+        cursor = connection.execute(
+            'INSERT OR IGNORE INTO runs (scenario, start_time, duration, server, client, host, git_revision, '
+            'parameters, events, ingest_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (scenario, start['time'], times['server_exit'] - start['time'] if 'server_exit' in times else None,
+             start.get('server'), start.get('client'), host, revision, json.dumps(parameters or {}),
+             json.dumps(events), time.time()))
+        if not cursor.rowcount:
+            return None
+        run_id = cursor.lastrowid
+        connection.executemany('INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)',
+                               [(run_id, name, value) for name, value in analysis.summarize_run(scenario).items()])
+        connection.executemany(
+            'INSERT INTO series (run_id, role, info, fields, num_samples, data) VALUES (?, ?, ?, ?, ?, ?)',
+            [(run_id, role, json.dumps(info), json.dumps([[name, records.dtype[name].str[1:]]
+                                                           for name in records.dtype.names]),
+              len(records), zlib.compress(records.tobytes(), COMPRESSION_LEVEL))
+             for role, (info, records) in series.items()])
+    return run_id
+
+
+def load_series(connection, run_id, role='server'):
+    """ Returns the info lines and records of the monitor log of the run, like metrics.load_records,
+        None if not stored """
+    row = connection.execute('SELECT info, fields, data FROM series WHERE run_id = ? AND role = ?',
+                             (run_id, role)).fetchone()
+    if row is None:
+        return None
+    info, fields, data = row
+    dtype = metrics.records_dtype([tuple(field) for field in json.loads(fields)])
+    return json.loads(info), numpy.frombuffer(zlib.decompress(data), dtype=dtype)
+
+
+def list_runs(connection, scenario='*', last=None):
+    """ Returns the id, scenario, start time, duration and git revision of the runs of the scenarios matching
+        the pattern, the most recent first """
+    return connection.execute('SELECT id, scenario, start_time, duration, git_revision FROM runs '
+                              'WHERE scenario GLOB ? ORDER BY start_time DESC LIMIT ?',
+                              (scenario, last or -1)).fetchall()
+
+
+def query(connection, scenario, metric, last=None):
+    """ Returns the (run id, scenario, start time, value) of the metric over the last runs of the scenarios
+        matching the pattern, the most recent first """
+    return connection.execute('SELECT runs.id, scenario, start_time, value FROM runs '
+                              'JOIN metrics ON metrics.run_id = runs.id AND metrics.name = ? '
+                              'WHERE scenario GLOB ? ORDER BY start_time DESC LIMIT ?',
+                              (metric, scenario, last or -1)).fetchall()
+
+
+def summarize_runs(connection, scenario, metric_names=None, last=None):
+    """ Returns the trial summary (see analysis.summarize_trials) of the metrics over the last runs
+        of the scenarios matching the pattern """
+    run_ids = [row[0] for row in list_runs(connection, scenario, last)]
+    summaries = {run_id: {} for run_id in run_ids}
+    for start in range(0, len(run_ids), 500):
+        chunk = run_ids[start:start + 500]
+        rows = connection.execute('SELECT run_id, name, value FROM metrics WHERE run_id IN (%s)'
+                                  % ','.join('?' * len(chunk)), chunk)
+        for run_id, name, value in rows:
+            if value is not None and (not metric_names or name in metric_names):
+                summaries[run_id][name] = value
+    return analysis.summarize_trials(list(summaries.values()))
+
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def parse_parameters(specs):
+    """ Parses the parameters of the run, each given as name=value """
+    parameters = {}
+    for spec in specs:
+        name, _, value = spec.partition('=')
+        parameters[name] = value
+    return parameters
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', '-D', help='the results store', default=DEFAULT_DATABASE)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    ingest_parser = commands.add_parser('ingest', help='store the runs of the scenarios, from the logs in the '
+                                                       'working directory')
+    ingest_parser.add_argument('scenarios', nargs='+')
+    ingest_parser.add_argument('--param', '-p', help='a parameter of the runs as name=value, can be repeated',
+                               action='append', default=[])
+    ingest_parser.add_argument('--git-dir', help='the git repository of the benchmarked code, its revision is '
+                                                 'recorded with the runs', default='.')
+    list_parser = commands.add_parser('list', help='list the stored runs, the most recent first')
+    list_parser.add_argument('--scenario', '-S', help='the scenario pattern (glob)', default='*')
+    list_parser.add_argument('--last', '-n', help='only the last N runs', type=int)
+    query_parser = commands.add_parser('query', help='the values of a metric over the runs of a scenario')
+    query_parser.add_argument('--scenario', '-S', help='the scenario pattern (glob)', required=True)
+    query_parser.add_argument('--metric', '-m', help='the summary metric, like server.rss_peak', required=True)
+    query_parser.add_argument('--last', '-n', help='only the last N runs', type=int)
+    compare_parser = commands.add_parser('compare', help='compare the runs of a scenario to those of another')
+    compare_parser.add_argument('--scenario', '-S', help='the scenario pattern (glob) of the A runs', required=True)
+    compare_parser.add_argument('--scenario-b', '-B', help='the scenario pattern (glob) of the B runs', required=True)
+    compare_parser.add_argument('--metric', '-m', help='the metrics to compare, by default all',
+                                action='append', default=[])
+    compare_parser.add_argument('--last', '-n', help='only the last N runs of each', type=int)
+    compare_parser.add_argument('--threshold', help='the relative change in a metric to be considered '
+                                                    'a regression', type=float, default=0.05)
+    args = parser.parse_args()
+
+    connection = connect(args.database)
+    if args.command == 'ingest':
+        revision, parameters = git_revision(args.git_dir), parse_parameters(args.param)
+        for scenario in args.scenarios:
+            run_id = ingest(connection, scenario, parameters, revision)
+            print(scenario, "stored as run %d" % run_id if run_id else "already stored or not found")
+    elif args.command == 'list':
+        for run_id, scenario, start_time, duration, revision in list_runs(connection, args.scenario, args.last):
+            print("%6d  %-32s %s  %8s  %s" % (run_id, scenario, format_time(start_time),
+                                              '%.1fs' % duration if duration is not None else '-',
+                                              (revision or '-')[:12]))
+    elif args.command == 'query':
+        values = query(connection, args.scenario, args.metric, args.last)
+        for run_id, scenario, start_time, value in values:
+            print("%6d  %-32s %s  %12s" % (run_id, scenario, format_time(start_time),
+                                            '%.3f' % value if value is not None else '-'))
+        """ Metrics which could not be computed for a run (like the peak memory of a phase without samples)
+            are stored as NULL """
+        known = [row[3] for row in values if row[3] is not None]
+        if known:
+            print("%d runs, min %.3f, mean %.3f, max %.3f" % (len(known), min(known), sum(known) / len(known),
+                                                             max(known)))
+    else:
+        summary = summarize_runs(connection, args.scenario, args.metric, args.last)
+        summary_b = summarize_runs(connection, args.scenario_b, args.metric, args.last)
+        analysis.print_summary(summary, "runs of " + args.scenario)
+        analysis.print_summary(summary_b, "runs of " + args.scenario_b)
+        comparison = analysis.compare(summary_b, summary, args.threshold)
+        analysis.print_comparison(comparison, args.scenario_b + " compared to " + args.scenario)
+        connection.close()
+        sys.exit(1 if any(stats['regressed'] for stats in comparison.values()) else 0)
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,565 @@
+"""
+    This script benchmarks the benchmark tool itself, so that regressions in its overhead and scaling are caught,
+    it runs locally on any Linux box and writes its results as json.
+    The suites:
+        sampler: the overhead of the monitors (see bench.monitor_process_stats, monitor_process_procfs_stats and
+            monitor_process_tree_stats) on a calibrated synthetic workload (a cpu bound loop touching its memory),
+            for each sampler and interval: the slowdown of the workload compared to running unmonitored, the cpu
+            usage of the monitor itself, and the jitter of the intervals between its samples
+        throughput: the parse (metrics.load_metrics) and render (plot.render in fast mode) throughput on generated
+            text and binary monitor logs of 1k samples and up, and the render time of process_graph.py on
+            generated logs of up to thousands of processes
+        branching: the accuracy of the process branch tracking (process_graph.monitor_process_branches_daemon),
+            with each exit tracking method available, on synthetic fork trees (like forks.py and steps.py) whose
+            processes record their own pids, parents, start and exit times as the ground truth: the fraction of
+            the processes tracked, of their parents right, and the errors of their creation and exit times
+    The results of a run can be compared to those of a previous run (--baseline), the script then exits with
+    a non-zero status if any of the stable metrics (see COMPARED_METRICS) regressed by more than the threshold.
+
+    Usage: python3 selfbench.py [ --suite sampler|throughput|branching ... ] [ --output selfbench.json ]
+                                [ --baseline file ] [ --threshold fraction ]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import numpy
+import psutil
+import bench
+import logformat
+import metrics
+import procevents
+import process_graph
+
+SUITES = ['sampler', 'throughput', 'branching']
+SAMPLERS = ['psutil', 'procfs', 'tree']
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+""" Fields of the generated monitor logs, those logged by the process monitors """
+SYNTHETIC_FIELDS = logformat.fields_of({'memory': {'vms': 0}, 'num_fds': 0})
+""" Iterations of the workload timed to calibrate it """
+CALIBRATION_ITERATIONS = 200000
+""" Time given to a monitor to start sampling before the workload starts """
+MONITOR_STARTUP = 0.2
+""" The fork trees of the branching suite, with their size (depth of the fanout tree, length of the chain,
+    number of the short lived processes of the burst) and the life time of their processes """
+FORK_TREES = {
+    'fanout': (3, 0.3),
+    'chain': (10, 0.1),
+    'burst': (50, 0.01),
+}
+FANOUT = 3
+""" Time to wait for the branch tracking daemon to log the exits once the tree is gone """
+TRACKING_TIMEOUT = 30
+""" The metrics compared to the baseline, by their last component, along with whether higher is better and
+    the floor of the metric, changes are relative to the baseline or the floor if larger, as differences below
+    it are noise (like a few milliseconds of scheduling delay), the slowdown of the workload is left out,
+    as it is within the noise of a shared machine """
+COMPARED_METRICS = {
+    'monitor_cpu_percent': (False, 1.0),
+    'jitter_stdev': (False, 0.001),
+    'samples_per_second': (True, 0),
+    'render_seconds': (False, 0.1),
+    'graph_seconds': (False, 0.1),
+    'recall': (True, 0),
+    'parent_accuracy': (True, 0),
+    'exit_error_ms': (False, 10.0),
+}
+
+
+def workload(iterations, memory):
+    """ The synthetic workload, a cpu bound loop touching a page of its memory (in bytes) on every iteration,
+        so that its rss is all of the memory """
+    buffer = bytearray(memory)
+    pages = max(len(buffer) // PAGE_SIZE, 1)
+    total = 0
+    for i in range(iterations):
+        buffer[(i % pages) * PAGE_SIZE] = i & 0xff
+        total += i * i % 7
+    return total
+
+
+def calibrate(duration, memory):
+    """ Returns the number of iterations of the workload running for about the duration (seconds) """
+    start = time.perf_counter()
+    workload(CALIBRATION_ITERATIONS, memory)
+    elapsed = time.perf_counter() - start
+    return max(int(CALIBRATION_ITERATIONS * duration / elapsed), 1)
+
+
+def fork_workload(iterations, memory, start_fd, result_fd):
+    """ Forks the workload, which starts once a byte is written to the start pipe, and reports its duration
+        on the result pipe, returns its pid """
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.read(start_fd, 1)
+            start = time.perf_counter()
+            workload(iterations, memory)
+            os.write(result_fd, repr(time.perf_counter() - start).encode())
+        finally:
+            """ The workload must not return to the code of the process it was forked from """
+            os._exit(0)
+    return pid
+
+
+def fork_monitor(sampler, pid, interval, log_file):
+    """ Forks a monitor of the process, logging to the log file with the given sampler, returns its pid,
+        the monitor stays a child of this process, so that its cpu time is known once reaped """
+    monitor_pid = os.fork()
+    if monitor_pid == 0:
+        try:
+            bench.daemon_process(log_file)
+            log = bench.create_log_writer()
+            if sampler == 'tree':
+                bench.monitor_process_tree_stats(pid, interval, log=log)
+            elif sampler == 'procfs':
+                bench.monitor_process_procfs_stats(pid, interval, log=log)
+            else:
+                bench.monitor_process_stats(pid, interval, log=log)
+        finally:
+            os._exit(0)
+    return monitor_pid
+
+
+def measure_workload(iterations, memory, sampler=None, interval=None, log_file=None):
+    """ Runs the workload, monitored by the sampler if given, returns its duration, along with the cpu usage
+        (percent) of the monitor over its life time if monitored """
+    start_read, start_write = os.pipe()
+    result_read, result_write = os.pipe()
+    sys.stdout.flush()
+    pid = fork_workload(iterations, memory, start_read, result_write)
+    monitor_start = time.perf_counter()
+    monitor_pid = fork_monitor(sampler, pid, interval, log_file) if sampler else None
+    if monitor_pid:
+        time.sleep(MONITOR_STARTUP)
+    os.write(start_write, b'x')
+    duration = float(os.read(result_read, 64))
+    os.waitpid(pid, 0)
+    monitor_cpu_percent = None
+    if monitor_pid:
+        _, _, usage = os.wait4(monitor_pid, 0)
+        monitor_cpu_percent = 100 * (usage.ru_utime + usage.ru_stime) / (time.perf_counter() - monitor_start)
+    for fd in [start_read, start_write, result_read, result_write]:
+        os.close(fd)
+    return duration, monitor_cpu_percent
+
+
+def interval_jitter(log_files, interval):
+    """ Returns the mean period of the samples of the monitor logs and the jitter of their intervals (seconds) """
+    periods = []
+    for log_file in log_files:
+        _, records = metrics.load_records(log_file)
+        periods.extend(numpy.diff(records['time']).tolist())
+    if not periods:
+        return {'samples': 0, 'period_mean': None, 'jitter_stdev': None, 'jitter_p99': None, 'jitter_max': None}
+    deviations = numpy.abs(numpy.array(periods) - interval)
+    return {
+        'samples': len(periods) + len(log_files),
+        'period_mean': float(numpy.mean(periods)),
+        'jitter_stdev': float(numpy.std(periods)),
+        'jitter_p99': float(numpy.percentile(deviations, 99)),
+        'jitter_max': float(deviations.max()),
+    }
+
+
+def benchmark_samplers(work_dir, samplers, intervals, duration, memory, repeats):
+    """ Returns the overhead and jitter of each sampler at each interval, on the calibrated workload """
+    iterations = calibrate(duration, memory)
+    baseline = statistics.median(measure_workload(iterations, memory)[0] for _ in range(repeats))
+    print("workload of", iterations, "iterations runs for", round(baseline, 3), "seconds unmonitored", flush=True)
+    results = []
+    for sampler in samplers:
+        for interval in intervals:
+            log_files = [os.path.join(work_dir, 'sampler-%s-%g-%d.log' % (sampler, interval, repeat))
+                         for repeat in range(repeats)]
+            runs = [measure_workload(iterations, memory, sampler, interval, log_file) for log_file in log_files]
+            result = {
+                'sampler': sampler,
+                'interval': interval,
+                'duration': statistics.median(run[0] for run in runs),
+                'overhead': statistics.median(run[0] for run in runs) / baseline - 1,
+                'monitor_cpu_percent': statistics.mean(run[1] for run in runs),
+            }
+            result.update(interval_jitter(log_files, interval))
+            print("sampler", sampler, "interval", interval, "overhead %.2f%%" % (100 * result['overhead']),
+                  "monitor cpu %.2f%%" % result['monitor_cpu_percent'], flush=True)
+            results.append(result)
+    return {'iterations': iterations, 'memory': memory, 'baseline_duration': baseline, 'results': results}
+
+
+def synthetic_records(num_samples, interval=1.0, seed=0):
+    """ Returns the records of a synthetic monitor log, a process with a noisy cpu usage around 50 percent and
+        a slowly growing rss, sampled every interval with some jitter """
+    random = numpy.random.default_rng(seed)
+    records = numpy.zeros(num_samples, dtype=metrics.records_dtype(SYNTHETIC_FIELDS))
+    records['time'] = time.time() + numpy.cumsum(interval + random.normal(0, interval / 100, num_samples))
+    cpu = numpy.clip(random.normal(0.5, 0.2, num_samples), 0, 1) * interval
+    records['cpu_times.user'] = numpy.cumsum(0.8 * cpu)
+    records['cpu_times.system'] = numpy.cumsum(0.2 * cpu)
+    records['cpu_percent'] = 100 * cpu / interval
+    records['memory.rss'] = 100 * metrics.MB + numpy.cumsum(random.integers(-4096, 8192, num_samples))
+    records['memory.vms'] = 4 * records['memory.rss']
+    records['num_fds'] = random.integers(10, 20, num_samples)
+    records['num_threads'] = 4
+    return records
+
+
+def write_log(log_file, records, log_format='json'):
+    """ Writes the records as a monitor log in the format, like the monitors do """
+    info = ['MEMORY: 0 bytes \t CPU: 1 VIRT 1 PHY 0 MHz', 'PID: 1 PPID: 0 USER: root EXE: /bin/true CREATION: 0']
+    if log_format == 'binary':
+        with open(log_file, 'wb') as file:
+            log = logformat.BinaryLogWriter(file, SYNTHETIC_FIELDS)
+            for line in info:
+                log.info(line)
+            log.write_header()
+            file.write(records.tobytes())
+        return
+    with open(log_file, 'w') as file:
+        for line in info:
+            file.write(line + '\n')
+        columns = [records[name].tolist() for name, _ in SYNTHETIC_FIELDS]
+        for time_, user, system, cpu_percent, rss, num_threads, vms, num_fds in zip(*columns):
+            file.write(json.dumps({'cpu_times': {'user': user, 'system': system}, 'cpu_percent': cpu_percent,
+                                   'memory': {'rss': rss, 'vms': vms}, 'num_fds': num_fds,
+                                   'num_threads': num_threads, 'time': time_}) + '\n')
+
+
+def write_branching_log(log_file, num_processes, duration=60.0, seed=0):
+    """ Writes a synthetic process life time log (see process_graph.py) of a random tree of processes,
+        each created and exited within the life time of its parent """
+    random = numpy.random.default_rng(seed)
+    start = time.time()
+    processes = [(1, 0, start, start + duration)]
+    for pid in range(2, num_processes + 1):
+        ppid, _, parent_creation, parent_exit = processes[random.integers(len(processes))]
+        creation = random.uniform(parent_creation, parent_exit)
+        processes.append((pid, ppid, creation, random.uniform(creation, parent_exit)))
+    with open(log_file, 'w') as file:
+        for pid, ppid, creation, exit_ in processes:
+            file.write(json.dumps({'pid': pid, 'ppid': ppid, 'creation_time': creation, 'exit_time': exit_,
+                                   'life_time': exit_ - creation, 'root': pid == 1, 'cpu_time': 0.1,
+                                   'peak_rss': 1024 * 1024}) + '\n')
+
+
+def benchmark_throughput(work_dir, sizes, graph_sizes, render=True):
+    """ Returns the parse and render times of generated monitor logs of each size (number of samples),
+        in both formats, and the render times of generated process life time logs of each size """
+    import plot
+    results = []
+    for num_samples in sizes:
+        records = synthetic_records(num_samples)
+        for log_format in ['json', 'binary']:
+            scenario = os.path.join(work_dir, 'selfbench-%s-%d' % (log_format, num_samples))
+            log_file = scenario + '-monitor-server.log'
+            write_log(log_file, records, log_format)
+            size = os.path.getsize(log_file)
+            start = time.perf_counter()
+            metrics.load_metrics(log_file)
+            parse_seconds = time.perf_counter() - start
+            result = {
+                'samples': num_samples,
+                'format': log_format,
+                'size_bytes': size,
+                'parse_seconds': parse_seconds,
+                'samples_per_second': num_samples / parse_seconds,
+                'mb_per_second': size / metrics.MB / parse_seconds,
+            }
+            if render:
+                """ The client is the same log, the render time includes the parse of both """
+                os.symlink(log_file, scenario + '-monitor-client.log')
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(open(os.devnull, 'w')):
+                    image_file = plot.render(scenario, fast=True)
+                result['render_seconds'] = time.perf_counter() - start
+                os.remove(image_file)
+                os.remove(scenario + '-monitor-client.log')
+            os.remove(log_file)
+            print("parsed", num_samples, log_format, "samples at %.0f samples/s" % result['samples_per_second'],
+                  flush=True)
+            results.append(result)
+    graphs = []
+    for num_processes in graph_sizes:
+        log_file = os.path.join(work_dir, 'graph-%d.log' % num_processes)
+        figure_file = os.path.join(work_dir, 'graph-%d.png' % num_processes)
+        write_branching_log(log_file, num_processes)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            process_graph.generate_process_branching_image(log_file, figure_file)
+        graphs.append({'processes': num_processes, 'graph_seconds': time.perf_counter() - start})
+        print("drew the branching of", num_processes, "processes in %.3f seconds" % graphs[-1]['graph_seconds'],
+              flush=True)
+        os.remove(log_file)
+        if os.path.exists(figure_file):
+            os.remove(figure_file)
+        """ Tall images are saved as tiles instead, with the tile index appended to the name (see process_graph) """
+        name, extension = os.path.splitext(figure_file)
+        tile = 0
+        while os.path.exists('%s-%d%s' % (name, tile, extension)):
+            os.remove('%s-%d%s' % (name, tile, extension))
+            tile += 1
+    return {'logs': results, 'process_graph': graphs}
+
+
+def record_process(truth_fd, parent_pid, start_time):
+    """ Records the process to the ground truth, a json line written at once to the file opened for appending """
+    os.write(truth_fd, (json.dumps({'pid': os.getpid(), 'ppid': parent_pid, 'start': start_time,
+                                    'exit': time.time()}) + '\n').encode())
+
+
+def spawn(truth_fd, body, *args):
+    """ Forks a process of the tree, running the body and recording itself on exit, returns its pid """
+    parent_pid = os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        start_time = time.time()
+        try:
+            body(truth_fd, *args)
+        finally:
+            record_process(truth_fd, parent_pid, start_time)
+            os._exit(0)
+    return pid
+
+
+def fanout_tree(truth_fd, depth, lifetime):
+    """ Forks FANOUT children, each the root of a fanout tree of the depth below, like a pre-forking server """
+    children = [spawn(truth_fd, fanout_tree, depth - 1, lifetime) for _ in range(FANOUT)] if depth else []
+    time.sleep(lifetime)
+    for child in children:
+        os.waitpid(child, 0)
+
+
+def chain_tree(truth_fd, length, lifetime):
+    """ Forks a child continuing the chain, and exits right away, the children are adopted (like steps.py) """
+    time.sleep(lifetime)
+    if length:
+        spawn(truth_fd, chain_tree, length - 1, lifetime)
+
+
+def short_lived(truth_fd, lifetime):
+    time.sleep(lifetime)
+
+
+def burst_tree(truth_fd, count, lifetime):
+    """ Forks short lived children one after the other, each living for the life time """
+    for _ in range(count):
+        os.waitpid(spawn(truth_fd, short_lived, lifetime), 0)
+        time.sleep(lifetime)
+
+
+def tree_size(shape):
+    """ Returns the number of processes of the fork tree, its root included """
+    size, _ = FORK_TREES[shape]
+    if shape == 'fanout':
+        return sum(FANOUT ** depth for depth in range(size + 1))
+    return size + 1
+
+
+def tracked_root(truth_fd, shape, interval, exit_tracking, out_file, err_file):
+    """ The root of the fork tree, starts tracking its branching before forking the tree """
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), sys.stdout.fileno())
+    try:
+        daemon_pid = process_graph.monitor_process_branches_daemon(interval, out_file, err_file, exit_tracking)
+    except SystemExit:
+        """ The daemon exits once the tree is gone, it must not return to the code it was forked from """
+        os._exit(0)
+    os.write(truth_fd, (json.dumps({'daemon': daemon_pid}) + '\n').encode())
+    """ Give the daemon the time to start tracking, like forks.py """
+    time.sleep(max(0.1, 2 * interval))
+    size, lifetime = FORK_TREES[shape]
+    {'fanout': fanout_tree, 'chain': chain_tree, 'burst': burst_tree}[shape](truth_fd, size, lifetime)
+
+
+def read_truth(truth_file):
+    """ Returns the pid of the branch tracking daemon, and the processes of the tree recorded so far by pid """
+    with open(truth_file) as file:
+        lines = [json.loads(line) for line in file]
+    return next(line['daemon'] for line in lines if 'daemon' in line), \
+        {line['pid']: line for line in lines if 'pid' in line}
+
+
+def wait_for_daemon(pid, timeout=TRACKING_TIMEOUT):
+    """ Waits for the daemon (not a child of this process) to exit, returns whether it exited """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if psutil.Process(pid).status() == psutil.STATUS_ZOMBIE:
+                return True
+        except psutil.NoSuchProcess:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def error_stats(errors):
+    return {'mean': statistics.mean(errors), 'max': max(errors)} if errors else {'mean': None, 'max': None}
+
+
+def tracking_accuracy(truth, tracked):
+    """ Returns the accuracy of the tracked processes (pid to the logged life time) against the ground truth """
+    matched = [pid for pid in truth if pid in tracked]
+    return {
+        'processes': len(truth),
+        'tracked': len(matched),
+        'spurious': len(set(tracked) - set(truth)),
+        'recall': len(matched) / len(truth) if truth else None,
+        'parent_accuracy': sum(tracked[pid]['ppid'] == truth[pid]['ppid'] for pid in matched) / len(matched)
+        if matched else None,
+        'creation_error_ms': error_stats([1000 * abs(tracked[pid]['creation_time'] - truth[pid]['start'])
+                                          for pid in matched]),
+        'exit_error_ms': error_stats([1000 * abs(tracked[pid]['exit_time'] - truth[pid]['exit'])
+                                      for pid in matched]),
+    }
+
+
+def benchmark_branching(work_dir, interval, shapes):
+    """ Returns the accuracy of the branch tracking of each fork tree, with each exit tracking method available """
+    methods = [method for method, available in [('netlink', procevents.ProcConnector.available()),
+                                                ('pidfd', procevents.PidfdExitWatcher.available()),
+                                                ('poll', True)] if available]
+    results = []
+    for shape in shapes:
+        for method in methods:
+            truth_file = os.path.join(work_dir, 'truth-%s-%s.log' % (shape, method))
+            out_file = os.path.join(work_dir, 'branching-%s-%s.log' % (shape, method))
+            err_file = os.path.join(work_dir, 'branching-error-%s-%s.log' % (shape, method))
+            truth_fd = os.open(truth_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            sys.stdout.flush()
+            root_pid = spawn(truth_fd, tracked_root, shape, interval, method, out_file, err_file)
+            os.close(truth_fd)
+            os.waitpid(root_pid, 0)
+            """ The processes of the chain outlive the root, the tree is complete once they all recorded
+                themselves, and the daemon logged them """
+            deadline = time.monotonic() + TRACKING_TIMEOUT
+            daemon_pid, truth = read_truth(truth_file)
+            while len(truth) < tree_size(shape) and time.monotonic() < deadline:
+                time.sleep(0.05)
+                daemon_pid, truth = read_truth(truth_file)
+            exited = wait_for_daemon(daemon_pid, deadline - time.monotonic())
+            with open(out_file) as file:
+                tracked = {stats['pid']: stats for stats in map(json.loads, file)}
+            result = {'shape': shape, 'exit_tracking': method, 'interval': interval,
+                      'complete': exited and len(truth) == tree_size(shape)}
+            result.update(tracking_accuracy(truth, tracked))
+            print("tracked", result['tracked'], "of", result['processes'], shape, "processes with", method,
+                  "exit error %.1f ms" % (result['exit_error_ms']['mean'] or 0), flush=True)
+            results.append(result)
+    return results
+
+
+def host_info():
+    import results
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'psutil': psutil.__version__,
+        'cpus': os.cpu_count(),
+        'memory': psutil.virtual_memory().total,
+        'revision': results.git_revision(os.path.dirname(os.path.abspath(__file__))),
+    }
+
+
+def flatten(report):
+    """ Returns the compared metrics of the report, keyed by their path, like sampler.procfs.0.01.jitter_stdev """
+    values = {}
+    for result in report.get('sampler', {}).get('results', []):
+        for name in ['monitor_cpu_percent', 'jitter_stdev']:
+            values['sampler.%s.%g.%s' % (result['sampler'], result['interval'], name)] = result[name]
+    for result in report.get('throughput', {}).get('logs', []):
+        for name in ['samples_per_second', 'render_seconds']:
+            values['throughput.%s.%d.%s' % (result['format'], result['samples'], name)] = result.get(name)
+    for result in report.get('throughput', {}).get('process_graph', []):
+        values['throughput.process_graph.%d.graph_seconds' % result['processes']] = result['graph_seconds']
+    for result in report.get('branching', []):
+        prefix = 'branching.%s.%s.' % (result['shape'], result['exit_tracking'])
+        values[prefix + 'recall'] = result['recall']
+        values[prefix + 'parent_accuracy'] = result['parent_accuracy']
+        values[prefix + 'exit_error_ms'] = result['exit_error_ms']['mean']
+    return {name: value for name, value in values.items() if value is not None}
+
+
+def compare(report, baseline, threshold):
+    """ Returns the metrics of the report worse than those of the baseline by more than the threshold (relative),
+        as name to (baseline, value) """
+    regressions = {}
+    values, baseline_values = flatten(report), flatten(baseline)
+    for name, value in values.items():
+        base = baseline_values.get(name)
+        higher_is_better, floor = COMPARED_METRICS[name.rsplit('.', 1)[1]]
+        if base is None or not max(abs(base), floor):
+            continue
+        change = (value - base) / max(abs(base), floor)
+        if higher_is_better:
+            change = -change
+        if change > threshold:
+            regressions[name] = (base, value)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--suite', help='the suites to run, by default all', action='append', choices=SUITES)
+    parser.add_argument('--output', '-o', help='the file to write the results to (json)', default='selfbench.json')
+    parser.add_argument('--baseline', help='the results of a previous run to compare to, the script exits with a '
+                                           'non-zero status if any metric regressed')
+    parser.add_argument('--threshold', help='the relative change in a metric to be considered a regression',
+                        type=float, default=0.2)
+    parser.add_argument('--samplers', help='the samplers to benchmark', nargs='+', choices=SAMPLERS,
+                        default=SAMPLERS)
+    parser.add_argument('--intervals', help='the sampling intervals (seconds)', nargs='+', type=float,
+                        default=[1, 0.1, 0.01])
+    parser.add_argument('--duration', help='the duration of the workload (seconds) unmonitored', type=float,
+                        default=3)
+    parser.add_argument('--memory', help='the memory of the workload (MB)', type=int, default=64)
+    parser.add_argument('--repeats', help='the number of runs of the workload with each sampler and interval',
+                        type=int, default=3)
+    parser.add_argument('--sizes', help='the number of samples of the generated monitor logs, up to 1M by default, '
+                                        'add 10000000 to measure 10M samples (about 2 GB of text log and 640 MB of '
+                                        'binary log, written to the work directory)',
+                        nargs='+', type=int, default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--graph-sizes', help='the number of processes of the generated process life time logs',
+                        nargs='+', type=int, default=[100, 1000, 10000])
+    parser.add_argument('--no-render', help='only parse the generated monitor logs', action='store_true')
+    parser.add_argument('--tracking-interval', help='the interval of the branch tracking daemon (seconds)',
+                        type=float, default=0.01)
+    parser.add_argument('--trees', help='the fork trees to track', nargs='+', choices=list(FORK_TREES),
+                        default=list(FORK_TREES))
+    parser.add_argument('--work-dir', help='the directory of the generated logs, a temporary one by default')
+    args = parser.parse_args()
+
+    suites = args.suite or SUITES
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='selfbench-')
+    os.makedirs(work_dir, exist_ok=True)
+    work_dir = os.path.abspath(work_dir)
+    report = {'time': time.time(), 'host': host_info()}
+    try:
+        if 'sampler' in suites:
+            report['sampler'] = benchmark_samplers(work_dir, args.samplers, args.intervals, args.duration,
+                                                   args.memory * metrics.MB, args.repeats)
+        if 'throughput' in suites:
+            report['throughput'] = benchmark_throughput(work_dir, args.sizes, args.graph_sizes, not args.no_render)
+        if 'branching' in suites:
+            report['branching'] = benchmark_branching(work_dir, args.tracking_interval, args.trees)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=1)
+    print("results written to", args.output)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for name, (base, value) in sorted(regressions.items()):
+            print("regressed: %-50s %12.4f -> %12.4f" % (name, base, value))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
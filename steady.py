@@ -0,0 +1,127 @@
+"""
+    This file contains the online steady state detection of a monitored process, used by the collector
+    (see monitor.py --steady) to mark the end of the warmup (JIT compilation, cache warmup) of the server,
+    and optionally to stop the run early once its metrics are known to the target precision.
+    The samples are steady once, for each metric, the means of the two halves of a rolling window agree within
+    the tolerance (relative to the mean, or to the floor of the metric for values near zero).
+    After the warmup, the mean of each metric is estimated by the method of batch means: the samples are
+    grouped in batches, whose means are close to independent even though consecutive samples are not,
+    and the run has converged once the confidence interval of the mean of every metric is within the
+    precision (relative half width).
+"""
+
+import math
+import statistics
+from collections import deque
+from logformat import get_field
+
+""" The metrics checked for steadiness and convergence, and the floor of each, below which differences
+    are considered noise (1 percent of cpu, 1 mega byte of memory) """
+DEFAULT_METRICS = {'cpu_percent': 1.0, 'memory.rss': 1024 * 1024}
+DEFAULT_WINDOW = 30
+DEFAULT_TOLERANCE = 0.05
+DEFAULT_CONFIDENCE = 0.95
+""" The number of batches required before the confidence interval is trusted, with the normal approximation """
+MIN_BATCHES = 10
+""" The states returned by SteadyState.add when they are reached """
+WARMUP_END = 'warmup_end'
+CONVERGED = 'converged'
+
+
+class SteadyStateDetector:
+    """ Detects the steady state of the metrics of the samples, once reached it is kept """
+
+    def __init__(self, window=DEFAULT_WINDOW, tolerance=DEFAULT_TOLERANCE, metrics=None):
+        self.metrics = metrics or DEFAULT_METRICS
+        self.tolerance = tolerance
+        self.windows = {name: deque(maxlen=max(window, 2)) for name in self.metrics}
+        self.count = 0
+        self.steady = False
+
+    def is_stable(self, name):
+        values = self.windows[name]
+        half = len(values) // 2
+        first, second = list(values)[:half], list(values)[half:]
+        first_mean, second_mean = sum(first) / len(first), sum(second) / len(second)
+        scale = max(abs(first_mean), abs(second_mean), self.metrics[name])
+        return abs(second_mean - first_mean) <= self.tolerance * scale
+
+    def add(self, sample):
+        """ Adds the sample, returns whether the steady state is reached with it """
+        if self.steady:
+            return False
+        self.count += 1
+        for name, values in self.windows.items():
+            values.append(get_field(sample, name))
+        if any(len(values) < values.maxlen for values in self.windows.values()):
+            return False
+        self.steady = all(self.is_stable(name) for name in self.windows)
+        return self.steady
+
+
+class BatchMeans:
+    """ Estimates the mean of the metrics of the samples, with their confidence intervals by batch means """
+
+    def __init__(self, batch_size=DEFAULT_WINDOW, metrics=None, confidence=DEFAULT_CONFIDENCE):
+        self.metrics = metrics or DEFAULT_METRICS
+        self.batch_size = batch_size
+        self.z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        self.batch = {name: [] for name in self.metrics}
+        self.means = {name: [] for name in self.metrics}
+
+    def add(self, sample):
+        for name, batch in self.batch.items():
+            batch.append(get_field(sample, name))
+            if len(batch) == self.batch_size:
+                self.means[name].append(sum(batch) / len(batch))
+                batch.clear()
+
+    def interval(self, name):
+        """ Returns the mean of the metric and the half width of its confidence interval (None until enough
+            batches) """
+        means = self.means[name]
+        if not means:
+            return None, None
+        mean = sum(means) / len(means)
+        if len(means) < MIN_BATCHES:
+            return mean, None
+        return mean, self.z * statistics.stdev(means) / math.sqrt(len(means))
+
+    def converged(self, precision):
+        """ Returns whether the mean of every metric is known within the precision (relative half width) """
+        for name, floor in self.metrics.items():
+            mean, half_width = self.interval(name)
+            if half_width is None or half_width > precision * max(abs(mean), floor):
+                return False
+        return True
+
+    def summary(self):
+        """ Returns the mean and half width of the confidence interval of each metric """
+        summary = {}
+        for name in self.metrics:
+            mean, half_width = self.interval(name)
+            summary[name] = {'mean': mean, 'half_width': half_width}
+        return summary
+
+
+class SteadyState:
+    """ Tracks the samples of a process through its warmup to the steady state, and (if a precision is given)
+        to the convergence of its metrics in the steady state """
+
+    def __init__(self, window=DEFAULT_WINDOW, tolerance=DEFAULT_TOLERANCE, precision=None, metrics=None):
+        self.detector = SteadyStateDetector(window, tolerance, metrics)
+        self.batch_means = BatchMeans(window, metrics)
+        self.precision = precision
+        self.converged = False
+
+    def add(self, sample):
+        """ Adds the sample, returns the state reached with it (WARMUP_END or CONVERGED), if any """
+        if not self.detector.steady:
+            return WARMUP_END if self.detector.add(sample) else None
+        if self.converged:
+            return None
+        self.batch_means.add(sample)
+        if self.precision and self.batch_means.converged(self.precision):
+            self.converged = True
+            return CONVERGED
+        return None
@@ -0,0 +1,146 @@
+"""
+    This script runs a parameter sweep, a benchmark scenario for each combination of the values of the parameters
+    (the grid), with the server and client commands and the scenario name templated by the parameters
+    (python format syntax, like "./server --threads {threads}").
+    Several scenarios are run in parallel, each pinned to its own disjoint set of cpus (the server, client and
+    monitoring processes of a scenario all inherit its affinity), so that parallel runs do not interfere.
+    The sweep is resumable, scenarios whose events log records the server exit (the end of a run) are skipped.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+import subprocess
+from events import read_events
+from events import is_complete as is_complete_run
+
+""" The interval at which running scenarios are checked for completion """
+POLL_INTERVAL = 0.2
+
+
+def parse_grid(specs):
+    """ Parses the parameters of the grid, each given as name=value1,value2,... into an ordered dict """
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        if not name or not values:
+            raise ValueError("parameter should be given as name=value1,value2,... not " + spec)
+        grid[name] = values.split(',')
+    return grid
+
+
+def expand_grid(grid):
+    """ Returns the list of parameter combinations of the grid, the last parameter varying fastest """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def is_complete(scenario):
+    """ Returns whether the scenario has already been run to completion, runs aborted as the server was not ready,
+        or in which no client started, are run again """
+    events_file = scenario + '-events.log'
+    if not os.path.exists(events_file):
+        return False
+    try:
+        return is_complete_run(read_events(events_file))
+    except ValueError:
+        """ A partially written events log """
+        return False
+
+
+def cpu_sets(cpus_per_job, jobs=None):
+    """ Splits the cpus available to this process into disjoint sets of the given size, at most jobs of them """
+    cpus = sorted(os.sched_getaffinity(0))
+    sets = [set(cpus[index:index + cpus_per_job]) for index in range(0, len(cpus) - cpus_per_job + 1, cpus_per_job)]
+    if not sets:
+        raise ValueError("only %d cpus available, %d required per job" % (len(cpus), cpus_per_job))
+    return sets[:jobs] if jobs else sets
+
+
+def start_scenario(command, cpus, log_file=None):
+    """ Starts the monitor.py command pinned to the cpus, returns the process """
+    output = open(log_file, 'w') if log_file else subprocess.DEVNULL
+    try:
+        return subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT,
+                                preexec_fn=lambda: os.sched_setaffinity(0, cpus))
+    finally:
+        if log_file:
+            output.close()
+
+
+def run_sweep(scenarios, jobs, cpus_per_job=1, resume=True, log=True):
+    """ Runs the scenarios, a list of (scenario name, monitor.py command), in parallel, each on its own cpu set,
+        returns the exit status of each scenario run (None for those skipped) """
+    free_sets = cpu_sets(cpus_per_job, jobs)
+    print("running", len(scenarios), "scenarios,", len(free_sets), "at a time on cpus",
+          ' '.join(','.join(map(str, sorted(cpus))) for cpus in free_sets), flush=True)
+    statuses = {}
+    running = {}
+    pending = list(scenarios)
+    while pending or running:
+        while pending and free_sets:
+            scenario, command = pending.pop(0)
+            if resume and is_complete(scenario):
+                print("skipping completed scenario", scenario, flush=True)
+                statuses[scenario] = None
+                continue
+            cpus = free_sets.pop(0)
+            print("starting scenario", scenario, "on cpus", ','.join(map(str, sorted(cpus))), flush=True)
+            process = start_scenario(command, cpus, scenario + '-sweep.log' if log else None)
+            running[scenario] = (process, cpus, time.time())
+        time.sleep(POLL_INTERVAL)
+        for scenario, (process, cpus, start_time) in list(running.items()):
+            if process.poll() is None:
+                continue
+            del running[scenario]
+            free_sets.append(cpus)
+            statuses[scenario] = process.returncode
+            print("finished scenario", scenario, "with status", process.returncode,
+                  "in %.1f seconds" % (time.time() - start_time), flush=True)
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(epilog='arguments after -- are passed on to monitor.py of every scenario')
+    parser.add_argument('--name', '-N', help='the name of the sweep', required=True)
+    parser.add_argument('--param', '-p', help='a parameter of the grid as name=value1,value2,... '
+                                              'can be repeated', action='append', required=True)
+    parser.add_argument('--server', '-s', help='the server command template, like "./server --threads {threads}"',
+                        required=True)
+    parser.add_argument('--client', '-c', help='the client command template', required=True)
+    parser.add_argument('--scenario', '-S', help='the scenario name template, by default the sweep name followed '
+                                                 'by the parameter values')
+    parser.add_argument('--jobs', '-j', help='the maximum number of scenarios run in parallel, by default as many '
+                                             'as the cpu sets available', type=int)
+    parser.add_argument('--cpus-per-job', help='the number of cpus each scenario is pinned to', type=int, default=1)
+    parser.add_argument('--no-resume', help='rerun the scenarios already run to completion', action='store_true')
+    args, monitor_args = parser.parse_known_args()
+    monitor_args = [arg for arg in monitor_args if arg != '--']
+
+    grid = parse_grid(args.param)
+    scenario_template = args.scenario or args.name + ''.join('-%s{%s}' % (name, name) for name in grid)
+    monitor = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'monitor.py')
+    scenarios, index = [], {}
+    for params in expand_grid(grid):
+        scenario = scenario_template.format(**params)
+        command = [sys.executable, monitor, '--scenario', scenario, '--server', args.server.format(**params),
+                   '--client', args.client.format(**params)] + monitor_args
+        scenarios.append((scenario, command))
+        index[scenario] = params
+    if len(index) < len(scenarios):
+        parser.error('the scenario name template does not distinguish all the parameter combinations')
+
+    """ The index of the sweep maps each scenario to its parameters """
+    with open(args.name + '-sweep.json', 'w') as file:
+        json.dump({'grid': grid, 'scenarios': index}, file, indent=1)
+    statuses = run_sweep(scenarios, args.jobs, args.cpus_per_job, not args.no_resume)
+    failed = [scenario for scenario, status in statuses.items() if status]
+    if failed:
+        print("failed scenarios:", ' '.join(failed), file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
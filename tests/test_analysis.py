@@ -0,0 +1,75 @@
+import numpy
+import pytest
+import analysis
+
+
+def trials(values):
+    """ Returns the trial summary of a metric with the given values, as returned by summarize_trials """
+    low, high = analysis.bootstrap_interval(values)
+    return {'mean': float(numpy.mean(values)), 'low': low, 'high': high, 'values': values}
+
+
+def test_bootstrap_interval_contains_mean():
+    values = numpy.random.default_rng(1).normal(100, 5, 30)
+    low, high = analysis.bootstrap_interval(values)
+    assert low < values.mean() < high
+    """ About 1.96 standard errors on each side """
+    standard_error = values.std() / numpy.sqrt(len(values))
+    assert 2 * standard_error < high - low < 6 * standard_error
+
+
+def test_bootstrap_interval_is_reproducible():
+    values = [1.0, 2.0, 4.0, 8.0]
+    assert analysis.bootstrap_interval(values) == analysis.bootstrap_interval(values)
+
+
+def test_bootstrap_interval_of_single_value():
+    assert analysis.bootstrap_interval([3.0]) == (3.0, 3.0)
+
+
+def test_summarize_trials():
+    summary = analysis.summarize_trials([{'server.cpu_seconds': 1.0, 'duration': 10.0},
+                                         {'server.cpu_seconds': 3.0}])
+    assert summary['server.cpu_seconds']['mean'] == 2.0
+    assert summary['server.cpu_seconds']['values'] == [1.0, 3.0]
+    assert summary['duration'] == {'mean': 10.0, 'low': 10.0, 'high': 10.0, 'values': [10.0]}
+    assert analysis.summarize_trials([]) == {}
+
+
+def test_compare_detects_regression():
+    baseline = {'server.cpu_seconds': trials([10.0, 10.1, 9.9, 10.0, 10.05])}
+    current = {'server.cpu_seconds': trials([12.0, 12.1, 11.9, 12.0, 12.05])}
+    comparison = analysis.compare(current, baseline)['server.cpu_seconds']
+    assert comparison['regressed']
+    assert comparison['change'] == pytest.approx(0.2, abs=0.01)
+    assert not analysis.compare(baseline, current)['server.cpu_seconds']['regressed']
+
+
+def test_compare_ignores_changes_within_noise_or_threshold():
+    baseline = {'server.cpu_seconds': trials([10.0, 10.1, 9.9, 10.0])}
+    """ Above the threshold, but the interval contains the baseline """
+    noisy = {'server.cpu_seconds': trials([2.0, 20.0, 11.0, 13.0])}
+    assert not analysis.compare(noisy, baseline)['server.cpu_seconds']['regressed']
+    """ Significant, but below the threshold """
+    small = {'server.cpu_seconds': trials([10.3, 10.31, 10.29, 10.3])}
+    assert not analysis.compare(small, baseline)['server.cpu_seconds']['regressed']
+
+
+def test_compare_higher_is_better():
+    baseline = {'loadgen.throughput': trials([1000.0, 1010.0, 990.0])}
+    lower = {'loadgen.throughput': trials([800.0, 810.0, 790.0])}
+    higher = {'loadgen.throughput': trials([1200.0, 1210.0, 1190.0])}
+    assert analysis.compare(lower, baseline)['loadgen.throughput']['regressed']
+    assert not analysis.compare(higher, baseline)['loadgen.throughput']['regressed']
+
+
+def test_compare_only_common_metrics():
+    baseline = {'a': trials([1.0, 1.0]), 'b': trials([1.0, 1.0])}
+    current = {'b': trials([1.0, 1.0]), 'c': trials([1.0, 1.0])}
+    assert list(analysis.compare(current, baseline)) == ['b']
+
+
+def test_compare_zero_baseline():
+    zero = {'a': trials([0.0, 0.0])}
+    assert analysis.compare(zero, zero)['a']['change'] == 0.0
+    assert analysis.compare({'a': trials([1.0, 1.0])}, zero)['a']['change'] == float('inf')
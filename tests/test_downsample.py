@@ -0,0 +1,52 @@
+import numpy
+import pytest
+import downsample
+
+
+def series(num_points, seed=0):
+    random = numpy.random.default_rng(seed)
+    x = numpy.arange(num_points, dtype=numpy.float64)
+    return x, random.normal(0, 1, num_points)
+
+
+@pytest.mark.parametrize('method', sorted(downsample.METHODS))
+def test_short_series_returned_as_is(method):
+    x, y = series(50)
+    new_x, new_y = downsample.downsample(x, y, 100, method)
+    numpy.testing.assert_array_equal(new_x, x)
+    numpy.testing.assert_array_equal(new_y, y)
+
+
+@pytest.mark.parametrize('method', sorted(downsample.METHODS))
+def test_keeps_endpoints_and_order(method):
+    x, y = series(10000)
+    new_x, new_y = downsample.downsample(x, y, 200, method)
+    assert new_x[0] == x[0] and new_x[-1] == x[-1]
+    assert numpy.all(numpy.diff(new_x) > 0)
+    """ The kept points are points of the series """
+    numpy.testing.assert_array_equal(new_y, y[new_x.astype(numpy.int64)])
+
+
+def test_lttb_number_of_points():
+    x, y = series(10000)
+    new_x, _ = downsample.lttb(x, y, 200)
+    assert len(new_x) == 200
+
+
+def test_lttb_keeps_spike():
+    x, y = numpy.arange(1000.0), numpy.zeros(1000)
+    y[567] = 100
+    new_x, new_y = downsample.lttb(x, y, 20)
+    assert 567 in new_x
+    assert new_y.max() == 100
+
+
+def test_min_max_keeps_extremes_of_each_bucket():
+    x, y = series(10001)
+    new_x, new_y = downsample.min_max(x, y, 100)
+    assert len(new_x) <= 100 + 2
+    assert new_y.min() == y.min() and new_y.max() == y.max()
+    bucket_size = -(-len(y) // 50)
+    for start in range(0, len(y), bucket_size):
+        bucket = y[start:start + bucket_size]
+        assert bucket.min() in new_y and bucket.max() in new_y
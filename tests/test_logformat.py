@@ -0,0 +1,119 @@
+import io
+import json
+import numpy
+import logformat
+import metrics
+
+INFO = ['MEMORY: 0 bytes \t CPU: 1 VIRT 1 PHY 0 MHz', 'PID: 1 PPID: 0 USER: root EXE: /bin/true CREATION: 0']
+
+
+def sample(index, **optional):
+    """ Returns a monitor sample with the required fields (as logged by monitor.py) and the given optional ones """
+    stats = {'cpu_times': {'user': 0.5 * index, 'system': 0.25 * index}, 'cpu_percent': 12.5,
+             'memory': {'rss': 1000 + index}, 'num_threads': 2, 'time': 1000.0 + index}
+    for name, value in optional.items():
+        logformat.set_field(stats, name.replace('__', '.'), value)
+    return stats
+
+
+def write_json_log(path, samples, partial_line=None):
+    with open(path, 'w') as file:
+        writer = logformat.JsonLogWriter(file)
+        for line in INFO:
+            writer.info(line)
+        for stats in samples:
+            writer.sample(stats)
+        if partial_line is not None:
+            file.write(partial_line)
+
+
+def write_binary_log(path, samples, fields=None):
+    with open(path, 'wb') as file:
+        writer = logformat.BinaryLogWriter(file, fields)
+        for line in INFO:
+            writer.info(line)
+        for stats in samples:
+            writer.sample(stats)
+        writer.flush()
+
+
+def test_fields():
+    stats = {}
+    logformat.set_field(stats, 'memory.rss', 10)
+    assert stats == {'memory': {'rss': 10}}
+    assert logformat.has_field(stats, 'memory.rss')
+    assert not logformat.has_field(stats, 'memory.vms')
+    assert logformat.get_field(stats, 'memory.vms') == 0
+    assert logformat.fields_of(sample(0)) == logformat.SAMPLE_FIELDS
+    assert logformat.fields_of(sample(0, num_fds=3, memory__vms=4)) == \
+        logformat.SAMPLE_FIELDS + [('memory.vms', 'i8'), ('num_fds', 'i8')]
+
+
+def test_binary_round_trip(tmp_path):
+    samples = [sample(index, memory__vms=4000 + index, num_fds=7) for index in range(10)]
+    write_binary_log(tmp_path / 'log.bin', samples)
+    assert logformat.is_binary_log(tmp_path / 'log.bin')
+    header, records = logformat.read_binary_log(tmp_path / 'log.bin')
+    assert header['info'] == INFO
+    assert [tuple(field) for field in header['fields']] == logformat.fields_of(samples[0])
+    assert len(records) == 10
+    numpy.testing.assert_array_equal(records['time'], [stats['time'] for stats in samples])
+    numpy.testing.assert_array_equal(records['cpu_times.user'], [0.5 * index for index in range(10)])
+    numpy.testing.assert_array_equal(records['memory.vms'], [4000 + index for index in range(10)])
+    assert records['memory.rss'].dtype == numpy.int64
+
+
+def test_binary_log_without_samples(tmp_path):
+    write_binary_log(tmp_path / 'log.bin', [])
+    header, records = logformat.read_binary_log(tmp_path / 'log.bin')
+    assert header['info'] == INFO
+    assert len(records) == 0
+
+
+def test_binary_log_drops_fields_not_in_layout():
+    stream = io.BytesIO()
+    writer = logformat.BinaryLogWriter(stream, logformat.SAMPLE_FIELDS)
+    writer.sample(sample(0, num_fds=3))
+    record_size = 8 * len(logformat.SAMPLE_FIELDS)
+    preamble = logformat.PREAMBLE.size
+    _, _, header_length = logformat.PREAMBLE.unpack(stream.getvalue()[:preamble])
+    assert len(stream.getvalue()) == preamble + header_length + record_size
+    assert (preamble + header_length) % logformat.ALIGNMENT == 0
+
+
+def test_binary_log_ignores_incomplete_record(tmp_path):
+    write_binary_log(tmp_path / 'log.bin', [sample(0), sample(1)])
+    with open(tmp_path / 'log.bin', 'ab') as file:
+        file.write(b'\0' * 5)
+    _, records = logformat.read_binary_log(tmp_path / 'log.bin')
+    assert len(records) == 2
+
+
+def test_conversion_round_trip(tmp_path):
+    samples = [sample(index, num_fds=index) for index in range(5)]
+    write_json_log(tmp_path / 'log.json', samples)
+    logformat.convert_to_binary(tmp_path / 'log.json', tmp_path / 'log.bin')
+    logformat.convert_to_json(tmp_path / 'log.bin', tmp_path / 'back.json')
+    with open(tmp_path / 'back.json') as file:
+        lines = file.read().splitlines()
+    assert lines[:2] == INFO
+    assert [json.loads(line) for line in lines[2:]] == samples
+
+
+def test_load_records_of_both_formats(tmp_path):
+    samples = [sample(index, memory__vms=4000, num_fds=index % 3) for index in range(25)]
+    write_json_log(tmp_path / 'log.json', samples, partial_line='{"time": ')
+    write_binary_log(tmp_path / 'log.bin', samples)
+    json_info, json_records = metrics.load_records(tmp_path / 'log.json', chunk_lines=4)
+    binary_info, binary_records = metrics.load_records(tmp_path / 'log.bin')
+    assert json_info == binary_info == INFO
+    assert json_records.dtype == binary_records.dtype
+    numpy.testing.assert_array_equal(json_records, binary_records)
+
+
+def test_load_records_of_log_without_samples(tmp_path):
+    write_json_log(tmp_path / 'log.json', [])
+    info, records = metrics.load_records(tmp_path / 'log.json')
+    assert info == INFO
+    assert len(records) == 0
+    assert records.dtype == metrics.records_dtype(logformat.SAMPLE_FIELDS)
@@ -0,0 +1,50 @@
+import os
+import procfs
+
+
+def stat_line(comm, ppid=1, user=250, system=50, threads=3, start=1234, vms=4096000, rss=100):
+    """ Returns the contents of /proc/<pid>/stat of a process with the given fields, the others are zero """
+    fields = ['S', str(ppid)] + ['0'] * 5 + ['11', '12', '13', '14', str(user), str(system), '15', '16'] + \
+        ['0', '0', str(threads), '0', str(start), str(vms), str(rss)] + ['0'] * 25
+    return ('42 (%s) %s\n' % (comm, ' '.join(fields))).encode()
+
+
+def test_parse_stat():
+    stat = procfs.parse_stat(stat_line('nginx'))
+    assert stat['state'] == 'S'
+    assert stat['ppid'] == 1
+    assert (stat['minor_faults'], stat['children_minor_faults']) == (11, 12)
+    assert (stat['major_faults'], stat['children_major_faults']) == (13, 14)
+    assert stat['user'] == 250 / procfs.CLOCK_TICKS
+    assert stat['system'] == 50 / procfs.CLOCK_TICKS
+    assert stat['children_user'] == 15 / procfs.CLOCK_TICKS
+    assert stat['children_system'] == 16 / procfs.CLOCK_TICKS
+    assert stat['num_threads'] == 3
+    assert stat['start_ticks'] == 1234
+    assert stat['vms'] == 4096000
+    assert stat['rss'] == 100 * procfs.PAGE_SIZE
+
+
+def test_parse_stat_command_with_spaces_and_brackets():
+    stat = procfs.parse_stat(stat_line('a) b (c) S 7', ppid=99, threads=8))
+    assert stat['state'] == 'S'
+    assert stat['ppid'] == 99
+    assert stat['num_threads'] == 8
+
+
+def test_parse_stat_of_this_process():
+    stat = procfs.read_stat(os.getpid())
+    assert stat['state'] == 'R'
+    assert stat['num_threads'] >= 1
+    assert stat['rss'] > 0
+
+
+def test_parse_status():
+    data = b'Name:\tpython3\nVmHWM:\t  2048 kB\nvoluntary_ctxt_switches:\t7\nnonvoluntary_ctxt_switches:\t3\n'
+    status = procfs.parse_status(data, (b'VmHWM',) + procfs.CTX_SWITCH_KEYS)
+    assert status == {'VmHWM': 2048 * 1024, 'voluntary_ctxt_switches': 7, 'nonvoluntary_ctxt_switches': 3}
+
+
+def test_parse_io():
+    data = b'rchar: 10\nwchar: 20\nread_bytes: 4096\nwrite_bytes: 8192\n'
+    assert procfs.parse_status(data, procfs.IO_KEYS) == {'read_bytes': 4096, 'write_bytes': 8192}
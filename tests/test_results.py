@@ -0,0 +1,98 @@
+import time
+import numpy
+import pytest
+import logformat
+import metrics
+import results
+from events import record_event
+
+INFO = ['MEMORY: 0 bytes \t CPU: 1 VIRT 1 PHY 0 MHz', 'PID: 1 PPID: 0 USER: root EXE: /bin/true CREATION: 0']
+
+
+def write_log(log_file, start, num_samples, writer_class):
+    """ Writes a monitor log of a process using a cpu second per second, with a growing rss """
+    with open(log_file, 'wb' if writer_class is logformat.BinaryLogWriter else 'w') as file:
+        writer = writer_class(file)
+        for line in INFO:
+            writer.info(line)
+        for index in range(num_samples):
+            writer.sample({'cpu_times': {'user': 0.75 * index, 'system': 0.25 * index}, 'cpu_percent': 100.0,
+                           'memory': {'rss': (10 + index) * metrics.MB, 'vms': 100 * metrics.MB},
+                           'num_threads': 1, 'time': start + index})
+        writer.flush()
+
+
+def write_run(scenario, num_samples=10):
+    """ Writes the events log and the server (text) and client (binary) monitor logs of a run """
+    start = time.time()
+    events_file = scenario + '-events.log'
+    record_event(events_file, 'run_start', server='server.sh', client='client.sh')
+    record_event(events_file, 'server_start')
+    record_event(events_file, 'client_start')
+    record_event(events_file, 'client_exit')
+    record_event(events_file, 'server_exit')
+    write_log(scenario + '-monitor-server.log', start, num_samples, logformat.JsonLogWriter)
+    write_log(scenario + '-monitor-client.log', start, num_samples // 2, logformat.BinaryLogWriter)
+
+
+@pytest.fixture
+def connection(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    connection = results.connect(str(tmp_path / 'results.db'))
+    yield connection
+    connection.close()
+
+
+def test_ingest(connection):
+    write_run('scenario-a')
+    run_id = results.ingest(connection, 'scenario-a', {'workers': '4'}, 'abc123')
+    assert run_id is not None
+    """ Runs are stored once """
+    assert results.ingest(connection, 'scenario-a') is None
+    assert results.ingest(connection, 'missing') is None
+    server, client, host, revision, parameters = connection.execute(
+        'SELECT server, client, host, git_revision, parameters FROM runs WHERE id = ?', (run_id,)).fetchone()
+    assert (server, client, host, revision, parameters) == ('server.sh', 'client.sh', INFO[0], 'abc123',
+                                                            '{"workers": "4"}')
+    values = dict(connection.execute('SELECT name, value FROM metrics WHERE run_id = ?', (run_id,)))
+    assert values['server.cpu_seconds'] == pytest.approx(9.0)
+    assert values['server.rss_peak'] == pytest.approx(19.0)
+    assert values['client.cpu_seconds'] == pytest.approx(4.0)
+
+
+@pytest.mark.parametrize('role', ['server', 'client'])
+def test_load_series(connection, role):
+    write_run('scenario-a')
+    run_id = results.ingest(connection, 'scenario-a')
+    info, records = results.load_series(connection, run_id, role)
+    expected_info, expected = metrics.load_records('scenario-a-monitor-%s.log' % role)
+    assert info == expected_info
+    assert records.dtype == expected.dtype
+    numpy.testing.assert_array_equal(records, expected)
+    assert results.load_series(connection, run_id, 'client-2') is None
+
+
+def test_query(connection):
+    for index in range(3):
+        write_run('scenario-%d' % index, num_samples=10 + index)
+        results.ingest(connection, 'scenario-%d' % index)
+    write_run('other')
+    results.ingest(connection, 'other')
+    rows = results.query(connection, 'scenario-*', 'server.cpu_seconds')
+    assert [row[1] for row in rows] == ['scenario-2', 'scenario-1', 'scenario-0']
+    assert [row[3] for row in rows] == pytest.approx([11.0, 10.0, 9.0])
+    assert len(results.query(connection, 'scenario-*', 'server.cpu_seconds', last=2)) == 2
+    assert [row[1] for row in results.list_runs(connection, last=1)] == ['other']
+    summary = results.summarize_runs(connection, 'scenario-*', ['server.cpu_seconds'])
+    assert list(summary) == ['server.cpu_seconds']
+    assert summary['server.cpu_seconds']['mean'] == pytest.approx(10.0)
+
+
+def test_summarize_runs_skips_null_values(connection):
+    for index in range(2):
+        write_run('scenario-%d' % index)
+        results.ingest(connection, 'scenario-%d' % index)
+    with connection:
+        connection.execute("UPDATE metrics SET value = NULL WHERE name = 'server.cpu_seconds' AND run_id = 1")
+    summary = results.summarize_runs(connection, 'scenario-*', ['server.cpu_seconds'])
+    assert summary['server.cpu_seconds']['values'] == [pytest.approx(9.0)]
@@ -0,0 +1,58 @@
+import numpy
+import pytest
+import steady
+
+MB = 1024 * 1024
+
+
+def samples(cpu, rss):
+    return [{'cpu_percent': float(cpu_percent), 'memory': {'rss': int(rss_)}} for cpu_percent, rss_ in zip(cpu, rss)]
+
+
+def test_batch_means():
+    batch_means = steady.BatchMeans(batch_size=10)
+    cpu = numpy.random.default_rng(0).normal(50, 5, 200)
+    for sample in samples(cpu, [100 * MB] * 200):
+        batch_means.add(sample)
+    assert batch_means.means['cpu_percent'] == pytest.approx(cpu.reshape(20, 10).mean(axis=1).tolist())
+    mean, half_width = batch_means.interval('cpu_percent')
+    assert mean == pytest.approx(cpu.mean())
+    """ The batch means have a standard deviation of about 5 / sqrt(10), over 20 batches """
+    assert 0.5 * 1.96 * 5 / numpy.sqrt(200) < half_width < 2 * 1.96 * 5 / numpy.sqrt(200)
+    assert batch_means.interval('memory.rss') == (100 * MB, 0.0)
+    assert batch_means.converged(0.05)
+    assert not batch_means.converged(0.001)
+    assert batch_means.summary()['cpu_percent'] == {'mean': mean, 'half_width': half_width}
+
+
+def test_batch_means_needs_enough_batches():
+    batch_means = steady.BatchMeans(batch_size=10)
+    assert batch_means.interval('cpu_percent') == (None, None)
+    for sample in samples([50] * (10 * steady.MIN_BATCHES - 1), [MB] * (10 * steady.MIN_BATCHES - 1)):
+        batch_means.add(sample)
+    assert batch_means.interval('cpu_percent') == (50.0, None)
+    assert not batch_means.converged(0.5)
+    batch_means.add(samples([50], [MB])[0])
+    assert batch_means.interval('cpu_percent') == (50.0, 0.0)
+    assert batch_means.converged(0.5)
+
+
+def test_steady_state_detector():
+    detector = steady.SteadyStateDetector(window=10)
+    """ Warming up: the cpu usage is decreasing """
+    results = [detector.add(sample) for sample in samples(range(100, 50, -2), [MB] * 25)]
+    assert not any(results)
+    results = [detector.add(sample) for sample in samples([20] * 10, [MB] * 10)]
+    assert results[-1] and not any(results[:-1])
+    assert detector.steady
+    assert not detector.add(samples([90], [MB])[0])
+
+
+def test_steady_state():
+    state = steady.SteadyState(window=10, precision=0.05)
+    cpu = numpy.concatenate([numpy.linspace(100, 20, 20), numpy.random.default_rng(0).normal(20, 0.5, 200)])
+    reached = [state.add(sample) for sample in samples(cpu, [MB] * len(cpu))]
+    warmup_end, converged = reached.index(steady.WARMUP_END), reached.index(steady.CONVERGED)
+    assert 20 <= warmup_end < converged
+    assert converged == warmup_end + 10 * steady.MIN_BATCHES
+    assert [state for state in reached if state] == [steady.WARMUP_END, steady.CONVERGED]
@@ -0,0 +1,48 @@
+import json
+import pytest
+import sweep
+from events import record_event
+
+
+def test_parse_grid():
+    assert sweep.parse_grid(['workers=1,2,4', 'size=10']) == {'workers': ['1', '2', '4'], 'size': ['10']}
+    with pytest.raises(ValueError):
+        sweep.parse_grid(['workers'])
+    with pytest.raises(ValueError):
+        sweep.parse_grid(['=1,2'])
+
+
+def test_expand_grid():
+    assert sweep.expand_grid({'a': ['1', '2'], 'b': ['x', 'y']}) == [
+        {'a': '1', 'b': 'x'}, {'a': '1', 'b': 'y'}, {'a': '2', 'b': 'x'}, {'a': '2', 'b': 'y'}]
+
+
+def record_run(scenario, events):
+    for event in events:
+        record_event(scenario + '-events.log', event)
+
+
+def test_is_complete(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert not sweep.is_complete('missing')
+    record_run('complete', ['run_start', 'server_start', 'server_ready', 'client_start', 'client_exit',
+                            'server_exit'])
+    assert sweep.is_complete('complete')
+    record_run('no_client', ['run_start', 'server_start', 'server_exit'])
+    assert not sweep.is_complete('no_client')
+    record_run('not_ready', ['run_start', 'server_start', 'server_ready_timeout', 'client_start', 'server_exit'])
+    assert not sweep.is_complete('not_ready')
+    record_run('running', ['run_start', 'server_start', 'client_start'])
+    assert not sweep.is_complete('running')
+
+
+def test_is_complete_with_partial_events_log(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    record_run('partial', ['run_start', 'client_start', 'server_exit'])
+    with open('partial-events.log', 'a') as file:
+        file.write(json.dumps({'event': 'server_exit'})[:10])
+    """ The partially written last line is ignored """
+    assert sweep.is_complete('partial')
+    with open('corrupt-events.log', 'w') as file:
+        file.write('{"event": \n')
+    assert not sweep.is_complete('corrupt')
@@ -0,0 +1,177 @@
+"""
+    This script merges the monitor logs of the client and server and the events of a run into a single timeline,
+    with a shared zero point (the start of the run), and summarizes each phase of the run.
+    Events (server start, ready, client start and exit, server kill and exit) are recorded by monitor.py along
+    with the monotonic clock, and placed on the timeline by it, as are the samples, which carry the monotonic
+    clock along with the wall clock. The wall clock of the markers (and of the samples of logs without the
+    monotonic clock) is mapped onto it by the offset between the two clocks at the start of the run.
+    Clients (and servers) can mark points of their own by printing lines like
+        BENCH_MARK <epoch seconds> <label>
+    to their output (requires --log), for example from a shell: echo "BENCH_MARK $(date +%s.%N) warmed_up"
+    The phases of a run are the startup (server start to ready, or to the client start), the load (first client
+    start to last client exit), the teardown (last client exit to server exit), and a phase from each
+    marker to the next (or the end of the load). For each phase the CPU seconds, mean CPU usage and peak memory
+    of the client and server are summarized, like the server CPU seconds only while the client was active.
+
+    Usage: python3 timeline.py --scenario "some benchmark name" [ --summary file.json ]
+"""
+import argparse
+import glob
+import json
+import os
+import numpy
+import metrics
+from events import read_events
+
+""" The prefix of the marker lines printed by clients and servers to their output """
+MARKER_PREFIX = 'BENCH_MARK'
+""" Events which are drawn as markers, along with those of the clients and servers """
+MARKER_EVENTS = {'warmup_end'}
+
+
+def read_markers(output_log_file):
+    """ Returns the markers printed to the output log, as events with the label and wall clock time """
+    markers = []
+    with open(output_log_file, errors='replace') as file:
+        for line in file:
+            if not line.startswith(MARKER_PREFIX):
+                continue
+            fields = line.split(None, 2)
+            try:
+                markers.append({'event': 'mark', 'time': float(fields[1]),
+                                'label': fields[2].strip() if len(fields) > 2 else ''})
+            except (IndexError, ValueError):
+                """ Not a marker line """
+                pass
+    return markers
+
+
+def load_events(scenario):
+    """ Returns the events of the run along with the markers of its output logs, in order of time,
+        each with its time (seconds) since the start of the run, on the monotonic clock if recorded """
+    events = read_events(scenario + '-events.log')
+    if not events:
+        return []
+    start = events[0]
+    offset = start['time'] - start['monotonic']
+    for output_log_file in sorted(glob.glob(glob.escape(scenario) + '-output-*.log')):
+        for marker in read_markers(output_log_file):
+            marker['source'] = output_log_file[len(scenario) + len('-output-'):-len('.log')]
+            events.append(marker)
+    for event in events:
+        """ Markers only have the wall clock time """
+        monotonic = event.get('monotonic', event['time'] - offset)
+        event['offset'] = monotonic - start['monotonic']
+    return sorted(events, key=lambda event: event['offset'])
+
+
+def is_marker(event):
+    return event['event'] == 'mark' or event['event'] in MARKER_EVENTS
+
+
+def event_label(event):
+    return event['label'] if event['event'] == 'mark' else event['event']
+
+
+def phases(events):
+    """ Returns the phases of the run as (name, start, end) offsets, from its events """
+    times = {}
+    for event in events:
+        times.setdefault(event['event'], []).append(event['offset'])
+    end = times.get('server_exit', [events[-1]['offset']])[-1]
+    result = []
+    if 'server_start' in times:
+        ready = times.get('server_ready', times.get('client_start', [end]))[0]
+        result.append(('startup', times['server_start'][0], ready))
+    if 'client_start' in times:
+        load_end = times.get('client_exit', times.get('server_kill', [end]))[-1]
+        result.append(('load', times['client_start'][0], load_end))
+        result.append(('teardown', load_end, end))
+        markers = [event for event in events if is_marker(event) and times['client_start'][0] <= event['offset']]
+        for marker, next_marker in zip(markers, markers[1:] + [None]):
+            result.append((event_label(marker), marker['offset'],
+                           next_marker['offset'] if next_marker else max(load_end, marker['offset'])))
+    return result
+
+
+def summarize_phase(metrics_, start, end):
+    """ Returns the CPU seconds, mean CPU usage (percent) and peak memory (MB) of the metrics within the phase,
+        the cumulative CPU times are interpolated at the bounds of the phase """
+    times = metrics_['time']
+    if len(times) < 2 or end <= start:
+        return {'cpu_seconds': 0.0, 'cpu_percent': 0.0, 'rss_peak': None}
+    cpu = metrics_['cpu']['total_user'] + metrics_['cpu']['total_system']
+    cpu_seconds = float(numpy.interp(end, times, cpu) - numpy.interp(start, times, cpu))
+    within = (times >= start) & (times <= end)
+    return {
+        'cpu_seconds': cpu_seconds,
+        'cpu_percent': 100 * cpu_seconds / (end - start),
+        'rss_peak': float(metrics_['memory']['rss'][within].max()) if within.any() else None,
+    }
+
+
+def sample_offsets(records, start):
+    """ Returns the times (seconds) of the samples since the start event of the run, on the monotonic clock """
+    if 'monotonic' in records.dtype.names:
+        return numpy.asarray(records['monotonic'], dtype=numpy.float64) - start['monotonic']
+    offset = start['time'] - start['monotonic']
+    return numpy.asarray(records['time'], dtype=numpy.float64) - offset - start['monotonic']
+
+
+def load_timeline(scenario):
+    """ Returns the events of the run and the metrics of the client and server on the shared timeline,
+        times in seconds since the start of the run """
+    events = load_events(scenario)
+    start = next((event for event in events if event['event'] == 'run_start'), None)
+    roles = {}
+    for role in ['server', 'client']:
+        log_file = scenario + '-monitor-' + role + '.log'
+        if os.path.exists(log_file):
+            _, records = metrics.load_records(log_file)
+            roles[role] = metrics.compute_metrics(records)
+            if start:
+                roles[role]['time'] = sample_offsets(records, start)
+    return events, roles
+
+
+def summarize_timeline(scenario):
+    """ Returns the summary of each phase of the run, for the client and server """
+    events, roles = load_timeline(scenario)
+    summary = []
+    for name, start, end in phases(events) if events else []:
+        phase = {'phase': name, 'start': start, 'end': end}
+        for role, metrics_ in roles.items():
+            phase[role] = summarize_phase(metrics_, start, end)
+        summary.append(phase)
+    return summary
+
+
+def print_timeline(summary):
+    print("%-20s %9s %9s  %-30s %-30s" % ('phase', 'start', 'end', 'server cpu s / % / peak MB',
+                                         'client cpu s / % / peak MB'))
+    for phase in summary:
+        columns = []
+        for role in ['server', 'client']:
+            stats = phase.get(role)
+            columns.append("%8.3f %7.1f %9s" % (stats['cpu_seconds'], stats['cpu_percent'],
+                                                '-' if stats['rss_peak'] is None else '%.1f' % stats['rss_peak'])
+                           if stats else '-')
+        print("%-20s %9.3f %9.3f  %-30s %-30s" % (phase['phase'][:20], phase['start'], phase['end'], *columns))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', '-S', help='the benchmark scenario', required=True)
+    parser.add_argument('--summary', help='the file to write the summary of the phases to (json)')
+    args = parser.parse_args()
+    if not os.path.exists(args.scenario + '-events.log'):
+        parser.error('no events log for the scenario ' + args.scenario)
+    summary = summarize_timeline(args.scenario)
+    print_timeline(summary)
+    if args.summary:
+        with open(args.summary, 'w') as file:
+            json.dump(summary, file, indent=1)
+
+
+if __name__ == "__main__":
+    main()